@@ -1,22 +1,37 @@
+import protocol
+
 CMD_POLYGON = "polygon"
 CMD_HOUSE = "house"
 CMD_ORIENT = "orient"
 CMD_RESET = "reset"
 CMD_NOOP = "noop"
+CMD_CHECKPOINT = "checkpoint"
+CMD_RESTORE = "restore"
+CMD_CREATE = "create"
+CMD_CLONE = "clone"
+CMD_SELECT = "select"
+CMD_DROP = "drop"
+CMD_LIST = "list"
+CMD_CACHE = "cache"
+CMD_RELEASE = "release"
 
 
 class Argument(object):
-    def __init__(self, name, arg_type, default=None, help=""):
+    def __init__(
+        self, name, arg_type, default=None, help="", choices=None, short_name=None
+    ):
         self.name = name
         self.arg_type = arg_type
         self.default = default
         self.help = help
+        self.choices = choices
+        self.short_name = short_name or name[0]
 
     def flag(self):
         return "--{}".format(self.name)
 
     def short_flag(self):
-        return "-{}".format(self.name[0])
+        return "-{}".format(self.short_name)
 
     def __str__(self):
         return self.flag()
@@ -28,6 +43,25 @@ GLOBAL_SUBDIVIDE_ARGUMENT = Argument(
 GLOBAL_TRANSFER_ARGUMENT = Argument(
     "transfer", bool, help="Transfer the mesh as serialized bytes over stdout"
 )
+GLOBAL_FORMAT_ARGUMENT = Argument(
+    "format",
+    str,
+    protocol.FORMAT_JSON,
+    "format of transferred meshes, json lines, binary frames, or a shared memory block for clients on the same machine",
+    protocol.FORMATS,
+)
+GLOBAL_REQUEST_ARGUMENT = Argument(
+    "request",
+    int,
+    help="id of the request, echoed with the response to the command",
+    short_name="R",
+)
+GLOBAL_SINCE_ARGUMENT = Argument(
+    "since",
+    int,
+    help="version of the mesh the client has, transfers then only send the changes since it",
+    short_name="S",
+)
 TOP_LEVEL_QUIT_ARGUMENT = Argument("quit", bool, help="Quit the program")
 POLYGON_RADIUS_ARGUMENT = Argument("radius", float, 1.0, "radius of polygon")
 POLYGON_SIDECOUNT_ARGUMENT = Argument(
@@ -35,3 +69,7 @@ POLYGON_SIDECOUNT_ARGUMENT = Argument(
 )
 HOUSE_DEPTH_ARGUMENT = Argument("depth", float, 4.0, "depth of the generated house")
 ORIENT_FACE_INDEX_ARGUMENT = Argument("index", int, 0, "face index to orient by")
+SESSION_NAME_ARGUMENT = Argument("name", str, help="name of the session")
+BLOCK_NAME_ARGUMENT = Argument(
+    "block", str, help="name of a shared memory block the client is done with"
+)
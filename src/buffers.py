@@ -1,9 +1,257 @@
 import math
 import logging
 import numpy as np
+from transform import transform_points
 from collections import OrderedDict
 
 
+def reserve(array, length, fill_value=0):
+    """
+    Makes sure the given backing array can hold at least length rows.
+    Capacity is doubled on growth, so appending rows is amortized O(1).
+
+    Args:
+        array (np.array): The backing array
+        length (int): The number of rows needed
+        fill_value (Any | Optional): The value to fill new rows with
+
+    Returns:
+        np.array: The given array, or a grown copy of it
+    """
+
+    capacity = max(len(array), 1)
+    if length <= len(array):
+        return array
+
+    while capacity < length:
+        capacity *= 2
+
+    grown = np.full((capacity,) + array.shape[1:], fill_value, dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+def compaction_remap(mask):
+    """
+    Builds the old-to-new index table for squeezing the dead rows out of a buffer.
+    Live rows keep their order, so the new index of a row is the number of live rows before it.
+
+    Args:
+        mask (np.array[bool]): The liveness mask of the rows
+
+    Returns:
+        np.array[int]: The new index of every row, -1 for dead rows
+    """
+
+    remap = np.cumsum(mask, dtype=np.int64) - 1
+    remap[~mask] = -1
+    return remap
+
+
+class IndexAllocator:
+    """
+    Hands out integer indices for buffers that leave holes on removal.
+    Freed indices are marked in a boolean mask, and the lowest free index
+    is always reused first. It is found by scanning the mask from a cursor below it,
+    so releasing is O(1), releasing a batch costs array operations only,
+    and the scans of all allocations between two releases add up to one pass over the mask.
+    """
+
+    def __init__(self):
+        """
+        Initializes a new allocator, without any allocated indices
+        """
+
+        # mask of the released indices below the length
+        self.__free = np.zeros(16, dtype=bool)
+        # no index below the cursor is free
+        self.__cursor = 0
+        # one past the highest index ever handed out
+        self.__length = 0
+        # the number of indices currently allocated
+        self.__count = 0
+
+    @property
+    def count(self):
+        """
+        The number of currently allocated indices
+
+        Returns:
+            int: The number of allocated indices
+        """
+
+        return self.__count
+
+    @property
+    def length(self):
+        """
+        One past the highest index ever allocated,
+        which is the number of slots a backing buffer needs.
+
+        Returns:
+            int: The length of the index range
+        """
+
+        return self.__length
+
+    def is_allocated(self, index):
+        """
+        Tests if the given index is currently allocated
+
+        Args:
+            index (int): The index to test
+
+        Returns:
+            bool: True if the index is allocated, False if not
+        """
+
+        return 0 <= index < self.__length and not self.__free[index]
+
+    def __grow(self, length):
+        self.__free = reserve(self.__free, length, False)
+        self.__length = length
+
+    def allocate(self):
+        """
+        Allocates the lowest free index
+
+        Returns:
+            int: The allocated index
+        """
+
+        if self.__count < self.__length:
+            # argmax stops at the first free index after the cursor
+            index = self.__cursor + int(
+                np.argmax(self.__free[self.__cursor : self.__length])
+            )
+            self.__free[index] = False
+            self.__cursor = index + 1
+        else:
+            index = self.__length
+            self.__grow(index + 1)
+
+        self.__count += 1
+        return index
+
+    def allocate_many(self, count):
+        """
+        Allocates count indices in one go, the lowest free indices first,
+        like calling allocate count times. Indices beyond the free ones are appended.
+
+        Args:
+            count (int): The number of indices to allocate
+
+        Returns:
+            np.array[int]: The allocated indices, ascending
+        """
+
+        reused = np.empty(0, dtype=np.int64)
+        if count > 0 and self.__count < self.__length:
+            reused = self.__cursor + np.flatnonzero(
+                self.__free[self.__cursor : self.__length]
+            )
+            reused = reused[:count]
+            self.__free[reused] = False
+            self.__cursor = int(reused[-1]) + 1
+            self.__count += len(reused)
+
+        appended = self.allocate_range(count - len(reused))
+        return np.concatenate(
+            [reused, np.arange(appended.start, appended.stop, dtype=np.int64)]
+        )
+
+    def allocate_range(self, count):
+        """
+        Allocates count new indices in one go, at the end of the index range.
+        Free indices are deliberately not reused by this, so the result is always contiguous,
+        for loading fresh buffers and for callers that promise a range. Use allocate_many otherwise.
+
+        Args:
+            count (int): The number of indices to allocate
+
+        Returns:
+            range: The allocated indices
+        """
+
+        indices = range(self.__length, self.__length + count)
+        self.__grow(self.__length + count)
+        self.__count += count
+        return indices
+
+    def claim(self, index):
+        """
+        Allocates a specific index, for buffers that get their keys from outside
+
+        Args:
+            index (int): The index to allocate
+
+        Returns:
+            bool: True if the index was claimed, False if it was already allocated
+        """
+
+        if index >= self.__length:
+            # every index we skip over is free
+            length = self.__length
+            self.__grow(index + 1)
+            self.__free[length:index] = True
+            self.__cursor = min(self.__cursor, length)
+
+        elif self.__free[index]:
+            self.__free[index] = False
+
+        else:
+            return False
+
+        self.__count += 1
+        return True
+
+    def release(self, index):
+        """
+        Releases the given index, so it can be allocated again
+
+        Args:
+            index (int): The index to release
+
+        Returns:
+            bool: True if the index was released, False if it was not allocated
+        """
+
+        if not self.is_allocated(index):
+            return False
+
+        self.__free[index] = True
+        self.__cursor = min(self.__cursor, index)
+        self.__count -= 1
+        return True
+
+    def release_many(self, indices):
+        """
+        Releases many indices at once, with array operations only
+
+        Args:
+            indices (array-like[int]): The indices to release
+
+        Returns:
+            int: The number of indices that were released
+        """
+
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = indices[(indices >= 0) & (indices < self.__length)]
+        if len(indices) == 0:
+            return 0
+
+        # count the newly freed indices in the touched range, so duplicates count once
+        low, high = int(indices.min()), int(indices.max()) + 1
+        free = self.__free[low:high]
+        before = int(np.count_nonzero(free))
+        free[indices - low] = True
+        released = int(np.count_nonzero(free)) - before
+
+        self.__cursor = min(self.__cursor, low)
+        self.__count -= released
+        return released
+
+
 class OneToManyConnectionTable:
     """
     Convenience mapper Class to generate OneToMany Bindings.
@@ -14,17 +262,34 @@ class OneToManyConnectionTable:
     def __init__(self):
         # initialize empty backing dictionary
         self.__connections = {}
+        # allocator for integer keys, so free keys can be found without probing
+        self.__key_allocator = IndexAllocator()
 
-    def create_connection(self, key):
+    @staticmethod
+    def __is_index_key(key):
+        return isinstance(key, int) and not isinstance(key, bool) and key >= 0
+
+    def create_connection(self, key=None):
         """Create a new, empty connection
 
         Args:
-            key (Any): The key for the connection
+            key (Any | Optional): The key for the connection.
+            Defaults to None, which uses the lowest free integer key.
+
+        Returns:
+            Any: The key of the created connection
         """
+        if key is None:
+            key = self.__key_allocator.allocate()
+        elif self.__is_index_key(key):
+            self.__key_allocator.claim(key)
+
         # initialize an empty set at the given key
         self.__connections[key] = OrderedDict()
 
-        logging.debug("Created Connection for key: {}".format(key))
+        logging.debug("Created Connection for key: %s", key)
+
+        return key
 
     def read_connection(self, key):
         """Reads the connection data for the given key
@@ -36,98 +301,1060 @@ class OneToManyConnectionTable:
             List[Any]: A list of connected values,
             or None if the key is not found.
         """
-        logging.debug("Read connection with key: {}".format(key))
+        logging.debug("Read connection with key: %s", key)
 
         # call dict.get() to return the connection data, or None
         connection = self.__connections.get(key)
         if connection is None:
             return None
 
-        return connection.keys()
+        return connection.keys()
+
+    def update_connection(self, key, *args):
+        """Updates a connection with the given arguments.
+        If the key is not present in the backing dict, this will do nothing.
+
+        Args:
+            key (Any): The key for the connection
+        """
+        # Test if valid key and exit early if not
+        if key not in self.__connections:
+            return
+
+        # Overwrite data stored at key with args
+        self.__connections[key] = OrderedDict.fromkeys(args)
+
+    def delete_connection(self, key, value=None):
+        """Deletes all or parts of the connection data for the given key.
+
+        Args:
+            key (Any): The key for the connection
+            value (Any, optional): The value to delete from the connection.
+            Defaults to None.
+        """
+        logging.debug("Delete connection for key %s and value %s", key, value)
+
+        # Check if key exists, and return early if not
+        if key not in self.__connections:
+            return
+
+        # Branch depending on the optional value argument
+        if value is None:  # if we don't have a value, delete all data for key
+            del self.__connections[key]
+            if self.__is_index_key(key):
+                self.__key_allocator.release(key)
+        else:
+            # read out the data stored at the key
+            values = self.__connections.get(key)
+
+            # remove the specified value from the connection, if the value is not contained, this will throw
+            del values[value]
+
+    def append_to_connection(self, key, value):
+        """
+        Tries to append the given value to the connection stored at key.
+
+        Args:
+            key (Any) -> The key for the connection
+            value (Any) -> The value to append to the connection
+
+        Returns:
+            bool: True if successfully appended the value, False if something went wrong
+        """
+
+        # Check if key exists, and return early if not
+        if key not in self.__connections:
+            return False
+
+        # create a new empty key
+        self.__connections[key][value] = None
+
+    @property
+    def count(self):
+        """Calculates the number connections defined
+
+        Returns:
+            int: The number of connections
+        """
+        return len(self.__connections)
+
+    def values(self):
+        """
+        All Values defined in the inner dict
+        """
+        return self.__connections.values()
+
+    def items(self):
+        """
+        All items defined in the inner dict
+        """
+        return self.__connections.items()
+
+    def keys(self):
+        """
+        All keys defined in the inner dict
+        """
+        return self.__connections.keys()
+
+
+class SpatialHashGrid:
+    """
+    A uniform hash grid over 3d points.
+    Points are bucketed by their quantized coordinates, so finding all points
+    close to a position only has to look at the neighbouring cells,
+    instead of at every point stored in the grid.
+    """
+
+    def __init__(self, cell_size):
+        """
+        Initializes a new, empty grid
+
+        Args:
+            cell_size (float): The edge length of a single grid cell
+        """
+
+        self.__cell_size = cell_size
+        # Internal dict matching one cell key to the indices stored in that cell
+        self.__cells = {}
+
+    def __cell_key(self, point):
+        """
+        Quantizes the given point to the key of the cell containing it
+
+        Args:
+            point (array-like): The point to quantize
+
+        Returns:
+            tuple[int, int, int]: The cell key
+        """
+
+        return tuple(math.floor(coord / self.__cell_size) for coord in point[:3])
+
+    def insert(self, index, point):
+        """
+        Inserts an index into the cell containing the given point
+
+        Args:
+            index (int): The index to store
+            point (array-like): The position of the index
+        """
+
+        self.__cells.setdefault(self.__cell_key(point), []).append(index)
+
+    def remove(self, index, point):
+        """
+        Removes an index from the cell containing the given point.
+        The point has to be the same position the index was inserted with.
+
+        Args:
+            index (int): The index to remove
+            point (array-like): The position of the index
+
+        Returns:
+            bool: True if the index was removed, False if it was not found
+        """
+
+        key = self.__cell_key(point)
+        cell = self.__cells.get(key)
+        if cell is None or index not in cell:
+            return False
+
+        cell.remove(index)
+        if not cell:
+            del self.__cells[key]
+
+        return True
+
+    def neighbors(self, point):
+        """
+        Collects all indices stored in the cell containing the given point
+        and in the 26 cells surrounding it.
+        With a cell size >= the search radius, this is guaranteed to contain
+        every index closer to the point than the search radius.
+
+        Args:
+            point (array-like): The position to query
+
+        Returns:
+            list[int]: The candidate indices, in no particular order
+        """
+
+        x, y, z = self.__cell_key(point)
+        candidates = []
+
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    cell = self.__cells.get((x + dx, y + dy, z + dz))
+                    if cell is not None:
+                        candidates.extend(cell)
+
+        return candidates
+
+
+def find_close_pairs(queries, points, radius):
+    """
+    Finds all pairs of query points and points that are closer than the radius, in one batched pass.
+    Both point sets are sorted into grid cells of the radius, and every query
+    only tests the points in its own and the 26 surrounding cells.
+
+    Args:
+        queries (np.array[float]): The (Q, 3) query points
+        points (np.array[float]): The (P, 3) points to search
+        radius (float): The search radius
+
+    Returns:
+        tuple[np.array[int], np.array[int]]: The query index and point index of every close pair
+    """
+
+    empty = np.zeros(0, dtype=np.int64)
+    if len(queries) == 0 or len(points) == 0:
+        return (empty, empty)
+
+    query_cells = np.floor(queries / radius).astype(np.int64)
+    point_cells = np.floor(points / radius).astype(np.int64)
+
+    # hash the cells linearly into single keys, so neighbor cells are a constant offset away.
+    # Keys wrap around on overflow, colliding cells only add candidates that fail the distance test
+    strides = np.array([-7046029254386353131, -7070675565921424023, 1], dtype=np.int64)
+    query_keys = query_cells.dot(strides)
+    point_keys = point_cells.dot(strides)
+    offsets = np.array(np.meshgrid([-1, 0, 1], [-1, 0, 1], [-1, 0, 1]))
+    offsets = offsets.reshape(3, -1).T.dot(strides)
+
+    order = np.argsort(point_keys, kind="stable")
+    cell_keys, cell_starts, cell_counts = np.unique(
+        point_keys[order], return_index=True, return_counts=True
+    )
+
+    # sorted needles make the binary searches a lot more cache friendly
+    query_order = np.argsort(query_keys)
+    query_keys = query_keys[query_order]
+
+    query_indices = []
+    point_indices = []
+
+    for offset in offsets:
+        keys = query_keys + offset
+        cells = np.minimum(np.searchsorted(cell_keys, keys), len(cell_keys) - 1)
+        counts = np.where(cell_keys[cells] == keys, cell_counts[cells], 0)
+        starts = cell_starts[cells]
+
+        # expand every query to all points in the cell
+        candidates = np.repeat(query_order, counts)
+        if len(candidates) == 0:
+            continue
+
+        firsts = np.cumsum(counts) - counts
+        within = np.arange(len(candidates)) - np.repeat(firsts, counts)
+        matches = order[np.repeat(starts, counts) + within]
+
+        distances = np.linalg.norm(queries[candidates] - points[matches], axis=1)
+        close = distances < radius
+        query_indices.append(candidates[close])
+        point_indices.append(matches[close])
+
+    if not query_indices:
+        return (empty, empty)
+
+    return (np.concatenate(query_indices), np.concatenate(point_indices))
+
+
+class FaceBuffer:
+    """
+    A buffer of faces, stored as ordered collections of vertex indices.
+    All faces share one flat index array, in a compressed-sparse-row layout,
+    so triangles, quads and ngons can be mixed freely.
+    Every face slot stores where it starts in the flat array and how many vertices it has.
+    """
+
+    # The number of rows the backing arrays are allocated with, before the first growth
+    __INITIAL_CAPACITY = 16
+
+    def __init__(self):
+        """
+        Initializes a new, empty FaceBuffer
+        """
+
+        # Flat backing store of the vertex indices of all faces
+        self.__indices = np.zeros(4 * self.__INITIAL_CAPACITY, dtype=np.int64)
+        # The number of entries of the flat store in use
+        self.__indices_length = 0
+        # The start of every face in the flat store
+        self.__starts = np.zeros(self.__INITIAL_CAPACITY, dtype=np.int64)
+        # The number of vertices of every face, 0 for removed faces
+        self.__sizes = np.zeros(self.__INITIAL_CAPACITY, dtype=np.int64)
+        # Allocator for face indices
+        self.__allocator = IndexAllocator()
+
+    @staticmethod
+    def from_arrays(offsets, indices):
+        """
+        Creates a new FaceBuffer from faces in compressed-sparse-row layout
+
+        Args:
+            offsets (np.array[int]): The CSR offsets of the faces
+            indices (np.array[int]): The flat vertex indices of the faces
+
+        Returns:
+            FaceBuffer: The new buffer, with face indices matching the order of the faces
+        """
+
+        buffer = FaceBuffer()
+
+        buffer.__allocator.allocate_range(len(offsets) - 1)
+        buffer.__indices = np.array(indices, dtype=np.int64)
+        buffer.__indices_length = len(indices)
+        buffer.__starts = np.array(offsets[:-1], dtype=np.int64)
+        buffer.__sizes = np.diff(offsets).astype(np.int64)
+
+        return buffer
+
+    @property
+    def count(self):
+        """
+        The number of faces stored in the buffer
+
+        Returns:
+            int: The number of faces
+        """
+
+        return self.__allocator.count
+
+    @property
+    def length(self):
+        """
+        One past the highest face index in the buffer,
+        which is the number of rows of arrays indexed by face.
+
+        Returns:
+            int: The length of the face index range
+        """
+
+        return self.__allocator.length
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes held by the backing arrays of the buffer
+
+        Returns:
+            int: The number of bytes
+        """
+
+        return self.__indices.nbytes + self.__starts.nbytes + self.__sizes.nbytes
+
+    def add_face(self, vertex_indices):
+        """
+        Adds a new face at the lowest free face index
+
+        Args:
+            vertex_indices (list[int]): The ordered vertex indices of the face
+
+        Returns:
+            int: The index of the added face
+        """
+
+        size = len(vertex_indices)
+        face_index = self.__allocator.allocate()
+        length = self.__allocator.length
+        self.__starts = reserve(self.__starts, length)
+        self.__sizes = reserve(self.__sizes, length)
+
+        # a removed face leaves its old span behind, reuse it if the new face fits
+        start = self.__starts[face_index]
+        if -self.__sizes[face_index] < size:
+            start = self.__indices_length
+            self.__indices_length += size
+            self.__indices = reserve(self.__indices, self.__indices_length)
+            self.__starts[face_index] = start
+
+        self.__indices[start : start + size] = vertex_indices
+        self.__sizes[face_index] = size
+
+        return face_index
+
+    def add_faces(self, offsets, vertex_indices, contiguous=False):
+        """
+        Adds many faces at once, at the lowest free face indices like add_face
+
+        Args:
+            offsets (np.array[int]): The CSR offsets of the faces into vertex_indices
+            vertex_indices (np.array[int]): The flat vertex indices of the faces
+            contiguous (bool | Optional): True to append the faces at the end of the face index range instead,
+                so their indices form a range
+
+        Returns:
+            np.array[int] | range: The indices of the added faces, a range if contiguous
+        """
+
+        count = len(offsets) - 1
+        if contiguous:
+            face_indices = self.__allocator.allocate_range(count)
+        else:
+            face_indices = self.__allocator.allocate_many(count)
+        length = self.__allocator.length
+        self.__starts = reserve(self.__starts, length)
+        self.__sizes = reserve(self.__sizes, length)
+
+        start = self.__indices_length
+        self.__indices_length += len(vertex_indices)
+        self.__indices = reserve(self.__indices, self.__indices_length)
+        self.__indices[start : self.__indices_length] = vertex_indices
+
+        self.__starts[face_indices] = start + offsets[:-1]
+        self.__sizes[face_indices] = np.diff(offsets)
+
+        return face_indices
+
+    def remove_face(self, face_index):
+        """
+        Removes the face at the given index.
+        Its vertex indices are left in the flat store, until they get overwritten.
+
+        Args:
+            face_index (int): The index of the face to remove
+
+        Returns:
+            bool: True if the face was removed, False if it did not exist
+        """
+
+        if not self.__allocator.release(face_index):
+            return False
+
+        # keep the size of the removed span in the negative, so it can be reused
+        self.__sizes[face_index] = -self.__sizes[face_index]
+        return True
+
+    def remove_faces(self, face_indices):
+        """
+        Removes many faces at once. Faces that don't exist are skipped.
+
+        Args:
+            face_indices (array-like[int]): The indices of the faces to remove
+
+        Returns:
+            np.array[int]: The indices of the faces that were removed
+        """
+
+        face_indices = np.asarray(face_indices, dtype=np.int64)
+        face_indices = face_indices[
+            (face_indices >= 0) & (face_indices < self.__allocator.length)
+        ]
+
+        # a mask over all faces sorts out duplicates and removed faces in one go
+        removed = np.zeros(self.__allocator.length, dtype=bool)
+        removed[face_indices] = True
+        face_indices = np.flatnonzero(removed & (self.__sizes[: len(removed)] > 0))
+
+        self.__allocator.release_many(face_indices)
+        self.__sizes[face_indices] = -self.__sizes[face_indices]
+        return face_indices
+
+    def get_face(self, face_index):
+        """
+        Gets the vertex indices of the face at the given index
+
+        Args:
+            face_index (int): The index of the face
+
+        Returns:
+            np.array[int] | None: A view of the vertex indices, or None if the face does not exist
+        """
+
+        if not self.__allocator.is_allocated(face_index):
+            return None
+
+        start = self.__starts[face_index]
+        return self.__indices[start : start + self.__sizes[face_index]]
+
+    def face_indices(self):
+        """
+        The indices of all faces in the buffer, in ascending order
+
+        Returns:
+            np.array[int]: The face indices
+        """
+
+        return np.flatnonzero(self.__sizes[: self.__allocator.length] > 0)
+
+    def csr(self):
+        """
+        Gets the vertex indices of all faces in compressed-sparse-row layout.
+        The vertices of the i-th face are indices[offsets[i]:offsets[i + 1]],
+        faces are ordered like face_indices().
+
+        Returns:
+            tuple[np.array[int], np.array[int]]: The offsets and the flat indices
+        """
+
+        return self.spans(self.face_indices())
+
+    def spans(self, face_indices):
+        """
+        Gets the vertex indices of the given faces in compressed-sparse-row layout.
+        Removed faces keep their span until it is reused, so this also reads faces that were just removed.
+
+        Args:
+            face_indices (np.array[int]): The indices of the faces
+
+        Returns:
+            tuple[np.array[int], np.array[int]]: The offsets and the flat indices
+        """
+
+        sizes = np.abs(self.__sizes[face_indices])
+        starts = self.__starts[face_indices]
+
+        offsets = np.zeros(len(face_indices) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+
+        # shift a running counter by the distance of every face from its packed position
+        positions = np.arange(offsets[-1], dtype=np.int64)
+        positions += np.repeat(starts - offsets[:-1], sizes)
+
+        return (offsets, self.__indices[positions])
+
+    def fixed_width_array(self):
+        """
+        Gets the vertex indices of all faces as a (F, n) array,
+        if all faces have the same number of vertices n.
+        Constant quad subdivision always produces such a mesh of quads.
+        Faces are ordered like face_indices().
+
+        Returns:
+            np.array[int] | None: The face array, or None for meshes with mixed face sizes
+        """
+
+        face_indices = self.face_indices()
+        sizes = self.__sizes[face_indices]
+        if len(sizes) == 0 or np.any(sizes != sizes[0]):
+            return None
+
+        width = sizes[0]
+        starts = self.__starts[face_indices]
+        return self.__indices[starts[:, np.newaxis] + np.arange(width)]
+
+    def compact(self, vertex_remap=None):
+        """
+        Squeezes all removed faces and unused spans out of the buffer, in place.
+        Faces keep their order, so they are renumbered from 0 by ascending face index.
+
+        Args:
+            vertex_remap (np.array[int] | Optional): An old-to-new table to renumber the vertex indices with
+
+        Returns:
+            np.array[int]: The new index of every old face index, -1 for removed faces
+        """
+
+        face_remap = compaction_remap(self.__sizes[: self.__allocator.length] > 0)
+        offsets, indices = self.csr()
+        if vertex_remap is not None:
+            indices = vertex_remap[indices]
+
+        self.__indices = indices
+        self.__indices_length = len(indices)
+        self.__starts = offsets[:-1].copy()
+        self.__sizes = np.diff(offsets)
+        self.__allocator = IndexAllocator()
+        self.__allocator.allocate_range(len(self.__sizes))
+
+        return face_remap
+
+
+class EdgeTable:
+    """
+    A table of all undirected edges between nodes.
+    Edges are keyed by their sorted node pair and store the faces using them,
+    together with the local index of the edge inside of each face.
+    The table is kept up to date while faces are added and removed,
+    so edge queries never have to walk the faces of the mesh.
+    """
+
+    # The number of rows the backing arrays are allocated with, before the first growth
+    __INITIAL_CAPACITY = 16
+
+    def __init__(self):
+        """
+        Initializes a new, empty EdgeTable
+        """
+
+        # Internal dict matching one node pair key to its edge index
+        self.__edge_keys = {}
+        # Allocator for edge indices
+        self.__allocator = IndexAllocator()
+        # The sorted node pair of every edge, -1 for removed edges
+        self.__nodes = np.full((self.__INITIAL_CAPACITY, 2), -1, dtype=np.int64)
+        # The first two faces using every edge, -1 for no face
+        self.__faces = np.full((self.__INITIAL_CAPACITY, 2), -1, dtype=np.int64)
+        # The local index of the edge in the faces stored in self.__faces
+        self.__local_indices = np.full((self.__INITIAL_CAPACITY, 2), -1, dtype=np.int64)
+        # Internal dict matching non-manifold edge indices to their third and following faces
+        self.__extra_faces = {}
+
+    @staticmethod
+    def __key(node_a, node_b):
+        """
+        Calculates the key of the edge between two nodes, independent of their order
+
+        Args:
+            node_a (int): The index of the first node
+            node_b (int): The index of the second node
+
+        Returns:
+            int: The key of the edge
+        """
+
+        if node_a > node_b:
+            node_a, node_b = node_b, node_a
+
+        return (int(node_a) << 32) | int(node_b)
+
+    @staticmethod
+    def from_faces(offsets, face_nodes):
+        """
+        Creates a new EdgeTable for faces in compressed-sparse-row layout
+
+        Args:
+            offsets (np.array[int]): The CSR offsets of the faces, the face index is the row
+            face_nodes (np.array[int]): The flat node indices of the faces
+
+        Returns:
+            EdgeTable: The new table, with edges numbered by ascending node pair
+        """
+
+        table = EdgeTable()
+        table.add_faces(np.arange(len(offsets) - 1), offsets, face_nodes)
+        return table
+
+    @property
+    def count(self):
+        """
+        The number of edges stored in the table
+
+        Returns:
+            int: The number of edges
+        """
+
+        return self.__allocator.count
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes held by the backing arrays of the table
+
+        Returns:
+            int: The number of bytes
+        """
+
+        return self.__nodes.nbytes + self.__faces.nbytes + self.__local_indices.nbytes
+
+    def add_faces(self, face_indices, offsets, face_nodes):
+        """
+        Adds the edges of many faces to the table at once.
+        New edges are numbered by ascending node pair, at the lowest free edge indices.
+
+        Args:
+            face_indices (array-like[int]): The index of every face
+            offsets (np.array[int]): The CSR offsets of the faces into face_nodes
+            face_nodes (np.array[int]): The flat node indices of the faces
+        """
+
+        # every corner of a face starts one edge, ending at the next corner
+        sizes = np.diff(offsets)
+        corner_faces = np.repeat(np.arange(len(sizes)), sizes)
+        starts = offsets[corner_faces]
+        local_indices = np.arange(len(face_nodes)) - starts
+        next_nodes = face_nodes[starts + (local_indices + 1) % sizes[corner_faces]]
+
+        # collapsed edges don't connect anything
+        pairs = np.sort(np.stack([face_nodes, next_nodes], axis=1), axis=1)
+        valid = pairs[:, 0] != pairs[:, 1]
+        pairs = pairs[valid]
+        use_faces = np.asarray(face_indices, dtype=np.int64)[corner_faces[valid]]
+        local_indices = local_indices[valid]
+
+        if len(pairs) == 0:
+            return
+
+        keys = (pairs[:, 0] << 32) | pairs[:, 1]
+        unique_keys, first, use_edges = np.unique(
+            keys, return_index=True, return_inverse=True
+        )
+        use_edges = use_edges.ravel()
+
+        # look up the edges that exist already, and append the rest
+        edge_indices = self.__find_edges(unique_keys)
+        new = edge_indices == -1
+        new_indices = self.__allocator.allocate_many(int(np.count_nonzero(new)))
+        edge_indices[new] = new_indices
+
+        length = self.__allocator.length
+        self.__nodes = reserve(self.__nodes, length, -1)
+        self.__faces = reserve(self.__faces, length, -1)
+        self.__local_indices = reserve(self.__local_indices, length, -1)
+
+        self.__edge_keys.update(zip(unique_keys[new].tolist(), new_indices.tolist()))
+        self.__nodes[edge_indices[new]] = pairs[first[new]]
+
+        # rank the uses of every edge, behind the faces already using it
+        used_slots = np.count_nonzero(self.__faces[edge_indices] != -1, axis=1)
+        order = np.argsort(use_edges, kind="stable")
+        sorted_edges = use_edges[order]
+        slots = np.empty(len(order), dtype=np.int64)
+        slots[order] = np.arange(len(order)) - np.searchsorted(
+            sorted_edges, sorted_edges
+        )
+        slots += used_slots[use_edges]
+        use_edges = edge_indices[use_edges]
+
+        for slot in (0, 1):
+            uses = slots == slot
+            self.__faces[use_edges[uses], slot] = use_faces[uses]
+            self.__local_indices[use_edges[uses], slot] = local_indices[uses]
+
+        for use in order[slots[order] > 1].tolist():
+            self.__extra_faces.setdefault(int(use_edges[use]), []).append(
+                (int(use_faces[use]), int(local_indices[use]))
+            )
+
+    def add_face(self, face_index, face_nodes):
+        """
+        Adds the edges of a face to the table, creating new edges where needed
+
+        Args:
+            face_index (int): The index of the face
+            face_nodes (list[int]): The ordered node indices of the face
+        """
+
+        size = len(face_nodes)
+        for local_index in range(size):
+            node_a = face_nodes[local_index]
+            node_b = face_nodes[(local_index + 1) % size]
+
+            # collapsed edges don't connect anything
+            if node_a == node_b:
+                continue
+
+            key = self.__key(node_a, node_b)
+            edge_index = self.__edge_keys.get(key)
+
+            if edge_index is None:
+                edge_index = self.__allocator.allocate()
+                length = self.__allocator.length
+                self.__nodes = reserve(self.__nodes, length, -1)
+                self.__faces = reserve(self.__faces, length, -1)
+                self.__local_indices = reserve(self.__local_indices, length, -1)
+
+                self.__edge_keys[key] = edge_index
+                self.__nodes[edge_index] = sorted((node_a, node_b))
+
+            if self.__faces[edge_index, 0] == -1:
+                slot = 0
+            elif self.__faces[edge_index, 1] == -1:
+                slot = 1
+            else:
+                self.__extra_faces.setdefault(edge_index, []).append(
+                    (face_index, local_index)
+                )
+                continue
+
+            self.__faces[edge_index, slot] = face_index
+            self.__local_indices[edge_index, slot] = local_index
+
+    def remove_face(self, face_index, face_nodes):
+        """
+        Removes the edges of a face from the table.
+        Edges that are not used by any face afterwards are removed completely.
+
+        Args:
+            face_index (int): The index of the face
+            face_nodes (list[int]): The ordered node indices of the face
+        """
+
+        size = len(face_nodes)
+        for local_index in range(size):
+            edge_index = self.find_edge(
+                face_nodes[local_index], face_nodes[(local_index + 1) % size]
+            )
+            if edge_index is None:
+                continue
+
+            extra_faces = self.__extra_faces.get(edge_index, [])
+            use = (face_index, local_index)
+
+            if use in extra_faces:
+                extra_faces.remove(use)
+            else:
+                for slot in (0, 1):
+                    if (
+                        self.__faces[edge_index, slot] == face_index
+                        and self.__local_indices[edge_index, slot] == local_index
+                    ):
+                        # move up a use from the non-manifold overflow, or from the second slot
+                        if extra_faces:
+                            replacement = extra_faces.pop()
+                        elif slot == 0:
+                            replacement = tuple(self.__faces_at(edge_index, 1))
+                            self.__faces[edge_index, 1] = -1
+                            self.__local_indices[edge_index, 1] = -1
+                        else:
+                            replacement = (-1, -1)
+
+                        self.__faces[edge_index, slot] = replacement[0]
+                        self.__local_indices[edge_index, slot] = replacement[1]
+                        break
+
+            if not extra_faces:
+                self.__extra_faces.pop(edge_index, None)
+
+            # remove the edge completely, once it is unused
+            if self.__faces[edge_index, 0] == -1:
+                del self.__edge_keys[self.__key(*self.__nodes[edge_index])]
+                self.__nodes[edge_index] = -1
+                self.__allocator.release(edge_index)
+
+    def __find_edges(self, keys):
+        """
+        Looks up the edge indices of many node pair keys at once
+
+        Args:
+            keys (np.array[int]): The keys of the node pairs
+
+        Returns:
+            np.array[int]: The index of every edge, -1 for node pairs without an edge
+        """
+
+        # the dict is faster for a few keys, sorting all edges is faster for many
+        if len(keys) * 16 < self.count:
+            return np.array(
+                [self.__edge_keys.get(key, -1) for key in keys.tolist()], dtype=np.int64
+            )
+
+        if self.count == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+
+        edges = self.edge_indices()
+        edge_keys = (self.__nodes[edges, 0] << 32) | self.__nodes[edges, 1]
+        order = np.argsort(edge_keys)
+        edge_keys = edge_keys[order]
+
+        positions = np.minimum(np.searchsorted(edge_keys, keys), len(edge_keys) - 1)
+        return np.where(edge_keys[positions] == keys, edges[order[positions]], -1)
+
+    def remove_faces(self, face_indices, offsets, face_nodes):
+        """
+        Removes the edges of many faces from the table at once.
+        Edges that are not used by any face afterwards are removed completely.
+
+        Args:
+            face_indices (array-like[int]): The index of every face
+            offsets (np.array[int]): The CSR offsets of the faces into face_nodes
+            face_nodes (np.array[int]): The flat node indices of the faces
+        """
+
+        sizes = np.diff(offsets)
+        corner_faces = np.repeat(np.arange(len(sizes)), sizes)
+        starts = offsets[corner_faces]
+        local_indices = np.arange(len(face_nodes)) - starts
+        next_nodes = face_nodes[starts + (local_indices + 1) % sizes[corner_faces]]
+
+        pairs = np.sort(np.stack([face_nodes, next_nodes], axis=1), axis=1)
+        valid = pairs[:, 0] != pairs[:, 1]
+        if not np.any(valid):
+            return
+
+        pairs = pairs[valid]
+        use_faces = np.asarray(face_indices, dtype=np.int64)[corner_faces[valid]]
+        local_indices = local_indices[valid]
+
+        use_edges = self.__find_edges((pairs[:, 0] << 32) | pairs[:, 1])
+        known = use_edges != -1
+        use_edges = use_edges[known]
+        use_faces = use_faces[known]
+        local_indices = local_indices[known]
+
+        # clear the slots holding the removed uses
+        for slot in (0, 1):
+            matches = (self.__faces[use_edges, slot] == use_faces) & (
+                self.__local_indices[use_edges, slot] == local_indices
+            )
+            self.__faces[use_edges[matches], slot] = -1
+            self.__local_indices[use_edges[matches], slot] = -1
+
+        # the few non-manifold edges keep their other uses in the overflow lists
+        edges = np.zeros(self.__allocator.length, dtype=bool)
+        edges[use_edges] = True
+        edges = np.flatnonzero(edges)
+        if self.__extra_faces:
+            removed = set(zip(use_faces.tolist(), local_indices.tolist()))
+            for edge_index in set(edges.tolist()) & set(self.__extra_faces):
+                extra_faces = [
+                    use
+                    for use in self.__extra_faces.pop(edge_index)
+                    if use not in removed
+                ]
+                for slot in (0, 1):
+                    if self.__faces[edge_index, slot] == -1 and extra_faces:
+                        face_index, local_index = extra_faces.pop()
+                        self.__faces[edge_index, slot] = face_index
+                        self.__local_indices[edge_index, slot] = local_index
+                if extra_faces:
+                    self.__extra_faces[edge_index] = extra_faces
+
+        # move remaining second uses to the front
+        shift = edges[(self.__faces[edges, 0] == -1) & (self.__faces[edges, 1] != -1)]
+        self.__faces[shift, 0] = self.__faces[shift, 1]
+        self.__local_indices[shift, 0] = self.__local_indices[shift, 1]
+        self.__faces[shift, 1] = -1
+        self.__local_indices[shift, 1] = -1
+
+        # remove the edges completely, once they are unused
+        unused = edges[self.__faces[edges, 0] == -1]
+        unused_nodes = self.__nodes[unused]
+        for key in ((unused_nodes[:, 0] << 32) | unused_nodes[:, 1]).tolist():
+            del self.__edge_keys[key]
+        self.__nodes[unused] = -1
+        self.__allocator.release_many(unused)
+
+    def __faces_at(self, edge_index, slot):
+        """
+        Reads the face and local edge index stored in one slot of an edge
+        """
+
+        return (
+            int(self.__faces[edge_index, slot]),
+            int(self.__local_indices[edge_index, slot]),
+        )
 
-    def update_connection(self, key, *args):
-        """Updates a connection with the given arguments.
-        If the key is not present in the backing dict, this will do nothing.
+    def find_edge(self, node_a, node_b):
+        """
+        Finds the edge between two nodes
 
         Args:
-            key (Any): The key for the connection
+            node_a (int): The index of the first node
+            node_b (int): The index of the second node
+
+        Returns:
+            int | None: The index of the edge, or None if the nodes are not connected
         """
-        # Test if valid key and exit early if not
-        if key not in self.__connections:
-            return
 
-        # Overwrite data stored at key with args
-        self.__connections[key] = OrderedDict.fromkeys(args)
+        return self.__edge_keys.get(self.__key(node_a, node_b))
 
-    def delete_connection(self, key, value=None):
-        """Deletes all or parts of the connection data for the given key.
+    def edge_nodes(self, edge_index):
+        """
+        Gets the two nodes connected by an edge
 
         Args:
-            key (Any): The key for the connection
-            value (Any, optional): The value to delete from the connection.
-            Defaults to None.
-        """
-        logging.debug("Delete connection for key {} and value {}".format(key, value))
+            edge_index (int): The index of the edge
 
-        # Check if key exists, and return early if not
-        if key not in self.__connections:
-            return
+        Returns:
+            tuple[int, int] | None: The sorted node indices, or None if the edge does not exist
+        """
 
-        # Branch depending on the optional value argument
-        if value is None:  # if we don't have a value, delete all data for key
-            del self.__connections[key]
-        else:
-            # read out the data stored at the key
-            values = self.__connections.get(key)
+        if not self.__allocator.is_allocated(edge_index):
+            return None
 
-            # remove the specified value from the connection, if the value is not contained, this will throw
-            del values[value]
+        return tuple(self.__nodes[edge_index].tolist())
 
-    def append_to_connection(self, key, value):
+    def edge_faces(self, edge_index):
         """
-        Tries to append the given value to the connection stored at key.
+        Gets all faces using an edge, together with the local index of the edge inside the face
 
         Args:
-            key (Any) -> The key for the connection
-            value (Any) -> The value to append to the connection
+            edge_index (int): The index of the edge
 
         Returns:
-            bool: True if successfully appended the value, False if something went wrong
+            list[tuple[int, int]]: The face indices and local edge indices
         """
 
-        # Check if key exists, and return early if not
-        if key not in self.__connections:
-            return False
+        if not self.__allocator.is_allocated(edge_index):
+            return []
 
-        # create a new empty key
-        self.__connections[key][value] = None
+        uses = [
+            self.__faces_at(edge_index, slot)
+            for slot in (0, 1)
+            if self.__faces[edge_index, slot] != -1
+        ]
+        return uses + self.__extra_faces.get(edge_index, [])
 
-    @property
-    def count(self):
-        """Calculates the number connections defined
+    def edge_indices(self):
+        """
+        The indices of all edges in the table, in ascending order
 
         Returns:
-            int: The number of connections
+            np.array[int]: The edge indices
         """
-        return len(self.__connections)
 
-    def values(self):
+        return np.flatnonzero(self.__nodes[: self.__allocator.length, 0] != -1)
+
+    def edge_array(self):
         """
-        All Values defined in the inner dict
+        The sorted node pairs of all edges, ordered like edge_indices()
+
+        Returns:
+            np.array[int]: The (E, 2) node pairs
         """
-        return self.__connections.values()
 
-    def items(self):
+        return self.__nodes[self.edge_indices()]
+
+    def boundary_edges(self):
         """
-        All items defined in the inner dict
+        The indices of all edges that are used by exactly one face
+
+        Returns:
+            np.array[int]: The boundary edge indices
         """
-        return self.__connections.items()
 
-    def keys(self):
+        length = self.__allocator.length
+        faces = self.__faces[:length]
+        return np.flatnonzero((faces[:, 0] != -1) & (faces[:, 1] == -1))
+
+    def compact(self, node_remap=None, face_remap=None):
         """
-        All keys defined in the inner dict
+        Squeezes all removed edges out of the table, in place.
+        Edges keep their order, so they are renumbered from 0 by ascending edge index.
+        The remap tables have to keep the order of the nodes, like the ones from compaction_remap.
+
+        Args:
+            node_remap (np.array[int] | Optional): An old-to-new table to renumber the nodes with
+            face_remap (np.array[int] | Optional): An old-to-new table to renumber the faces with
+
+        Returns:
+            np.array[int]: The new index of every old edge index, -1 for removed edges
         """
-        return self.__connections.keys()
+
+        length = self.__allocator.length
+        live = self.__nodes[:length, 0] != -1
+        edge_remap = compaction_remap(live)
+
+        nodes = self.__nodes[:length][live]
+        faces = self.__faces[:length][live]
+        if node_remap is not None:
+            # an order preserving remap keeps the node pairs sorted
+            nodes = node_remap[nodes]
+        if face_remap is not None:
+            faces = np.where(faces != -1, face_remap[faces], -1)
+
+        self.__nodes = nodes
+        self.__faces = faces
+        self.__local_indices = self.__local_indices[:length][live]
+        self.__edge_keys = dict(
+            zip(((nodes[:, 0] << 32) | nodes[:, 1]).tolist(), range(len(nodes)))
+        )
+        self.__extra_faces = {
+            int(edge_remap[edge_index]): [
+                (
+                    face_index if face_remap is None else int(face_remap[face_index]),
+                    local_index,
+                )
+                for face_index, local_index in uses
+            ]
+            for edge_index, uses in self.__extra_faces.items()
+        }
+        self.__allocator = IndexAllocator()
+        self.__allocator.allocate_range(len(nodes))
+
+        return edge_remap
 
 
 class NodeBuffer:
@@ -142,21 +1369,65 @@ class NodeBuffer:
     __NODE_EQUALITY_EPSILON = 0.01
     __NODE_ROUND_DIGITS = len(str(__NODE_EQUALITY_EPSILON)) - 1
 
+    # The number of rows the backing arrays are allocated with, before the first growth
+    __INITIAL_CAPACITY = 16
+
     def __init__(self):
         """
         Initializes a new empty NodeBuffer
         """
 
-        # Internal backing store of all nodes, nodes are a list of coordinates
-        self.__nodes = []
-        # Internal backing store of all vertices, vertices are a list of coordinates
-        self.__vertices = []
-        # Internal table matching one node_index to many vertex_indices
-        self.__node_vertex_table = OneToManyConnectionTable()
-        # Internal dict matching one vertex index to one node_index
-        self.__vertex_node_dict = {}
+        # Internal backing store of all nodes, as rows of a (N, 3) array
+        self.__nodes = np.zeros((self.__INITIAL_CAPACITY, 3))
+        # Liveness mask of the node rows, removed nodes are left as dead rows
+        self.__node_mask = np.zeros(self.__INITIAL_CAPACITY, dtype=bool)
+        # Allocator for node rows, keeps track of the rows in use, dead or alive
+        self.__node_allocator = IndexAllocator()
+        # Internal backing store of all vertices, as rows of a (N, 3) array
+        self.__vertices = np.zeros((self.__INITIAL_CAPACITY, 3))
+        # Liveness mask of the vertex rows, removed vertices are left as dead rows
+        self.__vertex_mask = np.zeros(self.__INITIAL_CAPACITY, dtype=bool)
+        # Allocator for vertex rows, keeps track of the rows in use, dead or alive
+        self.__vertex_allocator = IndexAllocator()
+        # Internal array counting the children vertices of every node
+        self.__node_child_counts = np.zeros(self.__INITIAL_CAPACITY, dtype=np.int64)
+        # Lazy index of the children of all nodes, sorted vertex indices and per-node offsets into them
+        self.__node_children = None
+        # Internal array matching one vertex index to one node_index, -1 for no node
+        self.__vertex_nodes = np.full(self.__INITIAL_CAPACITY, -1, dtype=np.int64)
+        # Internal hash grid over all node positions, to speed up parent node lookups.
+        # It is built lazily, so buffers loaded from arrays don't pay for it up front
+        self.__node_grid = None
+
+    @staticmethod
+    def from_arrays(vertices, vertex_nodes, nodes):
+        """
+        Creates a new NodeBuffer from already welded arrays, without searching for parent nodes
+
+        Args:
+            vertices (np.array[float]): The (V, 3) vertex coordinates
+            vertex_nodes (np.array[int]): The index of the parent node of every vertex
+            nodes (np.array[float]): The (N, 3) node positions, every node needs a child vertex
+
+        Returns:
+            NodeBuffer: The new buffer, with vertex and node indices matching the array rows
+        """
+
+        buffer = NodeBuffer()
+
+        buffer.__vertex_allocator.allocate_range(len(vertices))
+        buffer.__vertices = np.array(vertices, dtype=float)
+        buffer.__vertex_mask = np.ones(len(vertices), dtype=bool)
+        buffer.__vertex_nodes = np.array(vertex_nodes, dtype=np.int64)
+
+        buffer.__node_allocator.allocate_range(len(nodes))
+        buffer.__nodes = np.array(nodes, dtype=float)
+        buffer.__node_mask = np.ones(len(nodes), dtype=bool)
+        buffer.__node_child_counts = np.bincount(
+            buffer.__vertex_nodes, minlength=len(nodes)
+        )
 
-        # TODO: Indexing by vertex position is dangerous, as we might have multiple vertices at the same position
+        return buffer
 
     @property
     def node_count(self):
@@ -165,7 +1436,7 @@ class NodeBuffer:
         Returns:
             int: The number of nodes.
         """
-        return sum(1 for _ in self.nodes())
+        return self.__node_allocator.count
 
     @property
     def vertex_count(self):
@@ -175,7 +1446,53 @@ class NodeBuffer:
             int: The number of vertices.
         """
 
-        return sum(1 for _ in self.vertices())
+        return self.__vertex_allocator.count
+
+    @property
+    def node_length(self):
+        """
+        One past the highest node index in the buffer,
+        which is the number of rows of arrays indexed by node.
+
+        Returns:
+            int: The length of the node index range
+        """
+
+        return self.__node_allocator.length
+
+    @property
+    def vertex_length(self):
+        """
+        One past the highest vertex index in the buffer,
+        which is the number of rows of arrays indexed by vertex.
+
+        Returns:
+            int: The length of the vertex index range
+        """
+
+        return self.__vertex_allocator.length
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes held by the backing arrays of the buffer
+
+        Returns:
+            int: The number of bytes
+        """
+
+        arrays = [
+            self.__nodes,
+            self.__node_mask,
+            self.__node_child_counts,
+            self.__vertices,
+            self.__vertex_mask,
+            self.__vertex_nodes,
+        ]
+        if self.__node_children is not None:
+            arrays.extend(self.__node_children)
+
+        return sum(array.nbytes for array in arrays)
 
     def vertices(self):
         """
@@ -184,8 +1501,7 @@ class NodeBuffer:
         Returns:
             generator[np.array[float]]: The vertices
         """
-        # Copy the backing buffer, without the None entries
-        return (vertex for vertex in self.__vertices.copy() if vertex is not None)
+        return (vertex for vertex in self.vertex_array())
 
     def nodes(self):
         """Gives access to a copy of all unique nodes in the buffer.
@@ -193,17 +1509,95 @@ class NodeBuffer:
         Returns:
             generator[np.array[float]]: The nodes as lists of coordinates
         """
-        # Copy the backing buffer, without the None entries
-        return (node for node in self.__nodes.copy() if node is not None)
+        return (node for node in self.node_array())
+
+    def vertex_array(self):
+        """
+        Gets a copy of all live vertices in the buffer, as a single array.
+        The rows are in ascending vertex index order.
+
+        Returns:
+            np.array[float]: The vertices as a (N, 3) array
+        """
+
+        length = self.__vertex_allocator.length
+        return self.__vertices[:length][self.__vertex_mask[:length]]
+
+    def node_array(self):
+        """
+        Gets a copy of all live nodes in the buffer, as a single array.
+        The rows are in ascending node index order.
+
+        Returns:
+            np.array[float]: The node positions as a (N, 3) array
+        """
+
+        length = self.__node_allocator.length
+        return self.__nodes[:length][self.__node_mask[:length]]
 
     def node_position(self, node_index):
         return self.__nodes[node_index].copy()
 
-    def __next_available_node_index(self):
-        return len(self.__nodes)
+    def __append_node(self, vertex):
+        """
+        Appends a new node at the position of the given vertex
+
+        Args:
+            vertex (List[float]): The position of the node
+
+        Returns:
+            int: The index of the new node
+        """
+
+        node_index = self.__node_allocator.allocate()
+        length = self.__node_allocator.length
+        self.__nodes = reserve(self.__nodes, length)
+        self.__node_mask = reserve(self.__node_mask, length, False)
+        self.__node_child_counts = reserve(self.__node_child_counts, length)
+
+        self.__nodes[node_index] = vertex
+        self.__node_mask[node_index] = True
+        if self.__node_grid is not None:
+            self.__node_grid.insert(node_index, vertex)
+
+        return node_index
+
+    def __append_vertex(self, vertex):
+        """
+        Appends a new vertex, that is not linked to any node yet
+
+        Args:
+            vertex (List[float]): The position of the vertex
+
+        Returns:
+            int: The index of the new vertex
+        """
+
+        vertex_index = self.__vertex_allocator.allocate()
+        length = self.__vertex_allocator.length
+        self.__vertices = reserve(self.__vertices, length)
+        self.__vertex_mask = reserve(self.__vertex_mask, length, False)
+        self.__vertex_nodes = reserve(self.__vertex_nodes, length, -1)
+
+        self.__vertices[vertex_index] = vertex
+        self.__vertex_mask[vertex_index] = True
+
+        return vertex_index
+
+    def __get_node_grid(self):
+        """
+        Gets the hash grid over all node positions, building it if needed
+
+        Returns:
+            SpatialHashGrid: The node grid
+        """
+
+        if self.__node_grid is None:
+            self.__node_grid = SpatialHashGrid(self.__NODE_EQUALITY_EPSILON)
+            for index in self.node_indices():
+                self.__node_grid.insert(index, self.__nodes[index])
 
-    def __next_available_vertex_index(self):
-        return len(self.__vertices)
+        return self.__node_grid
 
     def __vertex_distance(cls, a, b):
         """Calculate the distance between two vertices
@@ -228,7 +1622,9 @@ class NodeBuffer:
         Returns:
             tuple[int, List[int]] | tuple[None, None]: The parent node with it's index, or None if no parent exists.
         """
-        for index in self.node_indices():
+        # Only nodes in the cells around the vertex can be close enough,
+        # test them in ascending order, so the lowest matching index wins
+        for index in sorted(self.__get_node_grid().neighbors(vertex)):
             node = self.__nodes[index]
             dist = self.__vertex_distance(node, vertex)
             if dist < self.__NODE_EQUALITY_EPSILON:
@@ -249,116 +1645,255 @@ class NodeBuffer:
         """
 
         # Add vertex to inner vertex buffer
-        vertex_index = self.__next_available_vertex_index()
-        self.__vertices.append(vertex)
+        vertex_index = self.__append_vertex(vertex)
+
+        # Try to find a node that is close to our given vertex
+        node_index, parent = self.find_parent_node(vertex)
 
-        # In the rare case that no nodes are defined at all, the next step is quite trivial
-        if self.node_count == 0:
-            # Append a copy of the vertex as a new node
-            node_index = self.__next_available_node_index()
-            self.__nodes.append(vertex.copy())
+        if parent is None:  # we could not find an existing node close enough
 
-            # Link tables together
-            self.__vertex_node_dict[vertex_index] = node_index
-            self.__node_vertex_table.create_connection(node_index)
-            self.__node_vertex_table.update_connection(node_index, vertex_index)
+            # append a copy of the vertex as a new node to the node buffer
+            node_index = self.__append_node(vertex)
 
             logging.info(
-                "Added new vertex {} with index {} as it's own parent into empty node buffer at index {}".format(
-                    vertex, vertex_index, node_index
-                )
+                "Added new vertex %s with index %s as it's own parent into node buffer at index %s",
+                vertex,
+                vertex_index,
+                node_index,
             )
 
-            return vertex_index
+        else:  # we do have a valid node close enough
 
-        # Check if we already have a node for the vertex
-        # TODO: This seems like a relic from when we used vertex coords to find node parents.
-        node_index = self.__vertex_node_dict.get(vertex_index)
+            logging.info(
+                "Added new vertex %s with index %s with parent node at index %s",
+                vertex,
+                vertex_index,
+                node_index,
+            )
 
-        if node_index is None:  # There is no readily defined vertex -> node connection
+        # establish one-to-one connection from vertex to node index
+        self.__vertex_nodes[vertex_index] = node_index
+        self.__node_child_counts[node_index] += 1
+        self.__node_children = None
 
-            # Try to find a node that is close to our given vertex
-            node_index, parent = self.find_parent_node(vertex)
+        return vertex_index
 
-            if parent is None:  # we could not find an existing node close enough
+    @staticmethod
+    def __mix_bits(bits):
+        # scrambles all bits of the integers into their low bits, like the finalizer of splitmix64
+        bits = bits ^ (bits >> np.uint64(31))
+        bits *= np.uint64(0xBF58476D1CE4E5B9)
+        return bits ^ (bits >> np.uint64(29))
 
-                # append a copy of the vertex as a new node to the node buffer
-                node_index = self.__next_available_node_index()
-                self.__nodes.append(np.copy(vertex))
+    @staticmethod
+    def __unique_rows(vertices):
+        """
+        Finds the exactly equal rows of a (N, 3) array
 
-                # update connection from node to vertex index
-                self.__node_vertex_table.create_connection(node_index)
-                self.__node_vertex_table.update_connection(node_index, vertex_index)
+        Args:
+            vertices (np.array[float]): The vertices
 
-                logging.info(
-                    "Added new vertex {} with index {} as it's own parent into node buffer at index {}".format(
-                        vertex, vertex_index, node_index
-                    )
-                )
+        Returns:
+            tuple[np.array[int], np.array[int]]: The first row of every unique vertex,
+            and the unique vertex of every row
+        """
 
-            else:  # we do have a valid node close enough
+        # hashing the bits of the rows is a lot faster than sorting them lexically
+        bits = np.ascontiguousarray(vertices + 0.0).view(np.uint64)
+        hashes = NodeBuffer.__mix_bits(bits[:, 0])
+        hashes = NodeBuffer.__mix_bits(hashes ^ bits[:, 1])
+        hashes = NodeBuffer.__mix_bits(hashes ^ bits[:, 2])
+        _, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
 
-                # DEBUG
-                connection = self.__node_vertex_table.read_connection(node_index)
-                if connection is None:
-                    logging.warn(
-                        "Could not read vertex connection for node_index {}, although the index was obtained from self.find_parent_node({})".format(
-                            node_index, vertex
-                        )
-                    )
+        if np.array_equal(vertices[first][inverse], vertices):
+            return (first, inverse)
 
-                    # self.__node_vertex_table.create_connection(node_index)
+        # hash collisions of different rows are rare, fall back to sorting then
+        _, first, inverse = np.unique(
+            vertices, axis=0, return_index=True, return_inverse=True
+        )
+        return (first, inverse.ravel())
 
-                # add vertex connection to node table
-                self.__node_vertex_table.append_to_connection(node_index, vertex_index)
+    def add_vertices(self, vertices):
+        """Adds many vertices to the buffer at once.
+        Every vertex is welded to the lowest existing node closer than the node epsilon,
+        vertices without such a node are welded among each other in order,
+        like calling add_vertex for every vertex. New vertices and nodes
+        take the lowest free indices, like they would one by one.
 
-                logging.info(
-                    "Added new vertex {} with index {} with parent node at index {}".format(
-                        vertex, vertex_index, node_index
-                    )
-                )
+        Args:
+            vertices (np.array[float]): The (N, 3) vertices to add
 
-        else:  # we already have some node data defined for that vertex position
+        Returns:
+            np.array[int]: The indices of the added vertices
+        """
 
-            # DEBUG
-            connection = self.__node_vertex_table.read_connection(node_index)
-            if connection is None:
-                logging.warn(
-                    "Could not read vertex connection for node_index {}, although the index was obtained from self.__vertex_node_dict[{}]".format(
-                        node_index, vertex_index
-                    )
-                )
+        vertices = np.asarray(vertices, dtype=float).reshape(-1, 3)
 
-            # add vertex connection to node table
-            self.__node_vertex_table.append_to_connection(node_index, vertex_index)
+        # exact duplicates always end up in the same node as their first occurrence
+        first, duplicates = self.__unique_rows(vertices)
+        point_order = np.argsort(first)
+        points = vertices[first[point_order]]
+        duplicates = np.argsort(point_order)[duplicates]
+        point_parents = np.full(len(points), -1, dtype=np.int64)
 
-            logging.info(
-                "Added new vertex {} with index {} with parent node at index {}".format(
-                    vertex, vertex_index, node_index
-                )
-            )
+        # weld against the existing nodes, the lowest index within tolerance wins
+        node_indices = np.flatnonzero(self.__node_mask[: self.__node_allocator.length])
+        point_indices, matches = find_close_pairs(
+            points, self.__nodes[node_indices], self.__NODE_EQUALITY_EPSILON
+        )
+        point_parents[:] = self.__node_allocator.length
+        np.minimum.at(point_parents, point_indices, node_indices[matches])
+        point_parents[point_parents == self.__node_allocator.length] = -1
+
+        # the remaining points create new nodes, unless an earlier new node is close enough
+        loose = np.flatnonzero(point_parents == -1)
+        loose_a, loose_b = find_close_pairs(
+            points[loose], points[loose], self.__NODE_EQUALITY_EPSILON
+        )
+        earlier = loose_a > loose_b
+        leaders = np.ones(len(loose), dtype=bool)
+        leaders[np.unique(loose_a[earlier])] = False
+
+        if np.any(earlier):
+            # only points with earlier neighbors can be followers, resolve them in order
+            neighbors = {}
+            for point, neighbor in zip(
+                loose_a[earlier].tolist(), loose_b[earlier].tolist()
+            ):
+                neighbors.setdefault(point, []).append(neighbor)
+
+            leader_of = {}
+            for point in sorted(neighbors):
+                close_leaders = [n for n in neighbors[point] if leaders[n]]
+                if close_leaders:
+                    leader_of[point] = min(close_leaders)
+                else:
+                    leaders[point] = True
+
+        new_nodes = self.__node_allocator.allocate_many(int(np.count_nonzero(leaders)))
+        node_length = self.__node_allocator.length
+        self.__nodes = reserve(self.__nodes, node_length)
+        self.__node_mask = reserve(self.__node_mask, node_length, False)
+        self.__node_child_counts = reserve(self.__node_child_counts, node_length)
+
+        leader_points = loose[leaders]
+        self.__nodes[new_nodes] = points[leader_points]
+        self.__node_mask[new_nodes] = True
+        point_parents[leader_points] = new_nodes
+
+        if np.any(earlier):
+            for point, leader in leader_of.items():
+                point_parents[loose[point]] = point_parents[loose[leader]]
+
+        parents = point_parents[duplicates]
+
+        # fill the vertex holes first, and append the rest with a single resize
+        vertex_indices = self.__vertex_allocator.allocate_many(len(vertices))
+        vertex_length = self.__vertex_allocator.length
+        self.__vertices = reserve(self.__vertices, vertex_length)
+        self.__vertex_mask = reserve(self.__vertex_mask, vertex_length, False)
+        self.__vertex_nodes = reserve(self.__vertex_nodes, vertex_length, -1)
+
+        self.__vertices[vertex_indices] = vertices
+        self.__vertex_mask[vertex_indices] = True
+        self.__vertex_nodes[vertex_indices] = parents
+        np.add.at(self.__node_child_counts, parents, 1)
+
+        self.__node_children = None
+        # new nodes are not in the grid, it is rebuilt on the next single vertex search
+        self.__node_grid = None
+
+        logging.info(
+            "Added %s vertices into node buffer, with %s new nodes",
+            len(vertices),
+            len(new_nodes),
+        )
 
-        # establish one-to-one connection from vertex to node index
-        self.__vertex_node_dict[vertex_index] = node_index
+        return vertex_indices
 
-        return vertex_index
+    def __is_live_vertex(self, index):
+        return self.__vertex_allocator.is_allocated(index)
 
     def get_vertex(self, index):
         """
-        Gets the vertex for the given vertex index
+        Gets the vertex for the given vertex index.
+        The vertex is a view into the backing store, so writing to it
+        moves the vertex, until the store has to grow.
 
         Args:
             index (int): The index of the vertex
 
         Returns:
-            list[float]: The coordinates of the vertex
+            np.array[float] | None: The coordinates of the vertex, or None if it was removed
         """
 
+        if not self.__is_live_vertex(index):
+            return None
+
         return self.__vertices[index]
 
     def set_vertex(self, index, value):
         self.__vertices[index] = value
 
+    def transform(self, matrix):
+        """
+        Transforms all vertices and nodes in place, with one product per array
+
+        Args:
+            matrix (np.array[float]): The 4x4 transformation matrix
+        """
+
+        vertex_length = self.__vertex_allocator.length
+        node_length = self.__node_allocator.length
+        transform_points(
+            matrix, self.__vertices[:vertex_length], self.__vertices[:vertex_length]
+        )
+        transform_points(matrix, self.__nodes[:node_length], self.__nodes[:node_length])
+
+        # node cells are keyed by position, so the grid has to be rebuilt on the next search
+        self.__node_grid = None
+
+    def get_vertices(self, indices):
+        """
+        Gets the coordinates of many vertices at once
+
+        Args:
+            indices (array-like[int]): The indices of the vertices, they need to be alive
+
+        Returns:
+            np.array[float]: A (N, 3) array of vertex coordinates
+        """
+
+        return self.__vertices[indices]
+
+    def get_parent_nodes(self, vertex_indices):
+        """
+        Gets the parent nodes of many vertices at once
+
+        Args:
+            vertex_indices (array-like[int]): The indices of the vertices, they need to be alive
+
+        Returns:
+            np.array[int]: The indices of the parent nodes
+        """
+
+        return self.__vertex_nodes[vertex_indices]
+
+    def get_node_positions(self, node_indices):
+        """
+        Gets the positions of many nodes at once
+
+        Args:
+            node_indices (array-like[int]): The indices of the nodes, they need to be alive
+
+        Returns:
+            np.array[float]: A (N, 3) array of node positions
+        """
+
+        return self.__nodes[node_indices]
+
     def get_parent_node(self, vertex_index):
         """
         Gets the parent node of the given vertex
@@ -370,7 +1905,10 @@ class NodeBuffer:
             int: The index of the parent node.
         """
 
-        return self.__vertex_node_dict[vertex_index]
+        if not self.__is_live_vertex(vertex_index):
+            raise KeyError(vertex_index)
+
+        return int(self.__vertex_nodes[vertex_index])
 
     def get_node_children(self, node_index):
         """
@@ -380,10 +1918,23 @@ class NodeBuffer:
             node_index (int): The index of the node to find the children of
 
         Returns:
-            list[int] | None: The indices of the vertices, or None on failure
+            set[int]: The indices of the vertices, empty if the node does not exist
         """
 
-        return set(self.__node_vertex_table.read_connection(node_index))
+        if not self.__node_allocator.is_allocated(node_index):
+            return set()
+
+        # sort all vertices by their parent once, until the next vertex is added or removed
+        if self.__node_children is None:
+            vertex_nodes = self.__vertex_nodes[: self.__vertex_allocator.length]
+            order = np.argsort(vertex_nodes, kind="stable")
+            offsets = np.searchsorted(
+                vertex_nodes[order], np.arange(self.__node_allocator.length + 1)
+            )
+            self.__node_children = (order, offsets)
+
+        order, offsets = self.__node_children
+        return set(order[offsets[node_index] : offsets[node_index + 1]].tolist())
 
     def remove_node(self, index):
         """
@@ -397,22 +1948,24 @@ class NodeBuffer:
             bool: True if the node was removed, False if it was not.
         """
 
+        # Test if node is already removed
+        if not self.__node_allocator.is_allocated(index):
+            return False
+
         # Read out node
         node = self.__nodes[index]
 
-        if node is None:
-            return False
-
         # Check if node is empty
-        children = self.get_node_children(index)
-        if len(children) != 0:
+        if self.__node_child_counts[index] != 0:
             return False
 
         # If the node is empty, it is safe to remove it
-        self.__node_vertex_table.delete_connection(index)
-        self.__nodes[index] = None
+        if self.__node_grid is not None:
+            self.__node_grid.remove(index, node)
+        self.__node_mask[index] = False
+        self.__node_allocator.release(index)
 
-        logging.info("Successfully removed node {} from index {}".format(node, index))
+        logging.info("Successfully removed node %s from index %s", node, index)
 
         return True
 
@@ -427,11 +1980,7 @@ class NodeBuffer:
             bool: True if the vertex was removed, False if it was not.
         """
 
-        # check for index out of range
-        if index >= len(self.__vertices):
-            return False
-
-        # check if vertex is already removed
+        # check for index out of range, or if vertex is already removed
         vertex = self.get_vertex(index)
         if vertex is None:
             return False
@@ -440,21 +1989,128 @@ class NodeBuffer:
         node = self.get_parent_node(index)
 
         # Remove vertex from node connection
-        self.__node_vertex_table.delete_connection(node, index)
+        self.__node_child_counts[node] -= 1
+        self.__node_children = None
 
         # Remove vertex from vertex table
-        del self.__vertex_node_dict[index]
+        self.__vertex_nodes[index] = -1
 
-        # Set vertex to null in backing buffer
-        self.__vertices[index] = None
+        # Mark vertex as dead in backing buffer
+        self.__vertex_mask[index] = False
+        self.__vertex_allocator.release(index)
 
-        logging.info("Successfully removed vertex {} at index {}".format(vertex, index))
+        logging.info("Successfully removed vertex %s at index %s", vertex, index)
 
         # Try to also remove parent node, if it is now empty
         self.remove_node(node)
 
         return True
 
+    def remove_vertices(self, indices):
+        """
+        Removes many vertices at once, together with all nodes left without children.
+        Vertices that don't exist are skipped.
+
+        Args:
+            indices (array-like[int]): The indices of the vertices to remove
+
+        Returns:
+            np.array[int]: The indices of the nodes that were removed
+        """
+
+        length = self.__vertex_allocator.length
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = indices[(indices >= 0) & (indices < length)]
+
+        # a mask over all vertices sorts out duplicates and removed vertices in one go
+        removed = np.zeros(length, dtype=bool)
+        removed[indices] = True
+        indices = np.flatnonzero(removed & self.__vertex_mask[:length])
+
+        nodes = self.__vertex_nodes[indices]
+        node_length = self.__node_allocator.length
+        self.__node_child_counts[:node_length] -= np.bincount(
+            nodes, minlength=node_length
+        )
+        self.__vertex_nodes[indices] = -1
+        self.__vertex_mask[indices] = False
+        self.__vertex_allocator.release_many(indices)
+        self.__node_children = None
+
+        # nodes without children are removed right away
+        emptied = np.zeros(node_length, dtype=bool)
+        emptied[nodes] = True
+        nodes = np.flatnonzero(emptied & (self.__node_child_counts[:node_length] == 0))
+        self.__node_mask[nodes] = False
+        self.__node_allocator.release_many(nodes)
+        if len(nodes) > 0:
+            self.__node_grid = None
+
+        logging.info(
+            "Removed %s vertices and %s nodes from node buffer",
+            len(indices),
+            len(nodes),
+        )
+
+        return nodes
+
+    def compacted_arrays(self):
+        """
+        Gets copies of all live vertices and nodes, renumbered from 0 like compact() would,
+        without changing the buffer.
+
+        Returns:
+            tuple[np.array[float], np.array[int], np.array[float], np.array[int], np.array[int]]:
+                The (V, 3) vertices, the parent node of every vertex, the (N, 3) nodes,
+                and the new index of every old vertex and node index, -1 for removed ones
+        """
+
+        vertex_mask = self.__vertex_mask[: self.__vertex_allocator.length]
+        node_mask = self.__node_mask[: self.__node_allocator.length]
+        vertex_remap = compaction_remap(vertex_mask)
+        node_remap = compaction_remap(node_mask)
+
+        vertices = self.__vertices[: len(vertex_mask)][vertex_mask]
+        vertex_nodes = node_remap[self.__vertex_nodes[: len(vertex_mask)][vertex_mask]]
+        nodes = self.__nodes[: len(node_mask)][node_mask]
+
+        return (vertices, vertex_nodes, nodes, vertex_remap, node_remap)
+
+    def compact(self):
+        """
+        Squeezes all removed vertices and nodes out of the buffer, in place.
+        Vertices and nodes keep their order, so they are renumbered from 0 by ascending index.
+        Every vertex keeps its parent node, only the indices change.
+
+        Returns:
+            tuple[np.array[int], np.array[int]]: The new index of every old vertex and node index,
+                -1 for removed ones
+        """
+
+        (
+            self.__vertices,
+            self.__vertex_nodes,
+            self.__nodes,
+            vertex_remap,
+            node_remap,
+        ) = self.compacted_arrays()
+
+        self.__vertex_mask = np.ones(len(self.__vertices), dtype=bool)
+        self.__vertex_allocator = IndexAllocator()
+        self.__vertex_allocator.allocate_range(len(self.__vertices))
+
+        self.__node_child_counts = np.bincount(
+            self.__vertex_nodes, minlength=len(self.__nodes)
+        )
+        self.__node_mask = np.ones(len(self.__nodes), dtype=bool)
+        self.__node_allocator = IndexAllocator()
+        self.__node_allocator.allocate_range(len(self.__nodes))
+
+        self.__node_children = None
+        self.__node_grid = None
+
+        return (vertex_remap, node_remap)
+
     def vertex_indices(self):
         """
         A list of all the vertex indices in the buffer
@@ -462,9 +2118,8 @@ class NodeBuffer:
         Returns:
             list[int]: The indices of the verts
         """
-        return (
-            i for i in range(len(self.__vertices)) if self.__vertices[i] is not None
-        )
+        indices = np.flatnonzero(self.__vertex_mask[: self.__vertex_allocator.length])
+        return (i for i in indices.tolist())
 
     def node_indices(self):
         """
@@ -474,7 +2129,8 @@ class NodeBuffer:
             list[int]: The indices of the nodes
         """
 
-        return (i for i in range(len(self.__nodes)) if self.__nodes[i] is not None)
+        indices = np.flatnonzero(self.__node_mask[: self.__node_allocator.length])
+        return (i for i in indices.tolist())
 
     def is_topology_valid(self):
         """
@@ -0,0 +1,121 @@
+import logging
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    A least-recently-used cache of command results, limited by the bytes it holds.
+    Values are read-only mesh snapshots or encoded transfers, so they can be handed out
+    to many sessions at once without copying them.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        Creates a new, empty cache
+
+        Args:
+            max_bytes (int | Optional): The number of bytes the cached values may hold
+        """
+
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # internal ordered dict matching keys to (value, size), the least recently used first
+        self.__entries = OrderedDict()
+        self.__nbytes = 0
+        # socket clients run commands from many threads
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def __size(value):
+        # snapshots report the bytes of their arrays, encoded transfers are bytes
+        nbytes = getattr(value, "nbytes", None)
+        return len(value) if nbytes is None else nbytes
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes held by the cached values
+
+        Returns:
+            int: The number of bytes
+        """
+
+        return self.__nbytes
+
+    def get(self, key):
+        """
+        Looks up a cached value, and marks it as the most recently used
+
+        Args:
+            key (hashable): The key of the value
+
+        Returns:
+            object | None: The value, or None if it is not cached
+        """
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        Caches a value, evicting the least recently used values until it fits.
+        Values larger than the whole budget are not cached.
+
+        Args:
+            key (hashable): The key of the value
+            value (MeshSnapshot | bytes): The value
+        """
+
+        size = self.__size(value)
+        if size > self.max_bytes:
+            logging.debug("Value of %s bytes exceeds the cache budget", size)
+            return
+
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.__nbytes -= previous[1]
+
+            while self.__entries and self.__nbytes + size > self.max_bytes:
+                _, (_, evicted_size) = self.__entries.popitem(last=False)
+                self.__nbytes -= evicted_size
+
+            self.__entries[key] = (value, size)
+            self.__nbytes += size
+
+    def clear(self):
+        """
+        Removes all values, the counters are kept
+        """
+
+        with self.__lock:
+            self.__entries.clear()
+            self.__nbytes = 0
+
+    def info(self):
+        """
+        A json serializable summary of the cache
+
+        Returns:
+            dict: The number of entries and bytes, the budget and the hit and miss counters
+        """
+
+        return {
+            "entries": len(self),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
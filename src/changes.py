@@ -0,0 +1,186 @@
+import bisect
+import itertools
+import numpy as np
+from buffers import reserve
+
+# versions are unique in the process, so a version names one state of one mesh
+__VERSIONS = itertools.count(1)
+
+
+def next_version():
+    """
+    Takes a new, unique version number
+
+    Returns:
+        int: The version, always larger than all versions taken before
+    """
+
+    return next(__VERSIONS)
+
+
+class ChangeTracker:
+    """
+    Tracks which faces of a mesh were added or removed, and when its vertices moved,
+    so clients can be sent only the changes since the version they have.
+    Operations that renumber the mesh reset the tracker, clients then get the whole mesh again.
+    Only the last HISTORY versions are kept, clients with older versions start over as well.
+    Moves are deliberately tracked for all vertices at once, since the only move is a transform
+    of the whole mesh, so a delta after a move holds the coordinates of all vertices.
+    """
+
+    HISTORY = 1024
+    """The number of versions clients can get a delta from"""
+
+    def __init__(self):
+        """
+        Creates a new tracker, for a new mesh
+        """
+
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets all changes, the current mesh becomes the base of all later deltas
+        """
+
+        self.version = next_version()
+        # the last versions this mesh has been at since the reset, ascending
+        self.__history = [self.version]
+        # array matching one face index to the version it was added at
+        self.__face_versions = np.zeros(16, dtype=np.int64)
+        # arrays of removed faces and the version they were removed at, ascending
+        self.__removed_faces = []
+        self.__removed_versions = []
+        # the last version all vertices were moved at, 0 if they did not move
+        self.__moved_version = 0
+
+    def __commit(self):
+        self.version = next_version()
+        self.__history.append(self.version)
+
+        # forget the oldest versions in batches, so trimming is amortized O(1)
+        if len(self.__history) > 2 * self.HISTORY:
+            del self.__history[: -self.HISTORY]
+            removed = bisect.bisect_left(self.__removed_versions, self.__history[0])
+            del self.__removed_faces[:removed]
+            del self.__removed_versions[:removed]
+
+        return self.version
+
+    def faces_added(self, face_indices):
+        """
+        Records new faces, with new vertices
+
+        Args:
+            face_indices (array-like[int]): The indices of the new faces
+        """
+
+        face_indices = np.asarray(face_indices, dtype=np.int64)
+        if len(face_indices) == 0:
+            return
+
+        self.__face_versions = reserve(self.__face_versions, face_indices.max() + 1)
+        self.__face_versions[face_indices] = self.__commit()
+
+    def faces_removed(self, face_indices):
+        """
+        Records removed faces, together with their vertices
+
+        Args:
+            face_indices (array-like[int]): The indices of the removed faces
+        """
+
+        face_indices = np.asarray(face_indices, dtype=np.int64)
+        if len(face_indices) == 0:
+            return
+
+        self.__removed_faces.append(face_indices)
+        self.__removed_versions.append(self.__commit())
+
+    def vertices_moved(self):
+        """
+        Records that all vertices moved, e.g. by a transform
+        """
+
+        self.__moved_version = self.__commit()
+
+    def since(self, version, face_indices):
+        """
+        The changes of the mesh since the given version
+
+        Args:
+            version (int): The version the client has
+            face_indices (np.array[int]): The indices of all live faces
+
+        Returns:
+            tuple[bool, np.array[bool], np.array[int], bool]: If the client has to start over,
+                which of the live faces are new to the client, the indices of removed faces,
+                and if all vertices moved
+        """
+
+        # versions of other meshes, from before the last reset,
+        # or older than the kept history can not be patched
+        position = bisect.bisect_left(self.__history, version)
+        if position == len(self.__history) or self.__history[position] != version:
+            return (
+                True,
+                np.ones(len(face_indices), dtype=bool),
+                np.empty(0, dtype=np.int64),
+                True,
+            )
+
+        face_indices = np.asarray(face_indices, dtype=np.int64)
+        self.__face_versions = reserve(
+            self.__face_versions, face_indices.max(initial=-1) + 1
+        )
+        added = self.__face_versions[face_indices] > version
+
+        # only the removals after the version are read, not the whole history
+        first = bisect.bisect_right(self.__removed_versions, version)
+        removed = np.empty(0, dtype=np.int64)
+        if first < len(self.__removed_faces):
+            removed = np.concatenate(self.__removed_faces[first:])
+
+        return (False, added, removed, self.__moved_version > version)
+
+
+class MeshDelta:
+    """
+    The changes of a mesh since a version, in mesh indices.
+    Clients apply them in order: drop the removed faces with their vertices,
+    then add the new faces, then move the listed vertices.
+    """
+
+    def __init__(
+        self,
+        version,
+        reset,
+        face_indices,
+        offsets,
+        indices,
+        removed_faces,
+        vertex_indices,
+        vertices,
+    ):
+        """
+        Creates a new delta
+
+        Args:
+            version (int): The version of the mesh the delta leads to
+            reset (bool): True if the client has to drop its mesh first, the delta then holds the whole mesh
+            face_indices (np.array[int]): The indices of the new faces
+            offsets (np.array[int]): The CSR offsets of the new faces
+            indices (np.array[int]): The flat vertex indices of the new faces
+            removed_faces (np.array[int]): The indices of the removed faces
+            vertex_indices (np.array[int]): The indices of the new and moved vertices
+            vertices (np.array[float]): The (V, 3) coordinates of the new and moved vertices
+        """
+
+        self.version = version
+        self.reset = reset
+        self.face_indices = face_indices
+        self.offsets = offsets
+        self.indices = indices
+        self.removed_faces = removed_faces
+        self.vertex_indices = vertex_indices
+        self.vertices = vertices
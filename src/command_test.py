@@ -1,4 +1,4 @@
-from proxy import Proxy, CommandBuilder
+from proxy import Proxy, CommandBuilder, house_variants_script
 import Rhino
 import Rhino.Geometry as rg
 import scriptcontext as sc
@@ -9,11 +9,11 @@ import rhino_proxy
 def square_command():
     proxy = Proxy()
 
-    for i in range(6):
-
-        proxy.execute_command(CommandBuilder().house(10.0).build())
-        cmd = CommandBuilder().orient(i).subdivide(1).transfer().build()
-        mesh = rhino_proxy.mesh_from_buffer(proxy.execute_command(cmd))
+    # send all commands at once, and add every house as soon as it arrives
+    results = proxy.execute_script(house_variants_script(10.0, 6))
+    buffers = (result for result in results if result is not None)
+    for i, buffer in enumerate(buffers):
+        mesh = rhino_proxy.mesh_from_buffer(buffer)
         sc.doc.Objects.AddMesh(mesh)
 
         print("Added house {}".format(i + 1))
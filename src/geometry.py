@@ -33,6 +33,22 @@ class Plane:
         matrix = matrix.transpose()
         self.__matrix = np.vstack([matrix, np.array([0, 0, 0, 1])])
 
+    @staticmethod
+    def from_matrix(matrix):
+        """
+        Creates a plane from its 4x4 parametrical matrix [U, V, N, Q], without recalculating the axes.
+
+        Args:
+            matrix (array-like): The matrix of the plane, with orthonormal axes.
+
+        Returns:
+            Plane: The new plane
+        """
+
+        plane = Plane.__new__(Plane)
+        plane.__matrix = np.array(matrix, dtype=float)
+        return plane
+
     @property
     def x_axis(self):
         """
@@ -150,3 +166,96 @@ class Plane:
 
         inverse = np.linalg.inv(self.__matrix)
         return Plane.__to_carthesian(inverse.dot(Plane.__to_homogenous(vector)))
+
+
+def __unitize_rows(vectors):
+    """
+    Unitizes all rows of a (N, 3) array, leaving zero length rows at zero.
+
+    Args:
+        vectors (np.array[float]): The vectors to unitize
+
+    Returns:
+        np.array[float]: The unit vectors
+    """
+
+    lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, lengths, out=np.zeros_like(vectors), where=lengths > 0)
+
+
+def face_centers(coords, offsets):
+    """
+    Calculates the centers of many faces at once, as the average of their corners.
+
+    Args:
+        coords (np.array[float]): The (C, 3) corner coordinates of all faces, in face order
+        offsets (np.array[int]): The CSR offsets of the faces into coords
+
+    Returns:
+        np.array[float]: The (F, 3) face centers
+    """
+
+    if len(offsets) < 2:
+        return np.zeros((0, 3))
+
+    sizes = np.diff(offsets)
+    return np.add.reduceat(coords, offsets[:-1], axis=0) / sizes[:, np.newaxis]
+
+
+def face_area_vectors(coords, offsets):
+    """
+    Calculates the area vectors of many faces at once, with Newell's method.
+    The vectors point along the face normal, and their length is the area of the face.
+
+    Args:
+        coords (np.array[float]): The (C, 3) corner coordinates of all faces, in face order
+        offsets (np.array[int]): The CSR offsets of the faces into coords
+
+    Returns:
+        np.array[float]: The (F, 3) area vectors
+    """
+
+    if len(offsets) < 2:
+        return np.zeros((0, 3))
+
+    sizes = np.diff(offsets)
+    corner_faces = np.repeat(np.arange(len(sizes)), sizes)
+    starts = offsets[corner_faces]
+    next_corners = starts + (np.arange(len(coords)) - starts + 1) % sizes[corner_faces]
+
+    # moving the corners to the face center keeps the cross products small
+    local = coords - face_centers(coords, offsets)[corner_faces]
+    crosses = np.cross(local, local[next_corners])
+    return 0.5 * np.add.reduceat(crosses, offsets[:-1], axis=0)
+
+
+def face_plane_matrices(coords, offsets):
+    """
+    Calculates the plane matrices of many faces at once.
+    Every plane has its origin at the first corner of the face,
+    its x-axis towards the second corner, and lies in the plane of the first, second and last corner.
+
+    Args:
+        coords (np.array[float]): The (C, 3) corner coordinates of all faces, in face order
+        offsets (np.array[int]): The CSR offsets of the faces into coords
+
+    Returns:
+        np.array[float]: The (F, 4, 4) plane matrices, like Plane.get_matrix()
+    """
+
+    origins = coords[offsets[:-1]]
+    x_axes = __unitize_rows(coords[offsets[:-1] + 1] - origins)
+    y_axes = coords[offsets[1:] - 1] - origins
+
+    # double crossing makes the y-axis perpendicular to the x-axis
+    z_axes = __unitize_rows(np.cross(x_axes, y_axes))
+    y_axes = np.cross(z_axes, x_axes)
+
+    matrices = np.zeros((len(origins), 4, 4))
+    matrices[:, :3, 0] = x_axes
+    matrices[:, :3, 1] = y_axes
+    matrices[:, :3, 2] = z_axes
+    matrices[:, :3, 3] = origins
+    matrices[:, 3, 3] = 1.0
+
+    return matrices
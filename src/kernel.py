@@ -1,9 +1,13 @@
 import logging
 import math
 
-from buffers import OneToManyConnectionTable, NodeBuffer
+from buffers import EdgeTable, FaceBuffer, NodeBuffer, reserve
+import geometry
 from geometry import Plane
 import numpy as np
+from snapshot import MeshSnapshot
+import subdivision
+from transform import transform_points
 
 
 class Kernel:
@@ -18,8 +22,37 @@ class Kernel:
         """
 
         self.__node_buffer = NodeBuffer()
-        self.__face_buffer = OneToManyConnectionTable()
-        self.__vertex_face_connection = {}
+        self.__face_buffer = FaceBuffer()
+        # table of all node edges, and the faces using them
+        self.__edge_table = EdgeTable()
+        # array matching one vertex index to its parent face index, -1 for no parent
+        self.__vertex_faces = np.full(16, -1, dtype=np.int64)
+        # lazily built CSR adjacency indices by name, empty until they are queried after a change
+        self.__adjacency = {}
+        # lazily computed face geometry arrays by name, empty until they are queried after a change
+        self.__geometry = {}
+
+    @staticmethod
+    def from_snapshot(snapshot):
+        """
+        Creates a new kernel from the compact arrays of a snapshot, without welding vertices again
+
+        Args:
+            snapshot (MeshSnapshot): The snapshot to load
+
+        Returns:
+            Kernel: The new kernel, with indices matching the rows of the snapshot
+        """
+
+        kernel = Kernel()
+        kernel.__load_arrays(
+            snapshot.vertices,
+            snapshot.vertex_nodes,
+            snapshot.nodes,
+            snapshot.offsets,
+            snapshot.indices,
+        )
+        return kernel
 
     # region properties
 
@@ -53,26 +86,47 @@ class Kernel:
         """
         return self.__face_buffer.count
 
+    @property
+    def edge_count(self):
+        """
+        The number of unique node edges of the kernel
+
+        Returns:
+            int: The number of edges
+        """
+        return self.__edge_table.count
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes held by the buffers and cached arrays of the kernel
+
+        Returns:
+            int: The number of bytes
+        """
+
+        cached = 0
+        for value in list(self.__adjacency.values()) + list(self.__geometry.values()):
+            # adjacencies are stored as (offsets, indices) pairs
+            for array in value if isinstance(value, tuple) else (value,):
+                if array is not None:
+                    cached += array.nbytes
+
+        return (
+            self.__node_buffer.nbytes
+            + self.__face_buffer.nbytes
+            + self.__edge_table.nbytes
+            + self.__vertex_faces.nbytes
+            + cached
+        )
+
     # endregion
 
     # region private helper methods
 
-    def __get_next_free_face_index(self):
-        index = 0
-        while True:
-            if self.__face_buffer.read_connection(index) is None:
-                return index
-            else:
-                index += 1
-
     def __face_edge(self, face_index, edge_index):
         verts = self.__get_face_vertices(face_index)
-        return (
-            verts[edge_index],
-            verts[
-                (edge_index + 1) % len(self.__face_buffer.read_connection(face_index))
-            ],
-        )
+        return (verts[edge_index], verts[(edge_index + 1) % len(verts)])
 
     def __point_between_points(cls, a, b, t):
         return np.array([v0 + t * (v1 - v0) for v0, v1 in zip(a, b)])
@@ -90,22 +144,155 @@ class Kernel:
 
         return div_points
 
-    def __point_on_face_edge(self, face_index, edge_index, t):
-        a, b = self.__face_edge(face_index, edge_index)
-        return self.__point_between_points(a, b, t)
-
     def __points_on_face_edge(self, face_index, edge_index, count):
         a, b = self.__face_edge(face_index, edge_index)
         return self.__points_between_points(a, b, count)
 
     @staticmethod
-    def __unitize_coord(coord):
-        return coord / np.linalg.norm(coord)
+    def __pairs_to_csr(rows, columns, row_count):
+        """
+        Builds a compressed-sparse-row index from (row, column) pairs.
+        Duplicate pairs are removed, and columns are sorted within every row.
+
+        Args:
+            rows (np.array[int]): The row of every pair
+            columns (np.array[int]): The column of every pair
+            row_count (int): The number of rows of the index
+
+        Returns:
+            tuple[np.array[int], np.array[int]]: The offsets and the flat column indices
+        """
+
+        order = np.lexsort((columns, rows))
+        rows = rows[order]
+        columns = columns[order]
+
+        unique = np.ones(len(rows), dtype=bool)
+        unique[1:] = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+        rows = rows[unique]
+
+        offsets = np.searchsorted(rows, np.arange(row_count + 1))
+        return (offsets, columns[unique])
+
+    def __get_adjacency(self, name):
+        # adjacencies are rebuilt together, once after every change of the topology
+        if not self.__adjacency:
+            vertex_indices = np.flatnonzero(self.__vertex_faces >= 0)
+            vertex_nodes = self.__node_buffer.get_parent_nodes(vertex_indices)
+            vertex_faces = self.__vertex_faces[vertex_indices]
+            node_length = self.__node_buffer.node_length
+            face_length = self.__face_buffer.length
+
+            node_faces = self.__pairs_to_csr(vertex_nodes, vertex_faces, node_length)
+
+            edges = self.__edge_table.edge_array()
+            node_nodes = self.__pairs_to_csr(
+                np.concatenate([edges[:, 0], edges[:, 1]]),
+                np.concatenate([edges[:, 1], edges[:, 0]]),
+                node_length,
+            )
+
+            # every face around a node is a neighbor of all other faces around it
+            offsets, faces = node_faces
+            counts = np.diff(offsets)
+            entry_counts = np.repeat(counts, counts)
+            entry_starts = np.repeat(offsets[:-1], counts)
+            within = np.arange(entry_counts.sum()) - np.repeat(
+                np.cumsum(entry_counts) - entry_counts, entry_counts
+            )
+            rows = np.repeat(faces, entry_counts)
+            columns = faces[np.repeat(entry_starts, entry_counts) + within]
+            different = rows != columns
+            face_faces = self.__pairs_to_csr(
+                rows[different], columns[different], face_length
+            )
+
+            self.__adjacency = {
+                "node_faces": node_faces,
+                "node_nodes": node_nodes,
+                "face_faces": face_faces,
+            }
+
+        return self.__adjacency[name]
+
+    def __get_geometry(self, name):
+        # face geometry is computed for all faces together, once after every change of the mesh
+        if not self.__geometry:
+            offsets, indices = self.__face_buffer.csr()
+            coords = self.__node_buffer.get_vertices(indices)
+            area_vectors = geometry.face_area_vectors(coords, offsets)
+            areas = np.linalg.norm(area_vectors, axis=1)
+
+            self.__geometry = {
+                "indices": self.__face_buffer.face_indices(),
+                "centers": geometry.face_centers(coords, offsets),
+                "normals": np.divide(
+                    area_vectors,
+                    areas[:, np.newaxis],
+                    out=np.zeros_like(area_vectors),
+                    where=areas[:, np.newaxis] > 0,
+                ),
+                "areas": areas,
+                "planes": geometry.face_plane_matrices(coords, offsets),
+                # every vertex belongs to a face, so the face corners span the whole kernel
+                "bounds": (
+                    np.array([coords.min(axis=0), coords.max(axis=0)])
+                    if len(coords) > 0
+                    else None
+                ),
+            }
+
+            # the arrays are shared between callers, until the cache is invalidated
+            for array in self.__geometry.values():
+                if array is not None:
+                    array.setflags(write=False)
+
+        return self.__geometry[name]
+
+    def __face_row(self, face_index):
+        # face geometry rows follow the ascending face indices
+        indices = self.__get_geometry("indices")
+        row = int(np.searchsorted(indices, face_index))
+        if row == len(indices) or indices[row] != face_index:
+            return None
+
+        return row
+
+    @staticmethod
+    def __csr_row(csr, row):
+        offsets, indices = csr
+        if not 0 <= row < len(offsets) - 1:
+            return indices[:0]
+
+        return indices[offsets[row] : offsets[row + 1]]
 
     def __get_face_vertices(self, face_index):
-        return [
-            self.get_vertex(vertex_index) for vertex_index in self.get_face(face_index)
-        ]
+        # gathering copies the vertices, as their rows might be reused once the face is removed
+        return list(self.__node_buffer.get_vertices(self.get_face(face_index)))
+
+    def __load_arrays(self, vertices, vertex_nodes, nodes, offsets, indices):
+        """
+        Replaces all buffers of the kernel with compact, already welded arrays
+
+        Args:
+            vertices (np.array[float]): The (V, 3) vertex coordinates
+            vertex_nodes (np.array[int]): The parent node of every vertex
+            nodes (np.array[float]): The (N, 3) node positions
+            offsets (np.array[int]): The CSR offsets of the faces into indices
+            indices (np.array[int]): The flat vertex indices of the faces
+        """
+
+        self.__node_buffer = NodeBuffer.from_arrays(vertices, vertex_nodes, nodes)
+        self.__face_buffer = FaceBuffer.from_arrays(offsets, indices)
+        self.__edge_table = EdgeTable.from_faces(
+            offsets, np.asarray(vertex_nodes)[indices]
+        )
+        self.__vertex_faces = np.full(len(vertices), -1, dtype=np.int64)
+        self.__vertex_faces[indices] = np.repeat(
+            np.arange(len(offsets) - 1), np.diff(offsets)
+        )
+        self.__adjacency = {}
+        self.__geometry = {}
 
     # endregion
 
@@ -125,6 +312,7 @@ class Kernel:
 
     def set_vertex(self, vertex_index, value):
         self.__node_buffer.set_vertex(vertex_index, value)
+        self.__geometry = {}
 
     def get_face(self, face_index):
         """
@@ -134,10 +322,10 @@ class Kernel:
             face_index (int): The index of the face
 
         Returns:
-            set[int]: The vertex indices containend in the face
+            np.array[int] | None: A view of the ordered vertex indices containend in the face
         """
 
-        return self.__face_buffer.read_connection(face_index)
+        return self.__face_buffer.get_face(face_index)
 
     def get_node(self, node_index):
         """
@@ -182,25 +370,120 @@ class Kernel:
         Returns:
             generator[int]: The face indices
         """
-        # we have to list the keys here, otherwise we might mutate the dict while iterating over it
-        return (key for key in list(self.__face_buffer.keys()))
+        # we have to copy the indices here, otherwise we might mutate the buffer while iterating over it
+        return (index for index in self.__face_buffer.face_indices().tolist())
+
+    def face_connectivity(self):
+        """
+        The vertex indices of all faces, in compressed-sparse-row layout.
+        The vertices of the i-th face are indices[offsets[i]:offsets[i + 1]],
+        faces are in the same order as self.faces()
+
+        Returns:
+            tuple[np.array[int], np.array[int]]: The offsets and the flat vertex indices
+        """
+
+        return self.__face_buffer.csr()
+
+    def fixed_width_faces(self):
+        """
+        The vertex indices of all faces, as a (F, n) array.
+        This only works for meshes where all faces have the same vertex count,
+        like meshes of quads only. Faces are in the same order as self.faces()
+
+        Returns:
+            np.array[int] | None: The faces, or None if the face sizes are mixed
+        """
+
+        return self.__face_buffer.fixed_width_array()
+
+    def vertex_array(self):
+        """
+        The positions of all vertices, in the order of self.vertices()
+
+        Returns:
+            np.array[float]: A copy of the coordinates, as a (V, 3) array
+        """
+
+        return self.__node_buffer.vertex_array()
+
+    def get_vertices(self, vertex_indices):
+        """
+        Gets the positions of many vertices at once
+
+        Args:
+            vertex_indices (array-like[int]): The indices of the vertices
+
+        Returns:
+            np.array[float]: The coordinates of the vertices, as a (N, 3) array
+        """
+
+        return self.__node_buffer.get_vertices(vertex_indices)
 
     def node_edges(self):
         """
         An iterator over all undirected edges of the mesh
 
         Returns:
-            generator[set[int]]: The edges
+            generator[tuple[int, int]]: The sorted node indices of the edges
         """
 
-        edges = set()
+        return (tuple(edge) for edge in self.__edge_table.edge_array().tolist())
 
-        for face_index in self.faces():
-            edges.update(
-                set((self.edge_nodes(edge) for edge in self.face_edges(face_index)))
-            )
+    def edge_indices(self):
+        """
+        The indices of all node edges, ordered like self.node_edges()
+
+        Returns:
+            np.array[int]: The edge indices
+        """
 
-        return (edge for edge in edges)
+        return self.__edge_table.edge_indices()
+
+    def boundary_edges(self):
+        """
+        The indices of all node edges that are used by a single face only
+
+        Returns:
+            np.array[int]: The edge indices
+        """
+
+        return self.__edge_table.boundary_edges()
+
+    def node_adjacency(self):
+        """
+        The neighbors of all nodes, in compressed-sparse-row layout.
+        The nodes connected to the i-th node by an edge are indices[offsets[i]:offsets[i + 1]],
+        rows of removed nodes are empty.
+
+        Returns:
+            tuple[np.array[int], np.array[int]]: The offsets and the flat node indices
+        """
+
+        return self.__get_adjacency("node_nodes")
+
+    def node_face_adjacency(self):
+        """
+        The faces around all nodes, in compressed-sparse-row layout.
+        The faces using the i-th node are indices[offsets[i]:offsets[i + 1]]
+
+        Returns:
+            tuple[np.array[int], np.array[int]]: The offsets and the flat face indices
+        """
+
+        return self.__get_adjacency("node_faces")
+
+    def face_adjacency(self):
+        """
+        The neighbors of all faces, in compressed-sparse-row layout.
+        The faces sharing a node with the i-th face are indices[offsets[i]:offsets[i + 1]],
+        rows of removed faces are empty.
+
+        Returns:
+            tuple[np.array[int], np.array[int]]: The offsets and the flat face indices
+        """
+
+        return self.__get_adjacency("face_faces")
 
     def vertex_edges(self):
         """
@@ -233,18 +516,57 @@ class Kernel:
         # add all vertices to the kernel, and store their indices
         indices = [self.__node_buffer.add_vertex(vertex) for vertex in vertices]
 
-        # obtain the next free face index as a key
-        face_index = self.__get_next_free_face_index()
-
-        # link the face index to the added vertices
-        self.__face_buffer.create_connection(face_index)
-        self.__face_buffer.update_connection(face_index, *indices)
+        # link the added vertices to a face at the next free face index
+        face_index = self.__face_buffer.add_face(indices)
+        self.__edge_table.add_face(
+            face_index, self.__node_buffer.get_parent_nodes(indices).tolist()
+        )
 
         # link the added vertices to their parent face
-        self.__vertex_face_connection.update({index: face_index for index in indices})
+        self.__vertex_faces = reserve(self.__vertex_faces, max(indices) + 1, -1)
+        self.__vertex_faces[indices] = face_index
+        self.__adjacency = {}
+        self.__geometry = {}
 
         return face_index
 
+    def add_new_faces(self, coords, offsets, indices, contiguous=False):
+        """
+        Adds many new faces to the kernel at once, at the lowest free face indices like add_new_face.
+        Every face corner becomes a new vertex, and all of them are welded in one batched pass.
+
+        Args:
+            coords (np.array[float]): The (N, 3) points the faces are built from
+            offsets (np.array[int]): The CSR offsets of the faces into indices
+            indices (np.array[int]): The flat point indices of the faces
+            contiguous (bool | Optional): True to append the faces at the end of the face index range instead,
+                so their indices form a range
+
+        Returns:
+            np.array[int] | range: The indices of the added faces, a range if contiguous
+        """
+
+        offsets = np.asarray(offsets, dtype=np.int64)
+        indices = np.asarray(indices, dtype=np.int64)
+
+        vertex_indices = self.__node_buffer.add_vertices(np.asarray(coords)[indices])
+        face_indices = self.__face_buffer.add_faces(offsets, vertex_indices, contiguous)
+
+        self.__edge_table.add_faces(
+            face_indices, offsets, self.__node_buffer.get_parent_nodes(vertex_indices)
+        )
+
+        self.__vertex_faces = reserve(
+            self.__vertex_faces, self.__node_buffer.vertex_length, -1
+        )
+        self.__vertex_faces[vertex_indices] = np.repeat(
+            np.asarray(face_indices), np.diff(offsets)
+        )
+        self.__adjacency = {}
+        self.__geometry = {}
+
+        return face_indices
+
     def remove_face(self, face_index):
         """
         Removes the given face from the mesh.
@@ -260,22 +582,133 @@ class Kernel:
         """
 
         # read out face vertices
-        indices = self.__face_buffer.read_connection(face_index)
+        indices = self.__face_buffer.get_face(face_index)
 
         # if we don't find vertices, the face probably isn't defined for that index
         if indices is None:
             return False
 
         # delete face from face buffer
-        self.__face_buffer.delete_connection(face_index)
+        indices = indices.tolist()
+        self.__edge_table.remove_face(
+            face_index, self.__node_buffer.get_parent_nodes(indices).tolist()
+        )
+        self.__face_buffer.remove_face(face_index)
 
         # delete all vertex-links from vertex-face map
-        for index in indices:
-            del self.__vertex_face_connection[index]
+        self.__vertex_faces[indices] = -1
+        self.__adjacency = {}
+        self.__geometry = {}
 
         # remove vertices from nodebuffer
         return all([self.__node_buffer.remove_vertex(index) for index in indices])
 
+    def remove_faces(self, face_indices):
+        """
+        Removes many faces from the mesh at once.
+        This will remove the faces, their vertices
+        and all parent nodes of the vertices, that are empty afterwards.
+        Faces that don't exist are skipped.
+
+        Args:
+            face_indices (array-like[int]): The indices of the faces to remove
+
+        Returns:
+            np.array[int]: The indices of the faces that were removed
+        """
+
+        face_indices = self.__face_buffer.remove_faces(face_indices)
+        if len(face_indices) == 0:
+            return face_indices
+
+        # removed faces keep their span in the face buffer, so their vertices can still be read
+        offsets, indices = self.__face_buffer.spans(face_indices)
+
+        self.__edge_table.remove_faces(
+            face_indices, offsets, self.__node_buffer.get_parent_nodes(indices)
+        )
+        self.__vertex_faces[indices] = -1
+        self.__node_buffer.remove_vertices(indices)
+
+        self.__adjacency = {}
+        self.__geometry = {}
+
+        return face_indices
+
+    def snapshot(self, matrix=None):
+        """
+        Copies the live contents of the kernel into compact, read-only arrays.
+        The rows are numbered like compact() would, but the kernel itself is not changed.
+
+        Args:
+            matrix (np.array[float] | Optional): A 4x4 transform to apply to the copied positions
+
+        Returns:
+            MeshSnapshot: The snapshot
+        """
+
+        (
+            vertices,
+            vertex_nodes,
+            nodes,
+            vertex_remap,
+            node_remap,
+        ) = self.__node_buffer.compacted_arrays()
+        offsets, indices = self.__face_buffer.csr()
+
+        if matrix is not None:
+            transform_points(matrix, vertices, out=vertices)
+            transform_points(matrix, nodes, out=nodes)
+
+        return MeshSnapshot(
+            vertices,
+            vertex_nodes,
+            nodes,
+            offsets,
+            vertex_remap[indices],
+            np.flatnonzero(vertex_remap != -1),
+            np.flatnonzero(node_remap != -1),
+            self.__face_buffer.face_indices(),
+        )
+
+    def compact(self):
+        """
+        Squeezes all removed vertices, nodes, faces and edges out of the buffers, in place.
+        Everything keeps its order and its links, only the indices are renumbered from 0.
+        The cost is linear in the size of the buffers.
+
+        Returns:
+            tuple[np.array[int], np.array[int], np.array[int], np.array[int]]:
+                The old-to-new index tables of the vertices, nodes, faces and edges,
+                with -1 for removed indices
+        """
+
+        vertex_remap, node_remap = self.__node_buffer.compact()
+        face_remap = self.__face_buffer.compact(vertex_remap)
+        edge_remap = self.__edge_table.compact(node_remap, face_remap)
+
+        live = np.flatnonzero(vertex_remap != -1)
+        self.__vertex_faces = face_remap[self.__vertex_faces[live]]
+        self.__adjacency = {}
+        self.__geometry = {}
+
+        return (vertex_remap, node_remap, face_remap, edge_remap)
+
+    # endregion
+
+    # region transformation
+
+    def transform(self, matrix):
+        """
+        Transforms all vertices and nodes of the kernel in place
+
+        Args:
+            matrix (np.array[float]): The 4x4 transformation matrix
+        """
+
+        self.__node_buffer.transform(matrix)
+        self.__geometry = {}
+
     # endregion
 
     # region face queries
@@ -309,21 +742,10 @@ class Kernel:
         Returns:
             set[int]: The indices of the neighbor faces
         """
-        # empty index set for all face indices
-        neighbor_indices = set()
-
-        # get all face_nodes
-        nodes = self.face_nodes(face_index)
-
-        # get node faces and add to set
-        for node in nodes:
-            neighbor_indices.update(set(self.node_faces(node)))
 
-        # remove face_index from set, as it's not technically a neighbor
-        neighbor_indices.remove(face_index)
-
-        # return neighbor_indices
-        return neighbor_indices
+        return set(
+            self.__csr_row(self.__get_adjacency("face_faces"), face_index).tolist()
+        )
 
     def face_edge(self, face_index, edge_index):
         """
@@ -336,11 +758,13 @@ class Kernel:
         Returns:
             Set[int]: A set of the two vertex indices connected by the edge
         """
-        indices = list(self.get_face(face_index))
+        indices = self.get_face(face_index)
         if indices is None:
             return
 
-        return set([indices[edge_index], indices[(edge_index + 1) % len(indices)]])
+        return set(
+            [int(indices[edge_index]), int(indices[(edge_index + 1) % len(indices)])]
+        )
 
     def face_edges(self, face_index):
         """
@@ -353,8 +777,7 @@ class Kernel:
             generator[Set[int]]: A list of sets of the two vertex indices connected by their edge
         """
         return (
-            self.face_edge(face_index, i)
-            for i in range(len(self.__get_face_vertices(face_index)))
+            self.face_edge(face_index, i) for i in range(len(self.get_face(face_index)))
         )
 
     def face_plane(self, face_index):
@@ -368,24 +791,11 @@ class Kernel:
             Plane: The plane of the face, with origin at the first face vertex
         """
 
-        # Get vertices of face
-        verts = self.__get_face_vertices(face_index)
-
-        # extract origin and x axis from vertices
-        origin = verts[0]
-        x_axis = verts[1] - verts[0]
-        y_axis = verts[-1] - verts[0]
-
-        # Make sure y-axis is perpendicular to z-axis by double-crossing
-        z_axis = np.cross(x_axis, y_axis)
-        y_axis = np.cross(z_axis, x_axis)
-
-        # Unitize axes
-        x_axis = self.__unitize_coord(x_axis)
-        y_axis = self.__unitize_coord(y_axis)
+        row = self.__face_row(face_index)
+        if row is None:
+            return None
 
-        # Return the face plane
-        return Plane(origin, x_axis, y_axis)
+        return Plane.from_matrix(self.__get_geometry("planes")[row])
 
     def face_center(self, face_index):
         """
@@ -395,26 +805,66 @@ class Kernel:
             face_index (int): The index of the face to calculate the center of
 
         Returns:
-            list[float]: The coordinates of the center as a list
+            np.array[float]: The coordinates of the center, or None if the face does not exist
         """
 
-        # get the face vertices
-        verts = self.__get_face_vertices(face_index)
+        row = self.__face_row(face_index)
+        if row is None:
+            return None
+
+        return self.__get_geometry("centers")[row].copy()
+
+    def face_centers(self):
+        """
+        The centers of all faces, in the same order as self.faces()
+
+        Returns:
+            np.array[float]: The read-only (F, 3) face centers
+        """
 
-        return np.mean(verts, axis=0)
+        return self.__get_geometry("centers")
 
-        # initialize a helper vert at the origin
-        zero = np.array([0, 0, 0])
+    def face_normals(self):
+        """
+        The unit normals of all faces, in the same order as self.faces().
+        Normals are calculated with Newell's method, so they are stable for non-planar ngons.
 
-        # iterate over vertices in face
-        for vert in verts:
+        Returns:
+            np.array[float]: The read-only (F, 3) face normals
+        """
 
-            # add coordinates of vertices together
-            for i in range(3):
-                zero[i] += vert[i]
+        return self.__get_geometry("normals")
 
-        # return averaged vertices
-        return zero / len(verts)
+    def face_areas(self):
+        """
+        The areas of all faces, in the same order as self.faces()
+
+        Returns:
+            np.array[float]: The read-only face areas
+        """
+
+        return self.__get_geometry("areas")
+
+    def bounding_box(self):
+        """
+        The axis aligned bounding box of all vertices
+
+        Returns:
+            np.array[float] | None: The (2, 3) minimum and maximum corner, or None without vertices
+        """
+
+        return self.__get_geometry("bounds")
+
+    def face_planes(self):
+        """
+        The plane matrices of all faces, in the same order as self.faces().
+        Every matrix is the matrix of self.face_plane() for the same face.
+
+        Returns:
+            np.array[float]: The read-only (F, 4, 4) plane matrices
+        """
+
+        return self.__get_geometry("planes")
 
     def parent_face(self, vertex_index):
         """
@@ -427,7 +877,11 @@ class Kernel:
             int: The index of the parent face, or None if no parent is definend
         """
 
-        return self.__vertex_face_connection.get(vertex_index)
+        if not 0 <= vertex_index < len(self.__vertex_faces):
+            return None
+
+        face_index = int(self.__vertex_faces[vertex_index])
+        return face_index if face_index >= 0 else None
 
     # endregion
 
@@ -457,31 +911,9 @@ class Kernel:
             Set[int]: The indices of the connected nodes
         """
 
-        # empty set for neighbor indices
-        neighbor_indices = set()
-
-        # get node faces
-        faces = self.node_faces(node_index)
-
-        # iterate over node faces
-        for face_index in faces:
-
-            # iterate over face edges
-            for edge in self.face_edges(face_index):
-
-                # test if the edge is connected to our starting node
-                nodes = self.edge_nodes(edge)
-                if not node_index in nodes:
-                    continue
-
-                # add edge to neighbor_indices
-                neighbor_indices.update(nodes)
-
-        # remove node index from neighbors
-        neighbor_indices.remove(node_index)
-
-        # return neighbors
-        return neighbor_indices
+        return set(
+            self.__csr_row(self.__get_adjacency("node_nodes"), node_index).tolist()
+        )
 
     def node_faces(self, node_index):
         """
@@ -493,9 +925,9 @@ class Kernel:
         Returns:
             generator[int]: The faces connected through the node.
         """
-        return (
-            self.parent_face(vertex_index) for vertex_index in self.get_node(node_index)
-        )
+
+        faces = self.__csr_row(self.__get_adjacency("node_faces"), node_index)
+        return (face_index for face_index in faces.tolist())
 
     def node_position(self, node_index):
         return self.__node_buffer.node_position(node_index)
@@ -527,7 +959,40 @@ class Kernel:
         Returns:
             generator[int]: One or two faces, or None if the edge is invalid
         """
-        return (self.parent_face(index) for index in edge)
+
+        edge_index = self.find_edge(*self.edge_nodes(edge))
+        if edge_index is None:
+            return None
+
+        return (face for face, _ in self.__edge_table.edge_faces(edge_index))
+
+    def find_edge(self, node_a, node_b):
+        """
+        Finds the node edge between two nodes.
+        Edge indices are stable while the edge exists, so they can be used to number edge values.
+
+        Args:
+            node_a (int): The index of the first node
+            node_b (int): The index of the second node
+
+        Returns:
+            int | None: The index of the edge, or None if the nodes are not connected
+        """
+
+        return self.__edge_table.find_edge(node_a, node_b)
+
+    def node_edge_faces(self, edge_index):
+        """
+        Gets the faces using a node edge, with the local index of the edge in each face
+
+        Args:
+            edge_index (int): The index of the edge
+
+        Returns:
+            list[tuple[int, int]]: The face indices and local edge indices
+        """
+
+        return self.__edge_table.edge_faces(edge_index)
 
     # endregion
 
@@ -537,6 +1002,7 @@ class Kernel:
         """
         Subdivides the given face into n quads, where n is the number of vertices in the face.
         This function can be run recursively by supplying a recursion depth >= 1.
+        The child points of all levels are computed at once, from the cached subdivision stencil of the face.
 
         Args:
             face_index (int): The index of the face to subdivide
@@ -546,53 +1012,64 @@ class Kernel:
             list (int): The indices of the newly generated faces
         """
 
-        # empty index buffer to be filled with result of subdivision
-        index_buffer = []
-
         # get vertices defined in face
         verts = self.__get_face_vertices(face_index)
-        vertex_count = len(verts)
-
-        # calculate the face center
-        center = self.face_center(face_index)
 
-        # calculate mid points for all edges defined on the face
-        edge_mid_points = [
-            self.__point_on_face_edge(face_index, e, 0.5) for e in range(vertex_count)
-        ]
+        # all levels of the recursion are baked into the stencil of the face
+        face_stencil = subdivision.stencil(len(verts), max(recursion_depth, 1))
+        points = face_stencil.weights.dot(np.array(verts))
 
         # remove the initial, now subidivided face
         self.remove_face(face_index)
 
-        # iterate over face vertices
-        for i in range(vertex_count):
+        # add all quads of the stencil in one batch, offset into the child points,
+        # they take the lowest free face indices, so the index of the removed face is reused
+        quads = face_stencil.quads
+        offsets = np.arange(0, quads.size + 1, quads.shape[1])
+        return self.add_new_faces(points, offsets, quads.ravel()).tolist()
 
-            # store current vert
-            cur_vert = verts[i]
+    def subdivide_constant_quads(self, recursion_depth=1):
+        """
+        Subdivides all faces of the kernel into constant quads, like subdivide_face_constant_quads.
+        Instead of subdividing face by face, every level is computed for the whole mesh at once,
+        and the buffers are rebuilt from the result. This renumbers all vertices, nodes and faces.
 
-            # get outgoing and incoming edge mid points
-            outgoing_edge_mid = edge_mid_points[i]
-            incoming_edge_mid = edge_mid_points[i - 1]
+        Args:
+            recursion_depth (int | Optional): The number of times the faces should be subdivided,
+                at least once
 
-            # add new quad and append it's index to the index buffer
-            index_buffer.append(
-                self.add_new_face(
-                    [cur_vert, outgoing_edge_mid, center, incoming_edge_mid]
-                )
-            )
+        Returns:
+            list (int): The indices of the newly generated faces
+        """
+
+        offsets, indices = self.__face_buffer.csr()
+        if len(indices) == 0:
+            return []
 
-        # if we have reached the end of recursion, return the whole index buffer
-        if recursion_depth <= 1:
-            return index_buffer
+        # number the nodes of all faces from 0, so the engine only sees the nodes in use
+        nodes, vertex_nodes = np.unique(
+            self.__node_buffer.get_parent_nodes(indices), return_inverse=True
+        )
+
+        coords, quads, vertex_nodes, node_positions = subdivision.constant_quads(
+            self.__node_buffer.get_vertices(indices),
+            offsets,
+            np.arange(len(indices)),
+            vertex_nodes.ravel(),
+            self.__node_buffer.get_node_positions(nodes),
+            # like subdivide_face_constant_quads, faces are subdivided at least once
+            max(recursion_depth, 1),
+        )
 
-        # iterate over index_buffer
-        recursive_buffer = []
-        for index in index_buffer:
-            # recursively subdivide all faces referenced in index_buffer, moving up the recursion chain
-            buffer = self.subdivide_face_constant_quads(index, recursion_depth - 1)
-            recursive_buffer.extend(buffer)
+        self.__load_arrays(
+            coords,
+            vertex_nodes,
+            node_positions,
+            np.arange(0, quads.size + 1, 4),
+            quads.ravel(),
+        )
 
-        return recursive_buffer
+        return list(range(len(quads)))
 
     def subdivide_face_quad_grid(self, face_index, x_div, y_div):
         """
@@ -1,8 +1,11 @@
+import copy
 import logging
 import math
 import numpy as np
-from transform import transform_point
+from transform import transform_points
 
+from changes import ChangeTracker, MeshDelta
+from geometry import Plane
 from kernel import Kernel
 
 
@@ -17,6 +20,45 @@ class FEMMesh:
         Initializes a new, empty instance of the FEMMesh class
         """
         self.__kernel = Kernel()
+        # 4x4 transform that still has to be applied to the kernel, or None
+        self.__pending_transform = None
+        # faces and vertices changed since earlier versions, for delta transfers
+        self.__changes = ChangeTracker()
+
+    # region private helper methods
+
+    def __flushed_kernel(self):
+        """
+        Applies the pending transform to the kernel, before positions are read from it
+
+        Returns:
+            Kernel: The kernel, with all positions up to date
+        """
+
+        if self.__pending_transform is not None:
+            self.__kernel.transform(self.__pending_transform)
+            self.__pending_transform = None
+
+        return self.__kernel
+
+    @staticmethod
+    def __is_rigid(matrix):
+        # rotations and translations keep lengths, angles and orientation of the faces
+        rotation = matrix[:3, :3]
+        return (
+            np.allclose(matrix[3], [0.0, 0.0, 0.0, 1.0])
+            and np.allclose(rotation.T.dot(rotation), np.identity(3))
+            and np.linalg.det(rotation) > 0.0
+        )
+
+    @staticmethod
+    def __is_axis_aligned(matrix):
+        # boxes stay boxes if every axis is mapped onto another axis
+        return np.allclose(matrix[3], [0.0, 0.0, 0.0, 1.0]) and np.all(
+            np.count_nonzero(matrix[:3, :3], axis=1) <= 1
+        )
+
+    # endregion
 
     # region properties
 
@@ -40,10 +82,8 @@ class FEMMesh:
             list[list[float]]: The coordinates of the vertices
         """
 
-        return [
-            self.__kernel.get_vertex(vertex_index)
-            for vertex_index in self.__kernel.vertices()
-        ]
+        kernel = self.__flushed_kernel()
+        return [kernel.get_vertex(vertex_index) for vertex_index in kernel.vertices()]
 
     @property
     def vertex_indices(self):
@@ -82,12 +122,137 @@ class FEMMesh:
         A list of all faces stored in the mesh.
 
         Returns:
-            list[list[int]]: Tha faces as collections of vertex indices
+            list[np.array[int]]: Tha faces as collections of vertex indices
         """
 
-        return [
-            self.__kernel.get_face(face_index) for face_index in self.__kernel.faces()
-        ]
+        offsets, indices = self.__kernel.face_connectivity()
+        if len(offsets) == 1:
+            return []
+
+        return np.split(indices, offsets[1:-1])
+
+    @property
+    def face_connectivity(self):
+        """
+        The vertex indices of all faces in the mesh, in compressed-sparse-row layout.
+        The vertices of the i-th face are indices[offsets[i]:offsets[i + 1]],
+        faces are in the same order as self.face_indices.
+
+        Returns:
+            tuple[np.array[int], np.array[int]]: The offsets and the flat vertex indices
+        """
+
+        return self.__kernel.face_connectivity()
+
+    @property
+    def fixed_width_faces(self):
+        """
+        The vertex indices of all faces in the mesh, as a (F, n) array.
+        This is only defined for meshes where all faces have the same vertex count,
+        which is always the case for meshes of subdivided quads.
+
+        Returns:
+            np.array[int] | None: The faces, or None if face vertex counts are mixed
+        """
+
+        return self.__kernel.fixed_width_faces()
+
+    @property
+    def face_centers(self):
+        """
+        The centers of all faces in the mesh, in the order of face_indices.
+        Like all face geometry, they are cached until the next change of the mesh.
+
+        Returns:
+            np.array[float]: The read-only (F, 3) face centers
+        """
+
+        if self.__pending_transform is None:
+            return self.__kernel.face_centers()
+
+        # centers are averages, so they move like the vertices for any affine transform
+        return transform_points(self.__pending_transform, self.__kernel.face_centers())
+
+    @property
+    def face_normals(self):
+        """
+        The unit normals of all faces in the mesh, in the order of face_indices.
+
+        Returns:
+            np.array[float]: The read-only (F, 3) face normals
+        """
+
+        if self.__pending_transform is not None and self.__is_rigid(
+            self.__pending_transform
+        ):
+            return self.__kernel.face_normals().dot(self.__pending_transform[:3, :3].T)
+
+        return self.__flushed_kernel().face_normals()
+
+    @property
+    def face_areas(self):
+        """
+        The areas of all faces in the mesh, in the order of face_indices.
+
+        Returns:
+            np.array[float]: The read-only face areas
+        """
+
+        if self.__pending_transform is not None and self.__is_rigid(
+            self.__pending_transform
+        ):
+            return self.__kernel.face_areas()
+
+        return self.__flushed_kernel().face_areas()
+
+    @property
+    def face_planes(self):
+        """
+        The plane matrices of all faces in the mesh, in the order of face_indices.
+        Every matrix matches get_face_plane(index).get_matrix() for the same face.
+
+        Returns:
+            np.array[float]: The read-only (F, 4, 4) plane matrices
+        """
+
+        if self.__pending_transform is not None and self.__is_rigid(
+            self.__pending_transform
+        ):
+            return np.matmul(self.__pending_transform, self.__kernel.face_planes())
+
+        return self.__flushed_kernel().face_planes()
+
+    @property
+    def bounding_box(self):
+        """
+        The axis aligned bounding box of all vertices in the mesh.
+
+        Returns:
+            np.array[float] | None: The (2, 3) minimum and maximum corner, or None for an empty mesh
+        """
+
+        pending = self.__pending_transform
+        if pending is None or not self.__is_axis_aligned(pending):
+            return self.__flushed_kernel().bounding_box()
+
+        box = self.__kernel.bounding_box()
+        if box is None:
+            return None
+
+        # axis aligned transforms map the box corners onto the corners of the new box
+        corners = transform_points(pending, box)
+        return np.array([corners.min(axis=0), corners.max(axis=0)])
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes held by the arrays of the mesh, including cached geometry
+
+        Returns:
+            int: The number of bytes
+        """
+
+        return self.__kernel.nbytes
 
     @property
     def face_indices(self):
@@ -100,10 +265,44 @@ class FEMMesh:
 
         return self.__kernel.faces()
 
+    @property
+    def version(self):
+        """
+        The version of the mesh, which changes with every change of the mesh
+
+        Returns:
+            int: The version, unique in the process
+        """
+
+        return self.__changes.version
+
     @property
     def node_edges(self):
         return self.__kernel.node_edges()
 
+    @property
+    def edge_count(self):
+        """
+        The number of unique node edges in the mesh.
+
+        Returns:
+            int: The number of edges
+        """
+
+        return self.__kernel.edge_count
+
+    @property
+    def boundary_edges(self):
+        """
+        The indices of all node edges on the boundary of the mesh,
+        which are edges used by a single face only.
+
+        Returns:
+            np.array[int]: The edge indices
+        """
+
+        return self.__kernel.boundary_edges()
+
     # endregion
 
     # region public static methods
@@ -158,18 +357,83 @@ class FEMMesh:
             int: The index of the added face
         """
 
-        return self.__kernel.add_new_face(vertices)
+        face_index = self.__flushed_kernel().add_new_face(vertices)
+        self.__changes.faces_added([face_index])
+
+        return face_index
+
+    def add_faces(self, coords, faces):
+        """
+        Adds many faces to the mesh at once, welding all new vertices in one pass
+
+        Args:
+            coords (np.array[float]): The (N, 3) points the faces are built from
+            faces (np.array[int] | tuple[np.array[int], np.array[int]]): The faces as indices into coords,
+                either as a (F, n) array or as CSR offsets and flat indices
+
+        Returns:
+            range: The indices of the added faces
+        """
+
+        if isinstance(faces, tuple):
+            offsets, indices = faces
+        else:
+            faces = np.asarray(faces, dtype=np.int64)
+            offsets = np.arange(0, faces.size + 1, max(faces.shape[-1], 1))
+            indices = faces.ravel()
+
+        # the faces are appended, so they can be returned as a range
+        face_indices = self.__flushed_kernel().add_new_faces(
+            coords, offsets, indices, contiguous=True
+        )
+        self.__changes.faces_added(face_indices)
+
+        return face_indices
+
+    def remove_face(self, face_index):
+        """
+        Removes a face from the mesh, together with its vertices and all nodes left empty
+
+        Args:
+            face_index (int): The index of the face to remove
+
+        Returns:
+            bool: True if the face was removed, False if it did not exist
+        """
+
+        if self.__kernel.get_face(face_index) is not None:
+            self.__changes.faces_removed([face_index])
+
+        return self.__kernel.remove_face(face_index)
+
+    def remove_faces(self, face_indices):
+        """
+        Removes many faces from the mesh at once, together with their vertices and all nodes left empty
+
+        Args:
+            face_indices (array-like[int]): The indices of the faces to remove
+
+        Returns:
+            np.array[int]: The indices of the faces that were removed
+        """
+
+        face_indices = self.__kernel.remove_faces(face_indices)
+        self.__changes.faces_removed(face_indices)
+
+        return face_indices
 
     def subdivide_faces(self, n):
         """
         Recursively subdivides all faces in the mesh, n times.
+        All levels are computed for the whole mesh at once,
+        which renumbers all vertices, nodes and faces.
 
         Args:
             n (int): The number of times to subdivide
         """
 
-        for index in self.__kernel.faces():
-            self.__kernel.subdivide_face_constant_quads(index, n)
+        self.__flushed_kernel().subdivide_constant_quads(n)
+        self.__changes.reset()
 
     def clear(self):
         """
@@ -177,6 +441,8 @@ class FEMMesh:
         """
 
         self.__kernel = Kernel()
+        self.__pending_transform = None
+        self.__changes.reset()
 
     # endregion
 
@@ -189,7 +455,20 @@ class FEMMesh:
         Args:
             index (int): The index of the vertex to get
         """
-        return self.__kernel.get_vertex(vertex_index)
+        return self.__flushed_kernel().get_vertex(vertex_index)
+
+    def get_vertices(self, vertex_indices):
+        """
+        Gets the vertices for many indices at once
+
+        Args:
+            vertex_indices (array-like[int]): The indices of the vertices to get
+
+        Returns:
+            np.array[float]: The coordinates of the vertices, as a (N, 3) array
+        """
+
+        return self.__flushed_kernel().get_vertices(vertex_indices)
 
     def get_node(self, node_index):
         """
@@ -202,9 +481,10 @@ class FEMMesh:
             list[vertex]: The vertices stored in the node
         """
 
+        kernel = self.__flushed_kernel()
         return (
-            self.__kernel.get_vertex(vertex_index)
-            for vertex_index in self.__kernel.get_node(node_index)
+            kernel.get_vertex(vertex_index)
+            for vertex_index in kernel.get_node(node_index)
         )
 
     def get_node_indices(self, node_index):
@@ -221,9 +501,10 @@ class FEMMesh:
             list[vertex]: The vertices stored in the face
         """
 
+        kernel = self.__flushed_kernel()
         return (
-            self.__kernel.get_vertex(vertex_index)
-            for vertex_index in self.__kernel.get_face(face_index)
+            kernel.get_vertex(vertex_index)
+            for vertex_index in kernel.get_face(face_index)
         )
 
     def get_face_indices(self, face_index):
@@ -278,7 +559,7 @@ class FEMMesh:
 
     def get_node_position(self, node_index):
 
-        return self.__kernel.node_position(node_index)
+        return self.__flushed_kernel().node_position(node_index)
 
     # endregion
 
@@ -293,6 +574,20 @@ class FEMMesh:
     def get_edge_face_indices(self, edge):
         return self.__kernel.edge_faces(edge)
 
+    def get_edge_index(self, node_a, node_b):
+        """
+        Gets the index of the edge between two nodes
+
+        Args:
+            node_a (int): The index of the first node
+            node_b (int): The index of the second node
+
+        Returns:
+            int | None: The index of the edge, or None if the nodes are not connected
+        """
+
+        return self.__kernel.find_edge(node_a, node_b)
+
     def get_point_on_node_edge(self, edge, t):
         return np.average(
             np.array([self.get_node_position(node_index) for node_index in edge]),
@@ -309,8 +604,60 @@ class FEMMesh:
 
     # endregion
 
+    # region adjacency
+
+    @staticmethod
+    def __to_sparse(csr):
+        # scipy is only needed for sparse exports, so it is not imported with the module
+        from scipy.sparse import csr_matrix
+
+        offsets, indices = csr
+        size = len(offsets) - 1
+        data = np.ones(len(indices), dtype=bool)
+        return csr_matrix((data, indices, offsets), shape=(size, size))
+
+    def node_adjacency(self, sparse=False):
+        """
+        The neighbors of all nodes in the mesh, in compressed-sparse-row layout.
+        Nodes are neighbors if they are connected by an edge.
+
+        Args:
+            sparse (bool | Optional): Whether to return a scipy.sparse.csr_matrix instead of arrays
+
+        Returns:
+            tuple[np.array[int], np.array[int]] | scipy.sparse.csr_matrix: The offsets and node indices
+        """
+
+        csr = self.__kernel.node_adjacency()
+        return self.__to_sparse(csr) if sparse else csr
+
+    def face_adjacency(self, sparse=False):
+        """
+        The neighbors of all faces in the mesh, in compressed-sparse-row layout.
+        Faces are neighbors if they share at least one node, like in get_face_neighbors.
+
+        Args:
+            sparse (bool | Optional): Whether to return a scipy.sparse.csr_matrix instead of arrays
+
+        Returns:
+            tuple[np.array[int], np.array[int]] | scipy.sparse.csr_matrix: The offsets and face indices
+        """
+
+        csr = self.__kernel.face_adjacency()
+        return self.__to_sparse(csr) if sparse else csr
+
+    # endregion
+
     def get_face_plane(self, face_index):
-        return self.__kernel.face_plane(face_index)
+        pending = self.__pending_transform
+        if pending is None or not self.__is_rigid(pending):
+            return self.__flushed_kernel().face_plane(face_index)
+
+        plane = self.__kernel.face_plane(face_index)
+        if plane is None:
+            return None
+
+        return Plane.from_matrix(pending.dot(plane.get_matrix()))
 
     def get_face_edges(self, face_index):
         return self.__kernel.face_edges(face_index)
@@ -333,27 +680,146 @@ class FEMMesh:
         return self.__kernel.face_edge(face_index, edge_index)
 
     def get_face_center(self, face_index):
-        return self.__kernel.face_center(face_index)
+        center = self.__kernel.face_center(face_index)
+        if center is None or self.__pending_transform is None:
+            return center
+
+        return transform_points(self.__pending_transform, center[np.newaxis])[0]
+
+    def snapshot(self):
+        """
+        Copies the live vertices, nodes and faces of the mesh into compact, read-only arrays.
+        This is a pure read, the mesh keeps all its indices and buffers,
+        so it is cheap to repeat, e.g. for every transfer of the mesh.
+
+        Returns:
+            MeshSnapshot: The snapshot, with the mesh indices of all rows
+        """
+
+        return self.__kernel.snapshot(self.__pending_transform)
+
+    @staticmethod
+    def from_snapshot(snapshot):
+        """
+        Creates a new mesh from a snapshot, without welding its vertices again
+
+        Args:
+            snapshot (MeshSnapshot): The snapshot to load
+
+        Returns:
+            FEMMesh: The new mesh, with indices matching the rows of the snapshot
+        """
+
+        mesh = FEMMesh()
+        mesh.__kernel = Kernel.from_snapshot(snapshot)
+        return mesh
 
     def shrink_buffers(self):
         """
-        Shrinks all buffers of the mesh to the smallest possible size
+        Shrinks all buffers of the mesh to the smallest possible size.
+        Removed vertices, nodes, faces and edges are squeezed out in place,
+        which renumbers the remaining ones from 0, without changing which node a vertex belongs to.
+
+        Returns:
+            tuple[np.array[int], np.array[int], np.array[int], np.array[int]]:
+                The old-to-new index tables of the vertices, nodes, faces and edges,
+                with -1 for removed indices
         """
 
-        new_kernel = Kernel()
+        remaps = self.__kernel.compact()
+        self.__changes.reset()
 
-        for face_index in self.face_indices:
-            face = self.get_face(face_index)
-            new_kernel.add_new_face(face)
+        return remaps
 
-        self.__kernel = new_kernel
+    def copy(self):
+        """
+        Creates an independent copy of the mesh.
+        The copy starts a new version history, deltas of the original do not apply to it.
 
-    def __replace_vertex(self, index, new_vert):
-        # DANGEROUS!!!
-        self.__kernel.set_vertex(index, new_vert)
+        Returns:
+            FEMMesh: The copy, with the same vertex, node and face indices
+        """
+
+        mesh = copy.deepcopy(self)
+        mesh.__changes.reset()
+
+        return mesh
+
+    def delta(self, version):
+        """
+        The changes of the mesh since a version, as new faces, removed faces and moved vertices.
+        Versions from before the last renumbering of the mesh, older than the last
+        ChangeTracker.HISTORY versions, or of other meshes, get the whole mesh, marked as a reset.
+
+        Args:
+            version (int): The version the client has, 0 if it has none
+
+        Returns:
+            MeshDelta: The changes, in mesh indices
+        """
+
+        kernel = self.__flushed_kernel()
+        face_indices = np.fromiter(kernel.faces(), dtype=np.int64)
+        reset, added, removed, moved = self.__changes.since(version, face_indices)
+
+        # gather the CSR spans of the new faces
+        offsets, indices = kernel.face_connectivity()
+        sizes = np.diff(offsets)[added]
+        delta_offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+        starts = np.asarray(offsets[:-1])[added]
+        delta_indices = np.asarray(indices)[
+            np.repeat(starts - delta_offsets[:-1], sizes) + np.arange(delta_offsets[-1])
+        ]
+
+        # new faces bring new vertices, a transform moves all of them
+        if moved:
+            vertex_indices = np.fromiter(kernel.vertices(), dtype=np.int64)
+        else:
+            vertex_indices = np.unique(delta_indices)
+
+        return MeshDelta(
+            self.version,
+            reset,
+            face_indices[added],
+            delta_offsets,
+            delta_indices,
+            removed,
+            vertex_indices,
+            kernel.get_vertices(vertex_indices).reshape(-1, 3),
+        )
 
     def transform(self, matrix):
-        for index in self.vertex_indices:
-            self.__replace_vertex(
-                index, transform_point(matrix, self.get_vertex(index))
-            )
+        """
+        Transforms the mesh in place. The transform is only composed with the pending transform,
+        and applied to all vertices and nodes at once, when positions are read the next time.
+        Cached face geometry and bounding boxes are transformed without touching the vertices,
+        where the transform allows it.
+
+        Args:
+            matrix (np.array[float]): The 4x4 transformation matrix
+        """
+
+        matrix = np.array(matrix, dtype=float)
+        if self.__pending_transform is not None:
+            matrix = matrix.dot(self.__pending_transform)
+
+        self.__pending_transform = matrix
+        self.__changes.vertices_moved()
+
+    def instance_vertices(self, matrices):
+        """
+        Transforms the vertices of the mesh with a batch of matrices, without changing the mesh.
+        All instances share the topology of the mesh, so only their vertices differ.
+
+        Args:
+            matrices (np.array[float]): The (K, 4, 4) transformation matrices of the instances
+
+        Returns:
+            np.array[float]: The (K, V, 3) vertices of all instances, in the order of vertex_indices
+        """
+
+        matrices = np.asarray(matrices, dtype=float).reshape(-1, 4, 4)
+        if self.__pending_transform is not None:
+            matrices = np.matmul(matrices, self.__pending_transform)
+
+        return transform_points(matrices, self.__kernel.vertex_array())
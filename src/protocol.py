@@ -0,0 +1,636 @@
+"""
+The wire protocol between server.py and its clients.
+
+Messages are either single json lines, or length-prefixed binary frames.
+A frame starts with a zero byte, which can never start a json line,
+so readers can tell both apart from the first byte and old json clients keep working.
+
+This module is shared with the Rhino side, which runs IronPython 2.7,
+so it must only use the standard library and stay python 2 compatible.
+"""
+
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+
+try:
+    # posix shared memory without a file system path, python 3.8 and later
+    import _posixshmem
+except ImportError:
+    _posixshmem = None
+
+MAGIC = b"\x00FEM"
+"""The first bytes of every binary frame"""
+
+VERSION = 2
+"""The version of the binary frame layout"""
+
+NO_REQUEST = 0
+"""The request id of messages that answer no request, request ids start at 1"""
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+FORMAT_BINARY64 = "binary64"
+FORMAT_SHARED = "shared"
+FORMATS = (FORMAT_JSON, FORMAT_BINARY, FORMAT_BINARY64, FORMAT_SHARED)
+"""The transfer formats a client can negotiate"""
+
+KIND_MESH = 1
+"""Frame kind of a mesh, made of a coordinate block and an int32 face block"""
+
+KIND_SHARED = 2
+"""Frame kind of a mesh left in a shared memory block, the payload is the size and name of the block"""
+
+KIND_DELTA = 3
+"""Frame kind of the changes of a mesh since a version, as new faces, removed faces and moved vertices"""
+
+SHARED_DATA_OFFSET = 16
+"""Offset of the coordinates in a shared mesh block, the mesh header before them is padded for alignment"""
+
+# magic, version, kind, request id, payload length
+__FRAME_HEADER = struct.Struct("<4sBBII")
+# coordinate item size, face width (0 for CSR faces), coordinate count, index count, face count
+__MESH_HEADER = struct.Struct("<BBIII")
+# block size, followed by the utf-8 block name
+__SHARED_HEADER = struct.Struct("<I")
+# version, reset flag, coordinate item size, face count, index count, removed face count, vertex count
+__DELTA_HEADER = struct.Struct("<QBBIIII")
+
+
+def __to_array(typecode, data):
+    """
+    Decodes a little-endian block of numbers into an array, in one call
+
+    Args:
+        typecode (str): The array typecode, "f", "d" or "i"
+        data (bytes | memoryview): The raw block
+
+    Returns:
+        array.array | memoryview: The decoded numbers, a view for memoryviews on python 3
+    """
+
+    # views of shared memory are cast in place on python 3, instead of being copied
+    if isinstance(data, memoryview):
+        if hasattr(data, "cast") and sys.byteorder == "little":
+            return data.cast(typecode)
+        data = data.tobytes()
+
+    result = array.array(typecode)
+    if hasattr(result, "frombytes"):
+        result.frombytes(data)
+    else:
+        result.fromstring(data)
+
+    if sys.byteorder == "big":
+        result.byteswap()
+
+    return result
+
+
+class RemoteError(Exception):
+    """
+    An error the server reported for a request
+    """
+
+
+def encode_frame(kind, payload, request_id=NO_REQUEST):
+    """
+    Wraps a payload into a length-prefixed frame
+
+    Args:
+        kind (int): The kind of the frame
+        payload (bytes): The payload
+        request_id (int | Optional): The id of the request the frame answers
+
+    Returns:
+        bytes: The frame
+    """
+
+    return __FRAME_HEADER.pack(MAGIC, VERSION, kind, request_id, len(payload)) + payload
+
+
+def encode_json(request_id, result=None, error=None):
+    """
+    Encodes the response to a request as a json line
+
+    Args:
+        request_id (int): The id of the request
+        result (object | Optional): The json serializable result
+        error (str | Optional): The error message, if the request failed
+
+    Returns:
+        bytes: The json line
+    """
+
+    if error is not None:
+        message = {"id": request_id, "error": error}
+    else:
+        message = {"id": request_id, "result": result}
+
+    return (json.dumps(message) + "\n").encode("utf-8")
+
+
+def replace_request_id(message, request_id):
+    """
+    Changes the request id of an encoded frame or json response, without decoding it again.
+    Used to answer a new request with a cached transfer.
+
+    Args:
+        message (bytes): The frame, or json line as encoded by encode_json
+        request_id (int): The new request id
+
+    Returns:
+        bytes: The message with the new request id
+    """
+
+    if message[:1] == MAGIC[:1]:
+        # the request id follows the magic, version and kind in the frame header
+        start = __FRAME_HEADER.size - 8
+        return message[:start] + struct.pack("<I", request_id) + message[start + 4 :]
+
+    # encode_json always writes the id first
+    prefix = b'{"id": '
+    end = message.index(b",", len(prefix))
+    return prefix + str(request_id).encode("ascii") + message[end:]
+
+
+def encode_mesh(
+    coords, coord_size, offsets, indices, face_width, request_id=NO_REQUEST
+):
+    """
+    Encodes the raw blocks of a mesh into a frame
+
+    Args:
+        coords (bytes): The little-endian x, y, z coordinate block
+        coord_size (int): The size of one coordinate, 4 for float32 or 8 for float64
+        offsets (bytes): The little-endian int32 CSR offsets of the faces, ignored if face_width is set
+        indices (bytes): The little-endian int32 flat face indices
+        face_width (int): The size of all faces, or 0 for faces of mixed size
+        request_id (int | Optional): The id of the request the frame answers
+
+    Returns:
+        bytes: The frame
+    """
+
+    index_count = len(indices) // 4
+    if face_width:
+        face_count = index_count // face_width
+        offsets = b""
+    else:
+        face_count = len(offsets) // 4 - 1
+
+    header = __MESH_HEADER.pack(
+        coord_size, face_width, len(coords) // (3 * coord_size), index_count, face_count
+    )
+
+    return encode_frame(KIND_MESH, header + coords + offsets + indices, request_id)
+
+
+def encode_mesh_header(coord_size, face_width, coord_count, index_count, face_count):
+    """
+    Encodes the header of a mesh payload, for meshes written into shared memory blocks
+
+    Args:
+        coord_size (int): The size of one coordinate, 4 for float32 or 8 for float64
+        face_width (int): The size of all faces, or 0 for faces of mixed size
+        coord_count (int): The number of x, y, z points
+        index_count (int): The number of flat face indices
+        face_count (int): The number of faces
+
+    Returns:
+        bytes: The header
+    """
+
+    return __MESH_HEADER.pack(
+        coord_size, face_width, coord_count, index_count, face_count
+    )
+
+
+def encode_shared(name, size, request_id=NO_REQUEST):
+    """
+    Encodes a frame pointing to a mesh in a shared memory block
+
+    Args:
+        name (str): The name of the block
+        size (int): The size of the block in bytes
+        request_id (int | Optional): The id of the request the frame answers
+
+    Returns:
+        bytes: The frame
+    """
+
+    payload = __SHARED_HEADER.pack(size) + name.encode("utf-8")
+    return encode_frame(KIND_SHARED, payload, request_id)
+
+
+def encode_delta(
+    version,
+    reset,
+    face_indices,
+    offsets,
+    indices,
+    removed_faces,
+    vertex_indices,
+    coords,
+    coord_size,
+    request_id=NO_REQUEST,
+):
+    """
+    Encodes the changes of a mesh into a frame, all indices are mesh indices
+
+    Args:
+        version (int): The version of the mesh the changes lead to
+        reset (bool): True if the client has to drop its mesh first
+        face_indices (bytes): The little-endian int32 indices of the new faces
+        offsets (bytes): The little-endian int32 CSR offsets of the new faces
+        indices (bytes): The little-endian int32 flat vertex indices of the new faces
+        removed_faces (bytes): The little-endian int32 indices of the removed faces
+        vertex_indices (bytes): The little-endian int32 indices of the new and moved vertices
+        coords (bytes): The little-endian x, y, z coordinates of the new and moved vertices
+        coord_size (int): The size of one coordinate, 4 for float32 or 8 for float64
+        request_id (int | Optional): The id of the request the frame answers
+
+    Returns:
+        bytes: The frame
+    """
+
+    header = __DELTA_HEADER.pack(
+        version,
+        1 if reset else 0,
+        coord_size,
+        len(face_indices) // 4,
+        len(indices) // 4,
+        len(removed_faces) // 4,
+        len(vertex_indices) // 4,
+    )
+    payload = b"".join(
+        [header, face_indices, offsets, indices, removed_faces, vertex_indices, coords]
+    )
+
+    return encode_frame(KIND_DELTA, payload, request_id)
+
+
+def open_block(name, size):
+    """
+    Maps a shared memory block of the server, with the standard library only.
+    Posix blocks are opened with shm_open where python has it, e.g. on Linux and macOS,
+    on Linux without it they are opened from /dev/shm.
+
+    Args:
+        name (str): The name of the block
+        size (int): The size of the block in bytes
+
+    Returns:
+        mmap.mmap: The mapped block
+    """
+
+    if os.name == "nt":
+        return mmap.mmap(-1, size, tagname=name)
+
+    name = name.lstrip("/")
+    if _posixshmem is not None:
+        # the block is opened without registering it, so this process never unlinks it
+        fd = _posixshmem.shm_open("/" + name, os.O_RDWR, mode=0o600)
+    elif sys.platform.startswith("linux"):
+        # posix shared memory lives in /dev/shm
+        fd = os.open(os.path.join("/dev/shm", name), os.O_RDWR)
+    else:
+        raise OSError(
+            "Shared transfers need shm_open, which this python does not have on {}".format(
+                sys.platform
+            )
+        )
+
+    try:
+        return mmap.mmap(fd, size)
+    finally:
+        os.close(fd)
+
+
+class MeshFrame(object):
+    """
+    A mesh decoded from a binary frame.
+    Coordinates and faces are kept as flat arrays, faces are either read with face_width,
+    or from the CSR offsets for faces of mixed size.
+    """
+
+    def __init__(
+        self, coords, offsets, indices, face_width, block=None, block_name=None
+    ):
+        """
+        Creates a new frame from decoded arrays
+
+        Args:
+            coords (array.array): The flat x, y, z coordinates
+            offsets (array.array | None): The CSR offsets of the faces, None for fixed width faces
+            indices (array.array): The flat face indices
+            face_width (int): The size of all faces, or 0 for faces of mixed size
+            block (mmap.mmap | Optional): The mapped shared memory block the arrays view
+            block_name (str | Optional): The name of the shared memory block
+        """
+
+        self.coords = coords
+        self.offsets = offsets
+        self.indices = indices
+        self.face_width = face_width
+        self.block = block
+        self.block_name = block_name
+
+    @property
+    def face_count(self):
+        """
+        The number of faces in the frame
+
+        Returns:
+            int: The number of faces
+        """
+
+        if self.face_width:
+            return len(self.indices) // self.face_width
+        return len(self.offsets) - 1
+
+    def faces(self):
+        """
+        The faces of the frame, as slices of the flat indices
+
+        Returns:
+            generator[array.array]: The indices of every face
+        """
+
+        if self.face_width:
+            width = self.face_width
+            return (
+                self.indices[start : start + width]
+                for start in range(0, len(self.indices), width)
+            )
+
+        return (
+            self.indices[self.offsets[i] : self.offsets[i + 1]]
+            for i in range(len(self.offsets) - 1)
+        )
+
+    def close(self):
+        """
+        Unmaps the shared memory block of the frame, if it has one.
+        The arrays of the frame and all face slices have to be dropped before.
+        """
+
+        if self.block is None:
+            return
+
+        for view in (self.coords, self.offsets, self.indices):
+            if isinstance(view, memoryview):
+                view.release()
+        self.block.close()
+        self.block = None
+
+
+def decode_mesh(payload, data_start=None):
+    """
+    Decodes the payload of a mesh frame
+
+    Args:
+        payload (bytes | memoryview): The payload, without the frame header
+        data_start (int | Optional): The offset of the coordinates, right after the mesh header by default
+
+    Returns:
+        MeshFrame: The decoded mesh
+    """
+
+    coord_size, face_width, coord_count, index_count, face_count = (
+        __MESH_HEADER.unpack_from(payload)
+    )
+    start = __MESH_HEADER.size if data_start is None else data_start
+
+    end = start + 3 * coord_count * coord_size
+    coords = __to_array("d" if coord_size == 8 else "f", payload[start:end])
+
+    offsets = None
+    if not face_width:
+        start, end = end, end + 4 * (face_count + 1)
+        offsets = __to_array("i", payload[start:end])
+
+    indices = __to_array("i", payload[end : end + 4 * index_count])
+
+    return MeshFrame(coords, offsets, indices, face_width)
+
+
+def decode_shared(payload):
+    """
+    Maps the shared memory block of a shared mesh frame, and decodes the mesh in it.
+    On python 3 the arrays of the mesh view the block, so nothing is copied.
+
+    Args:
+        payload (bytes): The payload, without the frame header
+
+    Returns:
+        MeshFrame: The decoded mesh, close it before releasing the block
+    """
+
+    (size,) = __SHARED_HEADER.unpack_from(payload)
+    name = payload[__SHARED_HEADER.size :].decode("utf-8")
+
+    block = open_block(name, size)
+    try:
+        data = memoryview(block)
+    except TypeError:
+        # python 2 mmaps do not support memoryviews, the block is read into a string
+        data = block[:]
+
+    frame = decode_mesh(data, SHARED_DATA_OFFSET)
+    frame.block = block
+    frame.block_name = name
+    return frame
+
+
+class DeltaFrame(object):
+    """
+    The changes of a mesh decoded from a delta frame, in mesh indices
+    """
+
+    def __init__(
+        self,
+        version,
+        reset,
+        face_indices,
+        offsets,
+        indices,
+        removed_faces,
+        vertex_indices,
+        coords,
+    ):
+        """
+        Creates a new frame from decoded arrays
+
+        Args:
+            version (int): The version of the mesh the changes lead to
+            reset (bool): True if the client has to drop its mesh first
+            face_indices (array.array): The indices of the new faces
+            offsets (array.array): The CSR offsets of the new faces
+            indices (array.array): The flat vertex indices of the new faces
+            removed_faces (array.array): The indices of the removed faces
+            vertex_indices (array.array): The indices of the new and moved vertices
+            coords (array.array): The flat x, y, z coordinates of the new and moved vertices
+        """
+
+        self.version = version
+        self.reset = reset
+        self.face_indices = face_indices
+        self.offsets = offsets
+        self.indices = indices
+        self.removed_faces = removed_faces
+        self.vertex_indices = vertex_indices
+        self.coords = coords
+
+    def faces(self):
+        """
+        The new faces, with their indices
+
+        Returns:
+            generator[tuple[int, array.array]]: The index and the vertex indices of every new face
+        """
+
+        return (
+            (self.face_indices[i], self.indices[self.offsets[i] : self.offsets[i + 1]])
+            for i in range(len(self.face_indices))
+        )
+
+
+def decode_delta(payload):
+    """
+    Decodes the payload of a delta frame
+
+    Args:
+        payload (bytes): The payload, without the frame header
+
+    Returns:
+        DeltaFrame: The decoded changes
+    """
+
+    version, reset, coord_size, face_count, index_count, removed_count, vertex_count = (
+        __DELTA_HEADER.unpack_from(payload)
+    )
+
+    blocks = []
+    start = __DELTA_HEADER.size
+    for typecode, count in (
+        ("i", face_count),
+        ("i", face_count + 1),
+        ("i", index_count),
+        ("i", removed_count),
+        ("i", vertex_count),
+        ("d" if coord_size == 8 else "f", 3 * vertex_count),
+    ):
+        end = start + count * (8 if typecode == "d" else 4)
+        blocks.append(__to_array(typecode, payload[start:end]))
+        start = end
+
+    return DeltaFrame(version, bool(reset), *blocks)
+
+
+class MeshMirror(object):
+    """
+    A client side copy of a server mesh, kept up to date with delta frames
+    """
+
+    def __init__(self):
+        """
+        Creates a new, empty mirror, which gets the whole mesh with its first delta
+        """
+
+        # the version of the server mesh the mirror matches, 0 for none
+        self.version = 0
+        # dicts matching vertex indices to x, y, z tuples, and face indices to vertex index tuples
+        self.vertices = {}
+        self.faces = {}
+
+    def apply(self, delta):
+        """
+        Applies the changes of a delta frame
+
+        Args:
+            delta (DeltaFrame): The changes since the version of the mirror
+        """
+
+        if delta.reset:
+            self.vertices.clear()
+            self.faces.clear()
+
+        # removed faces take their vertices with them
+        for face_index in delta.removed_faces:
+            for vertex_index in self.faces.pop(face_index, ()):
+                self.vertices.pop(vertex_index, None)
+
+        for face_index, face in delta.faces():
+            self.faces[face_index] = tuple(face)
+
+        coords = delta.coords
+        for i, vertex_index in enumerate(delta.vertex_indices):
+            self.vertices[vertex_index] = tuple(coords[3 * i : 3 * i + 3])
+
+        self.version = delta.version
+
+
+def __read_exactly(stream, size):
+    """
+    Reads exactly size bytes from a stream, pipes may return less per read
+    """
+
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            raise EOFError("Stream closed inside of a frame")
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b"".join(chunks)
+
+
+def read_message(stream):
+    """
+    Reads the next message from a binary stream, either a frame or a json line.
+    Json lines without a request id are passed through as they are.
+
+    Args:
+        stream (file): The stream to read from, opened in binary mode
+
+    Returns:
+        tuple[int, object] | None: The request id and the decoded mesh frame, json result
+            or RemoteError, or None if the stream is closed
+    """
+
+    first = stream.read(1)
+    if not first:
+        return None
+
+    if first != MAGIC[:1]:
+        message = json.loads((first + stream.readline()).decode("utf-8"))
+        if not isinstance(message, dict):
+            return (NO_REQUEST, message)
+        if "id" not in message:
+            # errors of legacy requests have no id, but are still errors
+            if set(message) == {"error"}:
+                return (NO_REQUEST, RemoteError(message["error"]))
+            return (NO_REQUEST, message)
+        if "error" in message:
+            return (message["id"], RemoteError(message["error"]))
+        return (message["id"], message.get("result"))
+
+    header = MAGIC[:1] + __read_exactly(stream, __FRAME_HEADER.size - 1)
+    magic, version, kind, request_id, length = __FRAME_HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported frame header {!r}".format(header))
+
+    payload = __read_exactly(stream, length)
+    if kind == KIND_MESH:
+        return (request_id, decode_mesh(payload))
+    if kind == KIND_SHARED:
+        return (request_id, decode_shared(payload))
+    if kind == KIND_DELTA:
+        return (request_id, decode_delta(payload))
+
+    raise ValueError("Unknown frame kind {}".format(kind))
@@ -4,101 +4,360 @@ import json
 from subprocess import Popen, PIPE
 import arguments
 import logging
+import protocol
+import socket
 import threading
-import Queue
-import time
 
 log = logging.getLogger(__name__)
-log.setLevel(logging.DEBUG)
-formatter = logging.Formatter(
-    fmt="%(asctime)s %(levelname)s: %(message)s", datefmt="%Y-%m-%d - %H:%M:%S"
-)
-fh = logging.FileHandler("proxy.log", "w")
-fh.setLevel(logging.DEBUG)
-fh.setFormatter(formatter)
-log.addHandler(fh)
 
 
-def output_reader(proc, outq):
-    for line in proc.stdout:
-        outq.put(line)
+def configure_logging():
+    # the log file is only opened once a proxy is created, not when scripts are built
+    if log.handlers:
+        return
 
-    # works only in python3:
-    # for line in iter(proc.stdout.readline, ''):
-    #     outq.put(line)
+    log.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        fmt="%(asctime)s %(levelname)s: %(message)s", datefmt="%Y-%m-%d - %H:%M:%S"
+    )
+    fh = logging.FileHandler("proxy.log", "w")
+    fh.setLevel(logging.DEBUG)
+    fh.setFormatter(formatter)
+    log.addHandler(fh)
+
+
+class ResponseTimeout(Exception):
+    """
+    Raised when the server does not answer a request in time
+    """
+
+
+class Future(object):
+    """
+    The pending response to a request, resolved by the reader thread
+    as soon as the server answers the request id
+    """
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.__event = threading.Event()
+        self.__result = None
+        self.__error = None
+
+    def set_result(self, result):
+        self.__result = result
+        self.__event.set()
+
+    def set_error(self, error):
+        self.__error = error
+        self.__event.set()
+
+    def done(self):
+        return self.__event.is_set()
+
+    def result(self, timeout=None):
+        """
+        Blocks until the response arrived
+
+        Args:
+            timeout (float | Optional): The number of seconds to wait at most, None to wait forever
+
+        Returns:
+            object: The mesh frame, json result or None for commands without a transfer
+        """
+
+        if not self.__event.wait(timeout):
+            raise ResponseTimeout(
+                "No response to request {} after {}s".format(self.request_id, timeout)
+            )
+
+        if self.__error is not None:
+            raise self.__error
+
+        return self.__result
+
+
+def output_reader(stream, pending, lock):
+    # json lines and binary frames are told apart by their first byte
+    error = EOFError("Server closed the connection")
+    try:
+        while True:
+            message = protocol.read_message(stream)
+            if message is None:
+                break
+
+            request_id, value = message
+            with lock:
+                future = pending.pop(request_id, None)
+
+            if future is None:
+                log.warning("Dropped response to unknown request {}".format(request_id))
+            elif isinstance(value, protocol.RemoteError):
+                future.set_error(value)
+            else:
+                future.set_result(value)
+    except Exception as e:
+        log.exception("Failed to read a response")
+        error = e
+    finally:
+        # nothing will answer the requests still waiting
+        with lock:
+            futures = list(pending.values())
+            pending.clear()
+        for future in futures:
+            future.set_error(error)
+
+
+def connect(address):
+    """
+    Connects to a server running in socket mode
+
+    Args:
+        address (tuple[str, int] | str): The host and port of a tcp server, or the path of a unix domain socket
+
+    Returns:
+        socket.socket: The connected socket
+    """
+
+    if isinstance(address, tuple):
+        return socket.create_connection(address)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(address)
+    return sock
 
 
 class Proxy(object):
-    def __init__(self):
-        self.__server_process = Popen("python3 -u server.py", stdin=PIPE, stdout=PIPE)
-        self.__line_queue = Queue.Queue()
+    def __init__(
+        self, transfer_format=protocol.FORMAT_BINARY, timeout=30.0, address=None
+    ):
+        """
+        Starts a server process, or connects to a running socket server if an address is given
+
+        Args:
+            transfer_format (str | Optional): The format of transfers, one of protocol.FORMATS
+            timeout (float | Optional): The seconds to wait for a response, None to wait forever
+            address (tuple[str, int] | str | Optional): The tcp address or unix socket path of a socket server
+        """
+
+        configure_logging()
+        # transfers are sent as binary frames, unless json lines are negotiated
+        self.__transfer_format = transfer_format
+        # seconds to wait for a response in execute_command, None to wait forever
+        self.__timeout = timeout
+        self.__server_process = None
+        self.__socket = None
+        if address is None:
+            self.__server_process = Popen(
+                ["python3", "-u", "server.py"], stdin=PIPE, stdout=PIPE, bufsize=-1
+            )
+            self.__input = self.__server_process.stdin
+            self.__output = self.__server_process.stdout
+        else:
+            self.__socket = connect(address)
+            self.__input = self.__socket.makefile("wb")
+            self.__output = self.__socket.makefile("rb")
+        # futures of all requests without a response yet, by request id
+        self.__pending = {}
+        self.__lock = threading.Lock()
+        self.__next_request_id = protocol.NO_REQUEST + 1
         self.__reader_thread = threading.Thread(
-            target=output_reader, args=(self.__server_process, self.__line_queue)
+            target=output_reader,
+            args=(self.__output, self.__pending, self.__lock),
         )
+        self.__reader_thread.daemon = True
 
         self.__reader_thread.start()
 
     def __send_cmd(self, cmd):
         log.debug("Send command: {}".format(cmd))
         cmd_bytes = "{}\n".format(cmd).encode("utf-8")
-        self.__server_process.stdin.write(cmd_bytes)
-        self.__server_process.stdin.flush()
+        self.__input.write(cmd_bytes)
+        self.__input.flush()
 
     def subdivide(self, n_subd):
         cmd = CommandBuilder().subdivide(n_subd).build()
-        self.__send_cmd(cmd)
+        return self.submit(cmd)
 
     def polygon(self, radius=None, n_sides=None):
         cmd = CommandBuilder().polygon(radius, n_sides).build()
-        self.__send_cmd(cmd)
+        return self.submit(cmd)
 
     def receive(self):
         cmd = CommandBuilder().transfer().build()
-        self.__send_cmd(cmd)
+        return self.execute_command(cmd)
+
+    def __register(self, cmd):
+        """
+        Tags a command with a new request id, and registers the future of its response
+
+        Args:
+            cmd (str): The command
+
+        Returns:
+            tuple[str, Future]: The tagged command and its future
+        """
+
+        transfer = arguments.GLOBAL_TRANSFER_ARGUMENT.short_flag() in cmd
+        if transfer and arguments.GLOBAL_FORMAT_ARGUMENT.short_flag() not in cmd:
+            cmd += " {} {}".format(
+                arguments.GLOBAL_FORMAT_ARGUMENT.short_flag(), self.__transfer_format
+            )
+
+        # register the future before sending, the response may arrive right away
+        with self.__lock:
+            request_id = self.__next_request_id
+            self.__next_request_id += 1
+            future = Future(request_id)
+            self.__pending[request_id] = future
+
+        cmd += " {} {}".format(
+            arguments.GLOBAL_REQUEST_ARGUMENT.short_flag(), request_id
+        )
+        return (cmd, future)
+
+    def submit(self, cmd):
+        """
+        Sends a command with a new request id, without waiting for the response
 
-        return self.__parse_received()
+        Args:
+            cmd (str): The command, as built by the CommandBuilder
 
-    def execute_command(self, cmd):
+        Returns:
+            Future: The pending response of the command
+        """
+
+        cmd, future = self.__register(cmd)
         self.__send_cmd(cmd)
+        return future
 
-        if arguments.GLOBAL_TRANSFER_ARGUMENT.short_flag() in cmd:
-            return self.__parse_received()
+    def submit_script(self, commands):
+        """
+        Sends many commands in one write, without waiting for any response.
+        The server runs them in order and answers every command as soon as it is done.
 
-    def __parse_received(self):
-        for _ in range(10):
-            try:
-                line = self.__line_queue.get(block=False)
-                break
-            except Queue.Empty:
-                log.warning("Tried to parse empty line queue")
-                time.sleep(0.2)
-                continue
-        log.debug("parse dump: {}".format(line))
-        result = json.loads(line)
-        return (result[0], result[1])
+        Args:
+            commands (list[str]): The commands, as built by the ScriptBuilder
+
+        Returns:
+            list[Future]: The pending responses, in the order of the commands
+        """
+
+        lines = []
+        futures = []
+        for cmd in commands:
+            cmd, future = self.__register(cmd)
+            lines.append(cmd)
+            futures.append(future)
+
+        self.__send_cmd("\n".join(lines))
+        return futures
+
+    def execute_script(self, commands, timeout=None):
+        """
+        Sends many commands in one write, and yields their results as they arrive
+
+        Args:
+            commands (list[str]): The commands, as built by the ScriptBuilder
+            timeout (float | Optional): The seconds to wait per command, defaults to the timeout of the proxy
+
+        Returns:
+            generator[object]: The result of every command, in order
+        """
+
+        timeout = self.__timeout if timeout is None else timeout
+        for future in self.submit_script(commands):
+            yield future.result(timeout)
+
+    def execute_command(self, cmd, timeout=None):
+        """
+        Sends a command and blocks until the server answered it
+
+        Args:
+            cmd (str): The command, as built by the CommandBuilder
+            timeout (float | Optional): The seconds to wait, defaults to the timeout of the proxy
+
+        Returns:
+            object: The transferred mesh, or None for commands without a transfer
+        """
+
+        future = self.submit(cmd)
+        return future.result(self.__timeout if timeout is None else timeout)
+
+    def release(self, frame):
+        """
+        Unmaps a mesh of a shared transfer, and tells the server to free its block
+
+        Args:
+            frame (protocol.MeshFrame): The mesh, its arrays must not be used afterwards
+
+        Returns:
+            Future: The pending acknowledgement of the server
+        """
+
+        frame.close()
+        return self.submit(CommandBuilder().release(frame.block_name).build())
+
+    def sync(self, mirror, transfer_format=None, timeout=None):
+        """
+        Brings a mirror of the selected server mesh up to date,
+        transferring only the changes since the version it has
+
+        Args:
+            mirror (protocol.MeshMirror): The mirror, changed in place
+            transfer_format (str | Optional): binary64 for float64 coordinates
+            timeout (float | Optional): The seconds to wait, defaults to the timeout of the proxy
+
+        Returns:
+            protocol.DeltaFrame: The applied changes
+        """
+
+        delta = self.execute_command(
+            CommandBuilder().transfer(transfer_format).since(mirror.version).build(),
+            timeout,
+        )
+        mirror.apply(delta)
+        return delta
 
     def close(self):
         cmd = CommandBuilder().quit().build()
         self.__send_cmd(cmd)
-        log.debug(
-            "Server process exited with code {}".format(self.__server_process.wait())
-        )
+        if self.__server_process is not None:
+            log.debug(
+                "Server process exited with code {}".format(
+                    self.__server_process.wait()
+                )
+            )
+            return
+
+        # the server closes the connection on quit, which ends the reader thread
+        self.__reader_thread.join(self.__timeout)
+        self.__input.close()
+        self.__output.close()
+        self.__socket.close()
 
 
 class CommandBuilder(object):
     def __init__(self):
         self.__transfer = None
+        self.__transfer_format = None
         self.__subdivide = None
+        self.__since = None
         self.__subcommand = arguments.CMD_NOOP
 
-    def transfer(self):
+    def transfer(self, transfer_format=None):
         self.__transfer = True
+        self.__transfer_format = transfer_format
         return self
 
     def subdivide(self, n_subd):
         self.__subdivide = n_subd
         return self
 
+    def since(self, version):
+        self.__since = version
+        return self
+
     def polygon(self, radius=None, n_sides=None):
         self.__subcommand = arguments.CMD_POLYGON
         if radius is not None:
@@ -131,6 +390,48 @@ class CommandBuilder(object):
         self.__subcommand = arguments.CMD_RESET
         return self
 
+    def checkpoint(self):
+        self.__subcommand = arguments.CMD_CHECKPOINT
+        return self
+
+    def restore(self):
+        self.__subcommand = arguments.CMD_RESTORE
+        return self
+
+    def __session_command(self, cmd_name, name):
+        self.__subcommand = "{} {} {}".format(
+            cmd_name, arguments.SESSION_NAME_ARGUMENT.short_flag(), name
+        )
+        return self
+
+    def create(self, name):
+        return self.__session_command(arguments.CMD_CREATE, name)
+
+    def clone(self, name):
+        return self.__session_command(arguments.CMD_CLONE, name)
+
+    def select(self, name):
+        return self.__session_command(arguments.CMD_SELECT, name)
+
+    def drop(self, name):
+        return self.__session_command(arguments.CMD_DROP, name)
+
+    def list_sessions(self):
+        self.__subcommand = arguments.CMD_LIST
+        return self
+
+    def cache_info(self):
+        self.__subcommand = arguments.CMD_CACHE
+        return self
+
+    def release(self, block_name):
+        self.__subcommand = "{} {} {}".format(
+            arguments.CMD_RELEASE,
+            arguments.BLOCK_NAME_ARGUMENT.short_flag(),
+            block_name,
+        )
+        return self
+
     def quit(self):
         self.__subcommand = arguments.TOP_LEVEL_QUIT_ARGUMENT.short_flag()
         return self
@@ -149,18 +450,67 @@ class CommandBuilder(object):
         if self.__transfer is not None:
             cmd += " {}".format(arguments.GLOBAL_TRANSFER_ARGUMENT.short_flag())
 
+        if self.__transfer_format is not None:
+            cmd += " {} {}".format(
+                arguments.GLOBAL_FORMAT_ARGUMENT.short_flag(), self.__transfer_format
+            )
+
+        if self.__since is not None:
+            cmd += " {} {}".format(
+                arguments.GLOBAL_SINCE_ARGUMENT.short_flag(), self.__since
+            )
+
         return cmd
 
     def build(self):
         return self.__command_string()
 
 
+class ScriptBuilder(object):
+    """
+    Collects many commands into a script, that the server runs end to end
+    """
+
+    def __init__(self):
+        self.__commands = []
+
+    def then(self, command):
+        # take both builders and already built commands
+        if isinstance(command, CommandBuilder):
+            command = command.build()
+        self.__commands.append(command)
+        return self
+
+    def build(self):
+        return list(self.__commands)
+
+
+def house_variants_script(depth, count):
+    """
+    Builds a script that orients one house on each of its first faces,
+    building the house only once and restoring it for every variant
+
+    Args:
+        depth (float): The depth of the house
+        count (int): The number of variants
+
+    Returns:
+        list[str]: The commands of the script, every second one transfers a variant
+    """
+
+    script = ScriptBuilder()
+    script.then(CommandBuilder().house(depth)).then(CommandBuilder().checkpoint())
+    for i in range(count):
+        script.then(CommandBuilder().restore())
+        script.then(CommandBuilder().orient(i).subdivide(1).transfer())
+
+    return script.build()
+
+
 if __name__ == "__main__":
     proxy = Proxy()
-    for i in range(6):
-
-        proxy.execute_command(CommandBuilder().house(10.0).build())
-        cmd = CommandBuilder().orient(i).subdivide(1).transfer().build()
-        proxy.execute_command(cmd)
+    results = proxy.execute_script(house_variants_script(10.0, 6))
+    meshes = [result for result in results if result is not None]
+    log.debug("Received {} meshes".format(len(meshes)))
 
     proxy.close()
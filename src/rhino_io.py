@@ -1,26 +1,160 @@
 from mesh import FEMMesh
 import rhino3dm
 import json
+from multiprocessing import shared_memory
+import numpy as np
 import pickle
+import protocol
+
+ROUND_DIGITS = 3
+"""The number of decimals transferred coordinates are rounded to"""
 
 
 class MeshBuffer(object):
-    def __init__(self, fem_mesh):
+    """
+    A flat, serializable copy of a FEMMesh, to send meshes to other processes.
+    Coordinates are stored as one flat float array, faces as int32 arrays,
+    either as a (F, n) array if all faces have the same size, or in compressed-sparse-row layout.
+    """
 
-        # shrink fem_mesh buffers
-        fem_mesh.shrink_buffers()
+    def __init__(self, fem_mesh, welded=False):
+        """
+        Creates a new buffer from the live contents of the given mesh, without changing it
+
+        Args:
+            fem_mesh (FEMMesh): The mesh to copy
+            welded (bool | Optional): Store one coordinate per node instead of one per vertex,
+                so faces sharing a node share its coordinate
+        """
 
-        coords = []
-        for vert in fem_mesh.vertices:
-            for coord in vert:
-                coords.append(float(round(coord, 3)))
+        # read compact arrays from a snapshot, so the mesh itself is left untouched
+        snapshot = fem_mesh.snapshot()
 
-        self.coords = coords
-        self.faces = [list(face) for face in fem_mesh.faces]
+        if welded:
+            positions = snapshot.nodes
+            indices = snapshot.vertex_nodes[snapshot.indices]
+        else:
+            positions = snapshot.vertices
+            indices = snapshot.indices
+
+        self.welded = welded
+        self.coords = np.round(positions, ROUND_DIGITS).ravel()
+        self.offsets = snapshot.offsets.astype(np.int32)
+        self.indices = indices.astype(np.int32)
+
+        # most meshes are made of quads only, which fit a plain (F, n) array
+        sizes = np.diff(self.offsets)
+        if len(sizes) > 0 and np.all(sizes == sizes[0]):
+            self.faces = self.indices.reshape(-1, sizes[0])
+        else:
+            self.faces = None
 
+    def face_lists(self):
+        """
+        The faces of the buffer as plain lists of coordinate indices
 
-class RhinoIO:
+        Returns:
+            list[list[int]]: The faces
+        """
+
+        if self.faces is not None:
+            return self.faces.tolist()
+
+        offsets = self.offsets.tolist()
+        indices = self.indices.tolist()
+        return [indices[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def to_json(self):
+        """
+        Serializes the buffer to a json array of the flat coordinates and the face lists
+
+        Returns:
+            str: The json string
+        """
+
+        return json.dumps(self.to_lists())
+
+    def to_lists(self):
+        """
+        The flat coordinates and the face lists of the buffer, as plain python lists
+
+        Returns:
+            tuple[list[float], list[list[int]]]: The coordinates and the faces
+        """
+
+        return (self.coords.tolist(), self.face_lists())
+
+    def to_frame(self, double=False, request_id=protocol.NO_REQUEST):
+        """
+        Serializes the buffer to a binary frame of the wire protocol,
+        with little-endian coordinates and int32 faces copied as raw blocks
+
+        Args:
+            double (bool | Optional): Write float64 instead of float32 coordinates
+            request_id (int | Optional): The id of the request the frame answers
+
+        Returns:
+            bytes: The frame
+        """
+
+        coord_type = np.dtype("<f8" if double else "<f4")
+        face_width = 0 if self.faces is None else self.faces.shape[1]
+
+        return protocol.encode_mesh(
+            self.coords.astype(coord_type).tobytes(),
+            coord_type.itemsize,
+            self.offsets.astype("<i4").tobytes(),
+            self.indices.astype("<i4").tobytes(),
+            face_width,
+            request_id,
+        )
 
+    def to_shared_memory(self, double=False):
+        """
+        Copies the buffer into a new shared memory block, laid out like the payload of a mesh frame.
+        Clients on the same machine map the block, instead of reading the mesh from a stream.
+
+        Args:
+            double (bool | Optional): Write float64 instead of float32 coordinates
+
+        Returns:
+            SharedMemory: The block, to be unlinked once the client released it
+        """
+
+        coord_type = np.dtype("<f8" if double else "<f4")
+        face_width = 0 if self.faces is None else self.faces.shape[1]
+        blocks = [
+            (self.coords, coord_type),
+            (self.offsets if face_width == 0 else self.offsets[:0], np.dtype("<i4")),
+            (self.indices, np.dtype("<i4")),
+        ]
+
+        size = protocol.SHARED_DATA_OFFSET + sum(
+            len(array) * dtype.itemsize for array, dtype in blocks
+        )
+        block = shared_memory.SharedMemory(create=True, size=size)
+
+        header = protocol.encode_mesh_header(
+            coord_type.itemsize,
+            face_width,
+            len(self.coords) // 3,
+            len(self.indices),
+            len(self.offsets) - 1,
+        )
+        block.buf[: len(header)] = header
+
+        # cast and copy every array straight into the block
+        start = protocol.SHARED_DATA_OFFSET
+        for array, dtype in blocks:
+            view = np.ndarray(len(array), dtype=dtype, buffer=block.buf, offset=start)
+            view[...] = array
+            start += view.nbytes
+            del view
+
+        return block
+
+
+class RhinoIO:
     """
     Static class to convert from FEMMeshPy to a Rhino.Geometry.Mesh and back.
     Also allows storing meshes as rhino files
@@ -138,9 +272,8 @@ class RhinoIO:
         face_attrs = rhino3dm.ObjectAttributes()
         face_attrs.LayerIndex = face_layer_index
 
-        for face_index in fem_mesh.face_indices:
+        for face_index, center in zip(fem_mesh.face_indices, fem_mesh.face_centers):
             vertex_indices = fem_mesh.get_face_indices(face_index)
-            center = fem_mesh.get_face_center(face_index)
             file3dm.Objects.AddTextDot(
                 str(vertex_indices), RhinoIO.__vertex_to_point3d(center), face_attrs
             )
@@ -169,14 +302,15 @@ class RhinoIO:
         # create new, empty rhino mesh
         mesh = rhino3dm.Mesh()
 
-        # iterate over faces in fem_mesh
-        for face in fem_mesh.faces:
+        # gather the vertices of all faces at once
+        offsets, indices = fem_mesh.face_connectivity
+        coords = fem_mesh.get_vertices(indices)
 
-            # get vertices
-            verts = [fem_mesh.get_vertex(index) for index in face]
+        # iterate over faces in fem_mesh
+        for start, end in zip(offsets[:-1], offsets[1:]):
 
             # add a new mesh face from the verts
-            RhinoIO.__add_new_mesh_face(mesh, verts)
+            RhinoIO.__add_new_mesh_face(mesh, coords[start:end])
 
         return mesh
 
@@ -1,5 +1,6 @@
 import Rhino.Geometry as rg
 import logging
+import protocol
 
 
 def __chunker(seq, size):
@@ -7,11 +8,17 @@ def __chunker(seq, size):
 
 
 def mesh_from_buffer(buffer):
+    # binary frames carry flat arrays, json transfers a (coords, faces) pair
+    if isinstance(buffer, protocol.MeshFrame):
+        coords, faces = buffer.coords, buffer.faces()
+    else:
+        coords, faces = buffer[0], buffer[1]
+
     mesh = rg.Mesh()
-    for chunk in __chunker(buffer[0], 3):
+    for chunk in __chunker(coords, 3):
         mesh.Vertices.Add(chunk[0], chunk[1], chunk[2])
 
-    for face in buffer[1]:
+    for face in faces:
         if len(face) == 3:
             mesh.Faces.AddFace(face[0], face[1], face[2])
         else:
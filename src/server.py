@@ -2,7 +2,15 @@ import numpy as np
 from mesh import FEMMesh
 import pickle
 import argparse
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import protocol
 import rhino_io
+from cache import ResultCache
+from sessions import SessionStore
+from workers import SharedBlocks, WorkerPool
 import json
 import task
 from transform import transform_to_worldxy
@@ -19,22 +27,38 @@ import sys
 # )
 
 log = logging.getLogger(__name__)
-log.setLevel(logging.DEBUG)
-formatter = logging.Formatter(
-    fmt="%(asctime)s %(levelname)s: %(message)s", datefmt="%Y-%m-%d - %H:%M:%S"
-)
-fh = logging.FileHandler("server.log", "w")
-fh.setLevel(logging.DEBUG)
-fh.setFormatter(formatter)
-log.addHandler(fh)
 
-MESH_SINGLETON = FEMMesh()
+SESSIONS = SessionStore()
+"""
+The named meshes of the server. Commands run on the mesh of the selected session
+"""
+
+CACHE = ResultCache()
+"""
+The meshes and transfers built by earlier commands, shared by all clients. None to disable caching
+"""
+
+BLOCKS = SharedBlocks()
 """
-The one and only mesh instance that can exist inside the server,
-at any given time
+The shared memory blocks of shared transfers, until their clients release them
 """
 
 
+def configure_logging():
+    """
+    Writes the server log to server.log, when the server runs as a process
+    """
+
+    log.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        fmt="%(asctime)s %(levelname)s: %(message)s", datefmt="%Y-%m-%d - %H:%M:%S"
+    )
+    fh = logging.FileHandler("server.log", "w")
+    fh.setLevel(logging.DEBUG)
+    fh.setFormatter(formatter)
+    log.addHandler(fh)
+
+
 def add_arguments(parser, arguments):
     for arg in arguments:
         parser.add_argument(
@@ -43,105 +67,910 @@ def add_arguments(parser, arguments):
             type=arg.arg_type,
             help=arg.help,
             default=arg.default,
+            choices=arg.choices,
         )
 
 
-# create parser and subparser
-parser = argparse.ArgumentParser(description="Run FEM commands on a mesh")
-subparsers = parser.add_subparsers(dest="cmd_name")
+def build_parser():
+    """
+    Builds the parser for all commands the server understands
 
-# create a quit command to break inner loop
-parser.add_argument("--quit", "-q", action="store_true", help="Quits the program")
+    Returns:
+        argparse.ArgumentParser: The parser
+    """
 
-# create a base subparser with global commands
-base_subparser = argparse.ArgumentParser(add_help=False)
-add_arguments(base_subparser, [arguments.GLOBAL_SUBDIVIDE_ARGUMENT])
-base_subparser.add_argument(
-    arguments.GLOBAL_TRANSFER_ARGUMENT.flag(),
-    arguments.GLOBAL_TRANSFER_ARGUMENT.short_flag(),
-    help=arguments.GLOBAL_TRANSFER_ARGUMENT.help,
-    action="store_true",
-)
+    # create parser and subparser
+    parser = argparse.ArgumentParser(description="Run FEM commands on a mesh")
+    subparsers = parser.add_subparsers(dest="cmd_name")
 
-# add polygon command
-poly_cmd = subparsers.add_parser(arguments.CMD_POLYGON, parents=[base_subparser])
-add_arguments(
-    poly_cmd, [arguments.POLYGON_RADIUS_ARGUMENT, arguments.POLYGON_SIDECOUNT_ARGUMENT]
-)
+    # create a quit command to break inner loop
+    parser.add_argument("--quit", "-q", action="store_true", help="Quits the program")
 
-# add house command
-house_cmd = subparsers.add_parser(arguments.CMD_HOUSE, parents=[base_subparser])
-add_arguments(house_cmd, [arguments.HOUSE_DEPTH_ARGUMENT])
+    # create a base subparser with global commands
+    base_subparser = argparse.ArgumentParser(add_help=False)
+    add_arguments(
+        base_subparser,
+        [
+            arguments.GLOBAL_SUBDIVIDE_ARGUMENT,
+            arguments.GLOBAL_FORMAT_ARGUMENT,
+            arguments.GLOBAL_REQUEST_ARGUMENT,
+            arguments.GLOBAL_SINCE_ARGUMENT,
+        ],
+    )
+    base_subparser.add_argument(
+        arguments.GLOBAL_TRANSFER_ARGUMENT.flag(),
+        arguments.GLOBAL_TRANSFER_ARGUMENT.short_flag(),
+        help=arguments.GLOBAL_TRANSFER_ARGUMENT.help,
+        action="store_true",
+    )
 
-# add orient command
-orient_cmd = subparsers.add_parser(arguments.CMD_ORIENT, parents=[base_subparser])
-add_arguments(orient_cmd, [arguments.ORIENT_FACE_INDEX_ARGUMENT])
+    # add polygon command
+    poly_cmd = subparsers.add_parser(arguments.CMD_POLYGON, parents=[base_subparser])
+    add_arguments(
+        poly_cmd,
+        [arguments.POLYGON_RADIUS_ARGUMENT, arguments.POLYGON_SIDECOUNT_ARGUMENT],
+    )
 
-# add reset command
-reset_cmd = subparsers.add_parser(arguments.CMD_RESET, parents=[base_subparser])
+    # add house command
+    house_cmd = subparsers.add_parser(arguments.CMD_HOUSE, parents=[base_subparser])
+    add_arguments(house_cmd, [arguments.HOUSE_DEPTH_ARGUMENT])
 
-# add fall-through command
-noop_cmd = subparsers.add_parser(arguments.CMD_NOOP, parents=[base_subparser])
+    # add orient command
+    orient_cmd = subparsers.add_parser(arguments.CMD_ORIENT, parents=[base_subparser])
+    add_arguments(orient_cmd, [arguments.ORIENT_FACE_INDEX_ARGUMENT])
 
-while True:
+    # add reset command
+    subparsers.add_parser(arguments.CMD_RESET, parents=[base_subparser])
 
-    # get raw input
-    astr = input()
+    # add checkpoint and restore commands
+    subparsers.add_parser(arguments.CMD_CHECKPOINT, parents=[base_subparser])
+    subparsers.add_parser(arguments.CMD_RESTORE, parents=[base_subparser])
 
-    # parse args from raw input
-    try:
-        args = parser.parse_args(astr.split())
-    except SystemExit:
-        log.warning("Failed to parse raw input")
-        continue
+    # add session commands
+    for cmd_name in (
+        arguments.CMD_CREATE,
+        arguments.CMD_CLONE,
+        arguments.CMD_SELECT,
+        arguments.CMD_DROP,
+    ):
+        session_cmd = subparsers.add_parser(cmd_name, parents=[base_subparser])
+        add_arguments(session_cmd, [arguments.SESSION_NAME_ARGUMENT])
+    subparsers.add_parser(arguments.CMD_LIST, parents=[base_subparser])
+
+    # add cache statistics command
+    subparsers.add_parser(arguments.CMD_CACHE, parents=[base_subparser])
+
+    # add release command, to acknowledge shared transfers
+    release_cmd = subparsers.add_parser(arguments.CMD_RELEASE, parents=[base_subparser])
+    add_arguments(release_cmd, [arguments.BLOCK_NAME_ARGUMENT])
+
+    # add fall-through command
+    subparsers.add_parser(arguments.CMD_NOOP, parents=[base_subparser])
+
+    return parser
+
+
+def encode_transfer(mesh, transfer_format, request_id=None):
+    """
+    Serializes a mesh for a transfer, in the format negotiated by the client
+
+    Args:
+        mesh (FEMMesh): The mesh to transfer
+        transfer_format (str): One of protocol.FORMATS
+        request_id (int | Optional): The id of the request to echo, None for legacy clients
+
+    Returns:
+        bytes: A json line, or a binary frame
+    """
+
+    buffer = rhino_io.MeshBuffer(mesh)
+    if transfer_format == protocol.FORMAT_SHARED:
+        block = buffer.to_shared_memory()
+        BLOCKS.add(block)
+        return protocol.encode_shared(
+            block.name,
+            block.size,
+            protocol.NO_REQUEST if request_id is None else request_id,
+        )
+
+    if transfer_format == protocol.FORMAT_JSON:
+        if request_id is None:
+            return (buffer.to_json() + "\n").encode("utf-8")
+        return protocol.encode_json(request_id, buffer.to_lists())
 
-    # check if quit was called, early break
-    if args.quit:
-        log.debug("Quitting Server")
-        break
+    return buffer.to_frame(
+        double=transfer_format == protocol.FORMAT_BINARY64,
+        request_id=protocol.NO_REQUEST if request_id is None else request_id,
+    )
+
+
+def encode_delta(mesh, since, transfer_format, request_id=None):
+    """
+    Serializes the changes of a mesh since a version the client has, as a delta frame
+
+    Args:
+        mesh (FEMMesh): The mesh to transfer
+        since (int): The version the client has, 0 if it has none
+        transfer_format (str): One of protocol.FORMATS, binary64 sends float64 coordinates
+        request_id (int | Optional): The id of the request to echo, None for legacy clients
+
+    Returns:
+        bytes: A delta frame
+    """
+
+    delta = mesh.delta(since)
+    coord_type = "<f8" if transfer_format == protocol.FORMAT_BINARY64 else "<f4"
+    coords = np.round(delta.vertices, rhino_io.ROUND_DIGITS).astype(coord_type)
+
+    log.debug(
+        "delta since %s, %s new faces, %s removed faces, %s vertices",
+        since,
+        len(delta.face_indices),
+        len(delta.removed_faces),
+        len(delta.vertex_indices),
+    )
+    return protocol.encode_delta(
+        delta.version,
+        delta.reset,
+        delta.face_indices.astype("<i4").tobytes(),
+        delta.offsets.astype("<i4").tobytes(),
+        delta.indices.astype("<i4").tobytes(),
+        delta.removed_faces.astype("<i4").tobytes(),
+        delta.vertex_indices.astype("<i4").tobytes(),
+        coords.tobytes(),
+        coords.itemsize,
+        protocol.NO_REQUEST if request_id is None else request_id,
+    )
+
+
+def run_mesh_command(mesh, args):
+    """
+    Runs the part of a command that works on the mesh alone,
+    building, orienting or resetting it, then subdividing and transferring it.
+    It needs no session, so it can run in a worker process.
+
+    Args:
+        mesh (FEMMesh): The mesh of the selected session
+        args (argparse.Namespace): The parsed command
+
+    Returns:
+        tuple[FEMMesh, bytes | None]: The new mesh of the session, and the transfer if one was asked for
+    """
 
     # match on args subcommand
     # create a polygon
     if args.cmd_name == arguments.CMD_POLYGON:
         log.debug(
-            f"polygon, radius={args.__getattribute__(arguments.POLYGON_RADIUS_ARGUMENT.name)}, n_sides={args.__getattribute__(arguments.POLYGON_SIDECOUNT_ARGUMENT.name)}"
+            "polygon, radius=%s, n_sides=%s",
+            args.__getattribute__(arguments.POLYGON_RADIUS_ARGUMENT.name),
+            args.__getattribute__(arguments.POLYGON_SIDECOUNT_ARGUMENT.name),
         )
-        MESH_SINGLETON = FEMMesh.polygon(
+        mesh = FEMMesh.polygon(
             args.__getattribute__(arguments.POLYGON_RADIUS_ARGUMENT.name),
             args.__getattribute__(arguments.POLYGON_SIDECOUNT_ARGUMENT.name),
         )
 
     # create a house
     elif args.cmd_name == arguments.CMD_HOUSE:
-        MESH_SINGLETON = task.House(
+        mesh = task.House(
             task.COORDINATES_FRONT_FACE,
             args.__getattribute__(arguments.HOUSE_DEPTH_ARGUMENT.name),
         ).mesh
 
-    # orient the mesh singleton on the given face
+    # orient the mesh on the given face
     elif args.cmd_name == arguments.CMD_ORIENT:
         face_index = args.__getattribute__(arguments.ORIENT_FACE_INDEX_ARGUMENT.name)
-        plane = MESH_SINGLETON.get_face_plane(face_index)
-        MESH_SINGLETON.transform(transform_to_worldxy(plane))
-        # MESH_SINGLETON.transform(np.identity(4))
+        plane = mesh.get_face_plane(face_index)
+        mesh.transform(transform_to_worldxy(plane))
+        # mesh.transform(np.identity(4))
 
-    # reset the mesh singleton
+    # reset the mesh
     elif args.cmd_name == arguments.CMD_RESET:
-        MESH_SINGLETON = FEMMesh()
+        mesh = FEMMesh()
 
     # match on global flags
     # face subdivision
     subd_level = args.__getattribute__(arguments.GLOBAL_SUBDIVIDE_ARGUMENT.name)
     if subd_level is not None:
-        MESH_SINGLETON.subdivide_faces(subd_level)
+        mesh.subdivide_faces(subd_level)
+
+    # retrieve mesh as json line or binary frame
+    dump = None
+    if args.__getattribute__(arguments.GLOBAL_TRANSFER_ARGUMENT.name):
+        dump = encode_transfer(
+            mesh,
+            args.__getattribute__(arguments.GLOBAL_FORMAT_ARGUMENT.name),
+            args.__getattribute__(arguments.GLOBAL_REQUEST_ARGUMENT.name),
+        )
+
+    return (mesh, dump)
+
+
+def needs_worker(args):
+    """
+    Checks if a command is CPU-bound enough to run in a worker process.
+    Transfers only read the mesh, so they are encoded in the server, on the mesh of the session.
+
+    Args:
+        args (argparse.Namespace): The parsed command
+
+    Returns:
+        bool: True if the command subdivides the mesh
+    """
+
+    return args.__getattribute__(arguments.GLOBAL_SUBDIVIDE_ARGUMENT.name) is not None
+
+
+def is_expensive(args):
+    """
+    Checks if a command takes longer to run than a snapshot of its mesh takes to copy,
+    so its mesh is worth caching
+
+    Args:
+        args (argparse.Namespace): The parsed command
+
+    Returns:
+        bool: True if the command builds a house or subdivides the mesh
+    """
+
+    return args.cmd_name == arguments.CMD_HOUSE or needs_worker(args)
+
 
-    # retrieve mesh as json data
+def without_transfer(args):
+    """
+    Copies a parsed command, without its transfer
+
+    Args:
+        args (argparse.Namespace): The parsed command
+
+    Returns:
+        argparse.Namespace: The copy, only changing the mesh
+    """
+
+    mesh_args = argparse.Namespace(**vars(args))
+    mesh_args.__setattr__(arguments.GLOBAL_TRANSFER_ARGUMENT.name, False)
+    return mesh_args
+
+
+def next_lineage(lineage, args):
+    """
+    The mesh commands that build the mesh of a session after a command,
+    normalized so that equal meshes are built by equal lineages
+
+    Args:
+        lineage (tuple | None): The lineage of the mesh before the command, None if it is not known
+        args (argparse.Namespace): The parsed command
+
+    Returns:
+        tuple | None: The lineage after the command, None if it is not known
+    """
+
+    # commands building a new mesh start a new lineage
+    if args.cmd_name == arguments.CMD_POLYGON:
+        lineage = (
+            (
+                arguments.CMD_POLYGON,
+                args.__getattribute__(arguments.POLYGON_RADIUS_ARGUMENT.name),
+                args.__getattribute__(arguments.POLYGON_SIDECOUNT_ARGUMENT.name),
+            ),
+        )
+    elif args.cmd_name == arguments.CMD_HOUSE:
+        lineage = (
+            (
+                arguments.CMD_HOUSE,
+                args.__getattribute__(arguments.HOUSE_DEPTH_ARGUMENT.name),
+            ),
+        )
+    elif args.cmd_name == arguments.CMD_RESET:
+        lineage = ()
+
+    # commands changing the mesh extend it
+    if lineage is None:
+        return None
+
+    if args.cmd_name == arguments.CMD_ORIENT:
+        lineage += (
+            (
+                arguments.CMD_ORIENT,
+                args.__getattribute__(arguments.ORIENT_FACE_INDEX_ARGUMENT.name),
+            ),
+        )
+
+    subd_level = args.__getattribute__(arguments.GLOBAL_SUBDIVIDE_ARGUMENT.name)
+    if subd_level is not None:
+        lineage += ((arguments.GLOBAL_SUBDIVIDE_ARGUMENT.name, subd_level),)
+
+    return lineage
+
+
+def apply_mesh_command(session, args, pool=None, lookup=True):
+    """
+    Runs the mesh part of a command on a session, answering it from CACHE when the same
+    mesh and transfer were built before. Otherwise the command runs in a worker process
+    if it is CPU-bound and there is a pool, and its transfer is cached,
+    together with its mesh if the command is expensive.
+
+    Args:
+        session (Session): The selected session
+        args (argparse.Namespace): The parsed command
+        pool (WorkerPool | Optional): The pool to run CPU-bound commands in
+        lookup (bool | Optional): False to keep the mesh of the session instead of loading
+            a cached one, so its version history is kept
+
+    Returns:
+        bytes | None: The transfer, if one was asked for
+    """
+
+    request_id = args.__getattribute__(arguments.GLOBAL_REQUEST_ARGUMENT.name)
     transfer = args.__getattribute__(arguments.GLOBAL_TRANSFER_ARGUMENT.name)
-    if transfer:
-        # write serialized mesh to stdout
-        buffer = rhino_io.MeshBuffer(MESH_SINGLETON)
-        dump = json.dumps((buffer.coords, buffer.faces))
-        log.debug("Transfer mesh singleton: {}".format(dump))
-        sys.stdout.write(dump)
-        sys.stdout.write("\n")
-        sys.stdout.flush()
+    transfer_format = args.__getattribute__(arguments.GLOBAL_FORMAT_ARGUMENT.name)
+    since = args.__getattribute__(arguments.GLOBAL_SINCE_ARGUMENT.name)
+
+    # deltas depend on the version the client has, so only the mesh part is cached,
+    # and the mesh is changed in place, a cached mesh would have no history to diff against
+    if transfer and since is not None:
+        apply_mesh_command(session, without_transfer(args), pool, lookup=False)
+        return encode_delta(session.mesh, since, transfer_format, request_id)
+
+    # every shared transfer gets its own block, owned by this process,
+    # so only the mesh part can be cached or run in a worker
+    if transfer and transfer_format == protocol.FORMAT_SHARED:
+        apply_mesh_command(session, without_transfer(args), pool)
+        return encode_transfer(session.mesh, transfer_format, request_id)
+
+    lineage = next_lineage(session.lineage, args)
+    changed = lineage != session.lineage
+    # transfers are cached with the ids of legacy clients, or NO_REQUEST to be replaced
+    transfer_key = (lineage, transfer_format, request_id is None)
+
+    cacheable = CACHE is not None and lineage is not None
+    # cheap commands are run again rather than copied, so their meshes are never cached
+    expensive = is_expensive(args)
+    if cacheable and changed and lookup and expensive:
+        snapshot = CACHE.get(lineage)
+        if snapshot is not None:
+            session.load(snapshot, lineage)
+            changed = False
+
+    if cacheable and not changed:
+        # the mesh is up to date, only the transfer may be left
+        if not transfer:
+            return None
+
+        dump = CACHE.get(transfer_key)
+        if dump is None:
+            dump = encode_transfer(
+                session.mesh,
+                transfer_format,
+                None if request_id is None else protocol.NO_REQUEST,
+            )
+            CACHE.put(transfer_key, dump)
+
+        if request_id is None:
+            return dump
+        return protocol.replace_request_id(dump, request_id)
+
+    # run the mesh part of the command, on a shared copy of the mesh in a worker process
+    # if it is CPU-bound, the changed mesh is handed back to the session and transferred here
+    if pool is not None and needs_worker(args):
+        session.mesh, _ = pool.run(
+            session.mesh, run_mesh_command, without_transfer(args)
+        )
+        dump = None
+        if transfer:
+            dump = encode_transfer(session.mesh, transfer_format, request_id)
+    else:
+        session.mesh, dump = run_mesh_command(session.mesh, args)
+    session.lineage = lineage
+
+    if cacheable:
+        if expensive:
+            CACHE.put(lineage, session.mesh.snapshot())
+        if dump is not None:
+            CACHE.put(
+                transfer_key,
+                (
+                    dump
+                    if request_id is None
+                    else protocol.replace_request_id(dump, protocol.NO_REQUEST)
+                ),
+            )
+
+    return dump
+
+
+def select_session(args, sessions):
+    """
+    Runs the session part of a command, creating, selecting or reporting sessions
+
+    Args:
+        args (argparse.Namespace): The parsed command
+        sessions (SessionStore): The sessions of the client
+
+    Returns:
+        tuple[Session, object]: The session the mesh part runs on, and the result to report, if there is one
+    """
+
+    session = sessions.current
+    result = None
+
+    # match on session subcommands, the sessions never leave this process
+    # save a copy of the session mesh, to restore it later in a batch
+    if args.cmd_name == arguments.CMD_CHECKPOINT:
+        session.save_checkpoint()
+
+    # replace the session mesh with a copy of the checkpoint
+    elif args.cmd_name == arguments.CMD_RESTORE:
+        session.restore_checkpoint()
+
+    # create, clone, select or drop a named session
+    elif args.cmd_name == arguments.CMD_CREATE:
+        session = sessions.create(
+            args.__getattribute__(arguments.SESSION_NAME_ARGUMENT.name)
+        )
+    elif args.cmd_name == arguments.CMD_CLONE:
+        session = sessions.clone(
+            args.__getattribute__(arguments.SESSION_NAME_ARGUMENT.name)
+        )
+    elif args.cmd_name == arguments.CMD_SELECT:
+        session = sessions.select(
+            args.__getattribute__(arguments.SESSION_NAME_ARGUMENT.name)
+        )
+    elif args.cmd_name == arguments.CMD_DROP:
+        sessions.drop(args.__getattribute__(arguments.SESSION_NAME_ARGUMENT.name))
+        session = sessions.current
+
+    # report all sessions and their memory use
+    elif args.cmd_name == arguments.CMD_LIST:
+        result = sessions.list()
+
+    # report the size and hit rate of the result cache
+    elif args.cmd_name == arguments.CMD_CACHE:
+        result = None if CACHE is None else CACHE.info()
+
+    # unlink the block of a shared transfer, the client has mapped it and is done
+    elif args.cmd_name == arguments.CMD_RELEASE:
+        BLOCKS.release(args.__getattribute__(arguments.BLOCK_NAME_ARGUMENT.name))
+
+    return (session, result)
+
+
+def respond(session, args, result=None, pool=None):
+    """
+    Runs the mesh part of a command on a session, and builds the response
+
+    Args:
+        session (Session): The session, as returned by select_session
+        args (argparse.Namespace): The parsed command
+        result (object | Optional): The result of the session part, to report if there is no transfer
+        pool (WorkerPool | Optional): The pool to run CPU-bound commands in, None to run them in this process
+
+    Returns:
+        bytes | None: The response to write back, if there is one
+    """
+
+    dump = apply_mesh_command(session, args, pool)
+
+    if dump is not None:
+        log.debug("Transfer session %s: %s bytes", session.name, len(dump))
+        return dump
+
+    # acknowledge commands without a transfer, so clients know when they are done
+    request_id = args.__getattribute__(arguments.GLOBAL_REQUEST_ARGUMENT.name)
+    if request_id is not None:
+        return protocol.encode_json(request_id, result)
+
+    if result is not None:
+        return (json.dumps(result) + "\n").encode("utf-8")
+
+    return None
+
+
+def execute_command(args, sessions=None, pool=None):
+    """
+    Runs a parsed command on the selected session
+
+    Args:
+        args (argparse.Namespace): The parsed command
+        sessions (SessionStore | Optional): The sessions of the client, defaults to SESSIONS
+        pool (WorkerPool | Optional): The pool to run CPU-bound commands in, None to run them in this process
+
+    Returns:
+        bytes | None: The response to write back, if there is one
+    """
+
+    # socket clients bring their own sessions, the stdin server uses the module sessions
+    if sessions is None:
+        sessions = SESSIONS
+
+    session, result = select_session(args, sessions)
+    return respond(session, args, result, pool)
+
+
+def parse_command(parser, astr):
+    """
+    Parses one line of raw input
+
+    Args:
+        parser (argparse.ArgumentParser): The parser, as built by build_parser
+        astr (str): The raw input line
+
+    Returns:
+        argparse.Namespace | None: The parsed command, or None if the line is invalid
+    """
+
+    try:
+        return parser.parse_args(astr.split())
+    except SystemExit:
+        log.warning("Failed to parse raw input")
+        return None
+
+
+def run_command(args, astr, sessions=None, pool=None):
+    """
+    Runs a parsed command, and answers failed requests with their error
+
+    Args:
+        args (argparse.Namespace): The parsed command
+        astr (str): The raw input line, for logging
+        sessions (SessionStore | Optional): The sessions of the client, defaults to SESSIONS
+        pool (WorkerPool | Optional): The pool to run CPU-bound commands in
+
+    Returns:
+        bytes | None: The response to write back, if there is one
+    """
+
+    try:
+        return execute_command(args, sessions, pool)
+    except Exception as error:
+        return error_response(args, astr, error)
+
+
+def error_response(args, astr, error):
+    """
+    Logs a failed command, and builds the response telling the client about it
+
+    Args:
+        args (argparse.Namespace): The parsed command
+        astr (str): The raw input line, for logging
+        error (Exception): The error the command failed with
+
+    Returns:
+        bytes: The response to write back
+    """
+
+    log.exception("Failed to run command: %s", astr.strip(), exc_info=error)
+    request_id = args.__getattribute__(arguments.GLOBAL_REQUEST_ARGUMENT.name)
+    if request_id is None:
+        # legacy clients wait for a line, so they get the error without an id
+        return (json.dumps({"error": repr(error)}) + "\n").encode("utf-8")
+    return protocol.encode_json(request_id, error=repr(error))
+
+
+class BatchScheduler:
+    """
+    Runs the commands of the stdin server in the order they arrive, except that CPU-bound commands
+    of pipelined requests run in the background, so a batch keeps one worker process busy per session.
+    Commands on one session still run one after the other, and commands without a request id
+    wait for all others, since their clients read the responses in order.
+    """
+
+    def __init__(self, stdout, pool=None):
+        """
+        Creates a new scheduler
+
+        Args:
+            stdout (file): The binary stream to write responses to
+            pool (WorkerPool | Optional): The pool to run CPU-bound commands in, None to run all commands in order
+        """
+
+        self.__stdout = stdout
+        self.__pool = pool
+        # threads waiting on the workers, one per worker process is enough to keep them busy
+        self.__threads = ThreadPoolExecutor(
+            max_workers=None if pool is None else pool.processes
+        )
+        # internal dict matching sessions to the future of their last background command
+        self.__pending = {}
+        # responses are written from the background threads too
+        self.__lock = threading.Lock()
+
+    def __write(self, response):
+        if response is None:
+            return
+
+        with self.__lock:
+            self.__stdout.write(response)
+            self.__stdout.flush()
+
+    def __wait(self, session=None):
+        # waits for the background commands of a session, or of all sessions
+        if session is None:
+            futures = list(self.__pending.values())
+            self.__pending.clear()
+        else:
+            futures = [self.__pending.pop(session)] if session in self.__pending else []
+
+        for future in futures:
+            future.result()
+
+    def __respond(self, previous, session, args, result, astr):
+        # runs in a background thread, after the command before it on the same session
+        if previous is not None:
+            previous.result()
+
+        try:
+            response = respond(session, args, result, self.__pool)
+        except Exception as error:
+            response = error_response(args, astr, error)
+        self.__write(response)
+
+    def submit(self, args, astr):
+        """
+        Runs a parsed command, or starts it in the background, and writes its response when it is done
+
+        Args:
+            args (argparse.Namespace): The parsed command
+            astr (str): The raw input line, for logging
+        """
+
+        sessions = SESSIONS
+        request_id = args.__getattribute__(arguments.GLOBAL_REQUEST_ARGUMENT.name)
+
+        # the session part reads the meshes of the sessions it reports or copies
+        if request_id is None or args.cmd_name == arguments.CMD_LIST:
+            self.__wait()
+        elif args.cmd_name in (
+            arguments.CMD_CHECKPOINT,
+            arguments.CMD_RESTORE,
+            arguments.CMD_CLONE,
+        ):
+            self.__wait(sessions.current)
+
+        try:
+            session, result = select_session(args, sessions)
+        except Exception as error:
+            self.__write(error_response(args, astr, error))
+            return
+
+        if self.__pool is not None and request_id is not None and needs_worker(args):
+            self.__pending[session] = self.__threads.submit(
+                self.__respond,
+                self.__pending.get(session),
+                session,
+                args,
+                result,
+                astr,
+            )
+        else:
+            self.__wait(session)
+            self.__respond(None, session, args, result, astr)
+
+    def close(self):
+        """
+        Waits for all background commands, and stops the background threads
+        """
+
+        self.__wait()
+        self.__threads.shutdown()
+
+
+def main(stdin=sys.stdin, stdout=sys.stdout.buffer, pool=None):
+    """
+    Runs the server loop, reading one command per line until quit is called.
+    With a pool, CPU-bound requests on different sessions run at the same time,
+    and their responses are written as they finish.
+
+    Args:
+        stdin (file | Optional): The text stream to read commands from
+        stdout (file | Optional): The binary stream to write responses to
+        pool (WorkerPool | Optional): The pool to run CPU-bound commands in
+    """
+
+    parser = build_parser()
+    scheduler = BatchScheduler(stdout, pool)
+
+    try:
+        for astr in stdin:
+
+            # parse args from raw input
+            args = parse_command(parser, astr)
+            if args is None:
+                continue
+
+            # check if quit was called, early break
+            if args.quit:
+                log.debug("Quitting Server")
+                break
+
+            scheduler.submit(args, astr)
+    finally:
+        scheduler.close()
+
+
+# region socket server
+
+HEAVY_COMMANDS = (
+    arguments.CMD_POLYGON,
+    arguments.CMD_HOUSE,
+    arguments.CMD_ORIENT,
+    arguments.CMD_CHECKPOINT,
+    arguments.CMD_RESTORE,
+    arguments.CMD_CLONE,
+)
+"""Commands that copy or build whole meshes, and run in the executor of the socket server"""
+
+
+def is_heavy(args):
+    """
+    Checks if a command does enough work to block the event loop
+
+    Args:
+        args (argparse.Namespace): The parsed command
+
+    Returns:
+        bool: True if the command subdivides, transfers or builds a mesh
+    """
+
+    return (
+        args.cmd_name in HEAVY_COMMANDS
+        or args.__getattribute__(arguments.GLOBAL_SUBDIVIDE_ARGUMENT.name) is not None
+        or args.__getattribute__(arguments.GLOBAL_TRANSFER_ARGUMENT.name)
+    )
+
+
+async def handle_client(reader, writer, parser, executor=None, pool=None):
+    """
+    Serves one socket client until it quits or disconnects.
+    Every client has its own sessions, and its commands run in the order they arrive,
+    while heavy commands run in the executor so other clients are served in the meantime.
+
+    Args:
+        reader (asyncio.StreamReader): The stream to read commands from
+        writer (asyncio.StreamWriter): The stream to write responses to
+        parser (argparse.ArgumentParser): The parser, as built by build_parser
+        executor (concurrent.futures.Executor | Optional): The executor of heavy commands, None for the default executor
+        pool (WorkerPool | Optional): The pool to run CPU-bound commands in, from the executor threads
+    """
+
+    loop = asyncio.get_running_loop()
+    sessions = SessionStore()
+    log.debug("Client connected")
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+
+            astr = line.decode("utf-8")
+            args = parse_command(parser, astr)
+            if args is None:
+                continue
+            if args.quit:
+                break
+
+            if is_heavy(args):
+                response = await loop.run_in_executor(
+                    executor, run_command, args, astr, sessions, pool
+                )
+            else:
+                response = run_command(args, astr, sessions)
+
+            if response is not None:
+                writer.write(response)
+                await writer.drain()
+    except ConnectionError:
+        log.warning("Client connection lost")
+    finally:
+        log.debug("Client disconnected")
+        writer.close()
+
+
+async def serve(host="127.0.0.1", port=0, path=None, executor=None, pool=None):
+    """
+    Starts a socket server, on a unix domain socket if a path is given, else on tcp
+
+    Args:
+        host (str | Optional): The host to listen on, localhost by default
+        port (int | Optional): The port to listen on, 0 picks a free port
+        path (str | Optional): The path of the unix domain socket
+        executor (concurrent.futures.Executor | Optional): The executor of heavy commands, None for the default executor
+        pool (WorkerPool | Optional): The pool to run CPU-bound commands in
+
+    Returns:
+        asyncio.Server: The started server, read the bound address from its sockets
+    """
+
+    handler = functools.partial(
+        handle_client, parser=build_parser(), executor=executor, pool=pool
+    )
+
+    if path is not None:
+        server = await asyncio.start_unix_server(handler, path=path)
+    else:
+        server = await asyncio.start_server(handler, host=host, port=port)
+
+    log.debug(
+        "Listening on %s", ", ".join(str(s.getsockname()) for s in server.sockets)
+    )
+    return server
+
+
+def serve_forever(host="127.0.0.1", port=0, path=None, workers=None, pool=None):
+    """
+    Runs a socket server until the process is stopped
+
+    Args:
+        host (str | Optional): The host to listen on, localhost by default
+        port (int | Optional): The port to listen on, 0 picks a free port
+        path (str | Optional): The path of the unix domain socket
+        workers (int | Optional): The number of threads running heavy commands
+        pool (WorkerPool | Optional): The pool to run CPU-bound commands in
+    """
+
+    async def run():
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            server = await serve(host, port, path, executor, pool)
+            async with server:
+                await server.serve_forever()
+
+    asyncio.run(run())
+
+
+def build_server_parser():
+    """
+    Builds the parser of the server process arguments
+
+    Returns:
+        argparse.ArgumentParser: The parser
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Run the FEM server on stdin, or on a socket for many clients"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="tcp host to listen on")
+    parser.add_argument("--port", type=int, help="tcp port to listen on")
+    parser.add_argument("--unix", help="path of a unix domain socket to listen on")
+    parser.add_argument(
+        "--workers", type=int, help="number of threads running heavy commands"
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=0,
+        help="number of worker processes for CPU-bound commands, 0 to run them in the server",
+    )
+    parser.add_argument(
+        "--cache-bytes",
+        type=int,
+        default=CACHE.max_bytes,
+        help="byte budget of the result cache, 0 to disable caching",
+    )
+
+    return parser
+
+
+# endregion
+
+
+if __name__ == "__main__":
+    configure_logging()
+    server_args = build_server_parser().parse_args()
+    CACHE = ResultCache(server_args.cache_bytes) if server_args.cache_bytes else None
+    pool = WorkerPool(server_args.processes) if server_args.processes else None
+    try:
+        if server_args.port is None and server_args.unix is None:
+            main(pool=pool)
+        else:
+            serve_forever(
+                server_args.host,
+                server_args.port,
+                server_args.unix,
+                server_args.workers,
+                pool,
+            )
+    finally:
+        BLOCKS.release_all()
+        if pool is not None:
+            pool.close()
@@ -0,0 +1,287 @@
+import logging
+from mesh import FEMMesh
+from snapshot import MeshSnapshot
+
+
+class Session:
+    """
+    A named mesh kept resident in the server, together with its checkpoint.
+    The mesh can be held as a read-only snapshot, e.g. from the result cache,
+    which is only loaded into a mesh when a command needs one.
+    """
+
+    def __init__(self, name, mesh=None):
+        """
+        Creates a new session
+
+        Args:
+            name (str): The name of the session
+            mesh (FEMMesh | Optional): The mesh of the session, a new empty mesh if not given
+        """
+
+        self.name = name
+        self.__mesh = FEMMesh() if mesh is None else mesh
+        # snapshot the mesh is loaded from on first use, or None
+        self.__snapshot = None
+        # the mesh commands that built the mesh from an empty mesh, None if they are not known
+        self.lineage = () if mesh is None else None
+        # copy of the mesh or snapshot saved by the checkpoint command, or None
+        self.checkpoint = None
+        self.checkpoint_lineage = None
+
+    @property
+    def mesh(self):
+        """
+        The mesh of the session, loaded from the snapshot if there is one
+
+        Returns:
+            FEMMesh: The mesh
+        """
+
+        if self.__mesh is None:
+            self.__mesh = FEMMesh.from_snapshot(self.__snapshot)
+            # commands change the mesh in place, so the snapshot is outdated from here on
+            self.__snapshot = None
+
+        return self.__mesh
+
+    @mesh.setter
+    def mesh(self, mesh):
+        self.__mesh = mesh
+        self.__snapshot = None
+
+    @property
+    def __resident(self):
+        # the mesh or the snapshot, whichever is held, they report the same counts and bytes
+        return self.__snapshot if self.__mesh is None else self.__mesh
+
+    def load(self, snapshot, lineage):
+        """
+        Replaces the mesh with a snapshot, without loading it yet
+
+        Args:
+            snapshot (MeshSnapshot): The read-only snapshot of the new mesh
+            lineage (tuple | None): The mesh commands that built the snapshot
+        """
+
+        self.__mesh = None
+        self.__snapshot = snapshot
+        self.lineage = lineage
+
+    def save_checkpoint(self):
+        """
+        Saves the mesh, to restore it later. A snapshot is read-only, so it is saved without a copy.
+        """
+
+        if self.__mesh is None:
+            self.checkpoint = self.__snapshot
+        else:
+            self.checkpoint = self.__mesh.copy()
+        self.checkpoint_lineage = self.lineage
+
+    def restore_checkpoint(self):
+        """
+        Replaces the mesh with a copy of the saved checkpoint
+        """
+
+        if self.checkpoint is None:
+            raise ValueError("There is no checkpoint to restore")
+
+        if isinstance(self.checkpoint, MeshSnapshot):
+            self.load(self.checkpoint, self.checkpoint_lineage)
+        else:
+            self.mesh = self.checkpoint.copy()
+            self.lineage = self.checkpoint_lineage
+
+    def copy(self, name):
+        """
+        Copies the mesh of the session into a new session, snapshots are shared
+
+        Args:
+            name (str): The name of the copy
+
+        Returns:
+            Session: The copy, without a checkpoint
+        """
+
+        session = Session(name)
+        if self.__mesh is None:
+            session.load(self.__snapshot, self.lineage)
+        else:
+            session.mesh = self.__mesh.copy()
+            session.lineage = self.lineage
+
+        return session
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes held by the mesh and the checkpoint of the session.
+        A snapshot is reported as it is, without loading it.
+
+        Returns:
+            int: The number of bytes
+        """
+
+        nbytes = self.__resident.nbytes
+        if self.checkpoint is not None:
+            nbytes += self.checkpoint.nbytes
+
+        return nbytes
+
+    def info(self):
+        """
+        A json serializable summary of the session
+
+        Returns:
+            dict: The name, element counts and memory use of the session
+        """
+
+        resident = self.__resident
+        return {
+            "name": self.name,
+            "vertices": resident.vertex_count,
+            "nodes": resident.node_count,
+            "faces": resident.face_count,
+            "bytes": self.nbytes,
+        }
+
+
+class SessionStore:
+    """
+    The named meshes of a server. Commands run on the selected session,
+    so clients can keep a base mesh resident and derive variants from cheap clones of it.
+    """
+
+    DEFAULT_SESSION = "default"
+    """The name of the session that is selected when the store is created"""
+
+    def __init__(self):
+        """
+        Creates a new store, with an empty default session selected
+        """
+
+        # internal dict matching session names to sessions
+        self.__sessions = {}
+        self.__current = None
+        self.create(self.DEFAULT_SESSION)
+
+    @property
+    def current(self):
+        """
+        The selected session
+
+        Returns:
+            Session: The session commands run on
+        """
+
+        return self.__current
+
+    def __getitem__(self, name):
+        if name not in self.__sessions:
+            raise KeyError("There is no session named {}".format(name))
+
+        return self.__sessions[name]
+
+    def __contains__(self, name):
+        return name in self.__sessions
+
+    def create(self, name, mesh=None):
+        """
+        Creates a new session and selects it. An existing session of the same name is replaced.
+
+        Args:
+            name (str): The name of the session
+            mesh (FEMMesh | Optional): The mesh of the session, a new empty mesh if not given
+
+        Returns:
+            Session: The new session
+        """
+
+        return self.__add(Session(name, mesh))
+
+    def __add(self, session):
+        # replaces a session of the same name, and selects the new one
+        self.__sessions[session.name] = session
+        self.__current = session
+        logging.info("Created session %s", session.name)
+
+        return session
+
+    def clone(self, name):
+        """
+        Copies the selected session into a new session and selects the copy
+
+        Args:
+            name (str): The name of the copy
+
+        Returns:
+            Session: The copy
+        """
+
+        return self.__add(self.__current.copy(name))
+
+    def select(self, name):
+        """
+        Selects an existing session
+
+        Args:
+            name (str): The name of the session
+
+        Returns:
+            Session: The selected session
+        """
+
+        self.__current = self[name]
+        return self.__current
+
+    def drop(self, name):
+        """
+        Removes a session. Dropping the selected session selects the default session,
+        which is created again if it was dropped.
+
+        Args:
+            name (str): The name of the session
+
+        Returns:
+            Session: The removed session
+        """
+
+        session = self[name]
+        del self.__sessions[name]
+        logging.info("Dropped session %s", name)
+
+        if session is self.__current:
+            if self.DEFAULT_SESSION in self.__sessions:
+                self.select(self.DEFAULT_SESSION)
+            else:
+                self.create(self.DEFAULT_SESSION)
+
+        return session
+
+    def list(self):
+        """
+        Summaries of all sessions, ordered by name
+
+        Returns:
+            list[dict]: The summaries, with a flag for the selected session
+        """
+
+        infos = []
+        for name in sorted(self.__sessions):
+            info = self.__sessions[name].info()
+            info["selected"] = self.__sessions[name] is self.__current
+            infos.append(info)
+
+        return infos
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes held by all sessions
+
+        Returns:
+            int: The number of bytes
+        """
+
+        return sum(session.nbytes for session in self.__sessions.values())
@@ -0,0 +1,125 @@
+import numpy as np
+
+
+class MeshSnapshot:
+    """
+    A read-only copy of the live contents of a mesh, in compact arrays.
+    Removed vertices, nodes and faces are squeezed out, so all rows are numbered from 0,
+    while the original indices are kept next to them to map back into the mesh.
+    Taking a snapshot never changes the mesh, so it can be repeated as often as needed.
+    """
+
+    def __init__(
+        self,
+        vertices,
+        vertex_nodes,
+        nodes,
+        offsets,
+        indices,
+        vertex_indices,
+        node_indices,
+        face_indices,
+    ):
+        """
+        Creates a new snapshot from compact mesh arrays
+
+        Args:
+            vertices (np.array[float]): The (V, 3) vertex coordinates
+            vertex_nodes (np.array[int]): The row of the parent node of every vertex
+            nodes (np.array[float]): The (N, 3) node positions
+            offsets (np.array[int]): The CSR offsets of the faces into indices
+            indices (np.array[int]): The flat vertex rows of the faces
+            vertex_indices (np.array[int]): The mesh index of every vertex row
+            node_indices (np.array[int]): The mesh index of every node row
+            face_indices (np.array[int]): The mesh index of every face
+        """
+
+        self.vertices = vertices
+        self.vertex_nodes = vertex_nodes
+        self.nodes = nodes
+        self.offsets = offsets
+        self.indices = indices
+        self.vertex_indices = vertex_indices
+        self.node_indices = node_indices
+        self.face_indices = face_indices
+
+        for array in (
+            self.vertices,
+            self.vertex_nodes,
+            self.nodes,
+            self.offsets,
+            self.indices,
+            self.vertex_indices,
+            self.node_indices,
+            self.face_indices,
+        ):
+            array.setflags(write=False)
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes held by the arrays of the snapshot
+
+        Returns:
+            int: The number of bytes
+        """
+
+        return sum(
+            array.nbytes
+            for array in (
+                self.vertices,
+                self.vertex_nodes,
+                self.nodes,
+                self.offsets,
+                self.indices,
+                self.vertex_indices,
+                self.node_indices,
+                self.face_indices,
+            )
+        )
+
+    @property
+    def vertex_count(self):
+        """
+        The number of vertices in the snapshot
+
+        Returns:
+            int: The number of vertices
+        """
+
+        return len(self.vertices)
+
+    @property
+    def node_count(self):
+        """
+        The number of nodes in the snapshot
+
+        Returns:
+            int: The number of nodes
+        """
+
+        return len(self.nodes)
+
+    @property
+    def face_count(self):
+        """
+        The number of faces in the snapshot
+
+        Returns:
+            int: The number of faces
+        """
+
+        return len(self.offsets) - 1
+
+    def faces(self):
+        """
+        The vertex rows of every face, one array per face
+
+        Returns:
+            list[np.array[int]]: The faces, in the order of face_indices
+        """
+
+        if self.face_count == 0:
+            return []
+
+        return np.split(self.indices, self.offsets[1:-1])
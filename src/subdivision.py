@@ -0,0 +1,274 @@
+import functools
+import numpy as np
+
+
+def __face_corner_topology(offsets):
+    """
+    Calculates, for every corner of a CSR face array,
+    the face it belongs to and the positions of its neighbouring corners.
+
+    Args:
+        offsets (np.array[int]): The CSR offsets of the faces
+
+    Returns:
+        tuple[np.array[int], np.array[int], np.array[int]]: The face, next and previous corner for all corners
+    """
+
+    sizes = np.diff(offsets)
+    corner_faces = np.repeat(np.arange(len(sizes)), sizes)
+    starts = offsets[corner_faces]
+    face_sizes = sizes[corner_faces]
+    local = np.arange(offsets[-1]) - starts
+
+    next_corners = starts + (local + 1) % face_sizes
+    previous_corners = starts + (local - 1) % face_sizes
+
+    return (corner_faces, next_corners, previous_corners)
+
+
+def __subdivide_level(coords, offsets, indices, vertex_nodes, node_positions):
+    """
+    Runs a single level of constant quad subdivision over all faces at once.
+    Every face is split into one quad per corner, spanning from the corner
+    over the outgoing edge mid point, the face center and the incoming edge mid point.
+
+    Args:
+        coords (np.array[float]): The (V, 3) vertex coordinates
+        offsets (np.array[int]): The CSR offsets of the faces
+        indices (np.array[int]): The CSR vertex indices of the faces
+        vertex_nodes (np.array[int]): The parent node of every vertex
+        node_positions (np.array[float]): The (N, 3) node positions
+
+    Returns:
+        tuple: The coords, face vertex array, vertex nodes and node positions of the quads
+    """
+
+    corner_faces, next_corners, previous_corners = __face_corner_topology(offsets)
+    sizes = np.diff(offsets)
+
+    corners = coords[indices]
+    corner_nodes = vertex_nodes[indices]
+
+    # outgoing edge mid points and face centers of all corners
+    mids = corners + 0.5 * (corners[next_corners] - corners)
+    centers = np.add.reduceat(corners, offsets[:-1], axis=0) / sizes[:, np.newaxis]
+
+    # every edge gets one shared mid node, keyed by the sorted node pair it spans
+    next_nodes = corner_nodes[next_corners]
+    edge_keys = np.minimum(corner_nodes, next_nodes) * len(node_positions)
+    edge_keys += np.maximum(corner_nodes, next_nodes)
+    edge_keys, first_corners, mid_nodes = np.unique(
+        edge_keys, return_index=True, return_inverse=True
+    )
+    mid_nodes = mid_nodes.ravel() + len(node_positions)
+    center_nodes = np.arange(len(sizes)) + len(node_positions) + len(edge_keys)
+
+    node_positions = np.concatenate([node_positions, mids[first_corners], centers])
+
+    # every corner becomes a quad of 4 new vertices: corner, outgoing mid, center, incoming mid
+    quad_coords = np.stack(
+        [corners, mids, centers[corner_faces], mids[previous_corners]], axis=1
+    )
+    quad_nodes = np.stack(
+        [
+            corner_nodes,
+            mid_nodes,
+            center_nodes[corner_faces],
+            mid_nodes[previous_corners],
+        ],
+        axis=1,
+    )
+
+    quads = np.arange(4 * len(corners)).reshape(-1, 4)
+
+    quad_coords = quad_coords.reshape(-1, coords.shape[1])
+
+    return (quad_coords, quads, quad_nodes.ravel(), node_positions)
+
+
+class Stencil:
+    """
+    The result of recursively subdividing a single n-gon into constant quads,
+    independent of the position of its corners.
+    Every child point is a fixed linear combination of the corners of the parent face,
+    so the points of a face are weights.dot(corners).
+    """
+
+    def __init__(self, weights, quads, depth):
+        """
+        Creates a new stencil from the subdivided points of an n-gon
+
+        Args:
+            weights (np.array[float]): The (M, n) corner weights of all child points
+            quads (np.array[int]): The (Q, 4) child quads, as indices into the child points
+            depth (int): The recursion depth of the subdivision
+        """
+
+        self.weights = weights
+        self.quads = quads
+
+        n_sides = weights.shape[1]
+        steps = 2**depth
+        nonzero = weights != 0.0
+        counts = np.count_nonzero(nonzero, axis=1)
+
+        # corners only depend on themselves
+        self.corner_points = np.argmax(weights == 1.0, axis=0)
+
+        # edge points only depend on the two corners of their edge,
+        # they are stored with the edge index and their step along the edge
+        edge_points = np.flatnonzero(counts == 2)
+        first = np.argmax(nonzero[edge_points], axis=1)
+        last = n_sides - 1 - np.argmax(nonzero[edge_points][:, ::-1], axis=1)
+        wraps = (first == 0) & (last == n_sides - 1)
+        self.edge_points = edge_points
+        self.edge_indices = np.where(wraps, last, first)
+        self.edge_steps = np.rint(
+            weights[edge_points, (self.edge_indices + 1) % n_sides] * steps
+        ).astype(np.int64)
+
+        # everything else is inside the face
+        self.interior_points = np.flatnonzero(counts > 2)
+
+        for array in (
+            self.weights,
+            self.quads,
+            self.corner_points,
+            self.edge_points,
+            self.edge_indices,
+            self.edge_steps,
+            self.interior_points,
+        ):
+            array.setflags(write=False)
+
+
+@functools.lru_cache(maxsize=32)
+def stencil(n_sides, depth):
+    """
+    Gets the constant quad subdivision stencil of an n-gon.
+    Stencils are built by subdividing the corners of an n-dimensional unit basis,
+    and cached for the most recently used combinations.
+
+    Args:
+        n_sides (int): The number of corners of the face
+        depth (int): The recursion depth of the subdivision, at least 1
+
+    Returns:
+        Stencil: The read-only stencil
+    """
+
+    basis = np.identity(n_sides)
+    offsets = np.array([0, n_sides])
+    indices = np.arange(n_sides)
+    nodes = np.arange(n_sides)
+    positions = basis
+
+    for level in range(depth):
+        basis, quads, nodes, positions = __subdivide_level(
+            basis, offsets, indices, nodes, positions
+        )
+        offsets = np.arange(0, quads.size + 1, 4)
+        indices = quads.ravel()
+
+    return Stencil(positions, nodes.reshape(-1, 4), depth)
+
+
+def constant_quads(coords, offsets, indices, vertex_nodes, node_positions, levels):
+    """
+    Recursively subdivides all given faces into quads.
+    The result is the same as recursively subdividing every face on its own,
+    but all faces with the same number of corners are subdivided by one product
+    with their cached stencil, and points are shared between neighbouring faces
+    by their edge, instead of welding them by distance.
+
+    Args:
+        coords (np.array[float]): The (V, 3) vertex coordinates
+        offsets (np.array[int]): The CSR offsets of the faces
+        indices (np.array[int]): The CSR vertex indices of the faces
+        vertex_nodes (np.array[int]): The parent node of every vertex
+        node_positions (np.array[float]): The (N, 3) node positions
+        levels (int): The number of times to subdivide, at least 1
+
+    Returns:
+        tuple: The (V', 3) vertex coordinates, the (F', 4) quads, the parent node
+        of every vertex and the (N', 3) node positions of the subdivided faces.
+        Nodes are compacted, so only nodes with vertices remain.
+    """
+
+    sizes = np.diff(offsets)
+    node_count = len(node_positions)
+    steps = 2**levels
+
+    groups = []
+    edge_keys = []
+    edge_coords = []
+
+    for n_sides in np.unique(sizes).tolist():
+        face_stencil = stencil(n_sides, levels)
+
+        faces = offsets[:-1][sizes == n_sides, np.newaxis] + np.arange(n_sides)
+        corners = indices[faces]
+        corner_nodes = vertex_nodes[corners]
+
+        # one product gives the child points of all faces of this size
+        points = np.einsum("mn,fnk->fmk", face_stencil.weights, coords[corners])
+
+        # edge points are keyed by the node pair of their edge and their step from the lower node
+        start = corner_nodes[:, face_stencil.edge_indices]
+        end = corner_nodes[:, (face_stencil.edge_indices + 1) % n_sides]
+        steps_from_start = np.where(
+            start < end, face_stencil.edge_steps, steps - face_stencil.edge_steps
+        )
+        keys = np.minimum(start, end) * node_count + np.maximum(start, end)
+        edge_keys.append((keys * steps + steps_from_start).ravel())
+        edge_coords.append(points[:, face_stencil.edge_points].reshape(-1, 3))
+
+        groups.append((face_stencil, corner_nodes, points))
+
+    edge_keys, first_points, edge_nodes = np.unique(
+        np.concatenate(edge_keys), return_index=True, return_inverse=True
+    )
+    edge_nodes = edge_nodes.ravel() + node_count
+    new_positions = [node_positions, np.concatenate(edge_coords)[first_points]]
+    next_node = node_count + len(edge_keys)
+    next_edge = 0
+
+    quad_coords = []
+    quad_nodes = []
+
+    for face_stencil, corner_nodes, points in groups:
+        face_count, point_count = points.shape[:2]
+
+        point_nodes = np.empty((face_count, point_count), dtype=np.int64)
+        point_nodes[:, face_stencil.corner_points] = corner_nodes
+
+        edge_count = face_count * len(face_stencil.edge_points)
+        point_nodes[:, face_stencil.edge_points] = edge_nodes[
+            next_edge : next_edge + edge_count
+        ].reshape(face_count, -1)
+        next_edge += edge_count
+
+        # interior points are never shared, every one of them is a new node
+        interior_count = face_count * len(face_stencil.interior_points)
+        point_nodes[:, face_stencil.interior_points] = np.arange(
+            next_node, next_node + interior_count
+        ).reshape(face_count, -1)
+        next_node += interior_count
+        new_positions.append(points[:, face_stencil.interior_points].reshape(-1, 3))
+
+        quad_coords.append(points[:, face_stencil.quads].reshape(-1, 3))
+        quad_nodes.append(point_nodes[:, face_stencil.quads].ravel())
+
+    quad_coords = np.concatenate(quad_coords)
+    vertex_nodes = np.concatenate(quad_nodes)
+    node_positions = np.concatenate(new_positions)
+
+    # squeeze out nodes that lost all their vertices, or never had any
+    used_nodes, vertex_nodes = np.unique(vertex_nodes, return_inverse=True)
+
+    return (
+        quad_coords,
+        np.arange(len(quad_coords)).reshape(-1, 4),
+        vertex_nodes.ravel(),
+        node_positions[used_nodes],
+    )
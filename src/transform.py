@@ -1,6 +1,9 @@
 import numpy as np
 from geometry import Plane
 
+# number of rows transformed at once when points are transformed in place
+__CHUNK_ROWS = 65536
+
 
 def __unit_vector(vector):
     """Returns the unit vector of the vector."""
@@ -86,6 +89,47 @@ def transform_point(matrix, point):
     return matrix.dot(np.append(point, [1]))[:3]
 
 
+def transform_points(matrix, points, out=None):
+    """
+    Transforms many points at once, with the affine part of one or more 4x4 matrices.
+
+    Args:
+        matrix (np.array[float]): A (4, 4) matrix, or a (K, 4, 4) batch of matrices
+        points (np.array[float]): The (N, 3) points to transform
+        out (np.array[float] | Optional): A (N, 3) array to write the result to, for a single matrix.
+            It may be the points array itself, to transform the points in place.
+
+    Returns:
+        np.array[float]: The (N, 3) transformed points, or (K, N, 3) for a batch of matrices
+    """
+
+    matrix = np.asarray(matrix, dtype=float)
+
+    if matrix.ndim == 3:
+        return (
+            np.matmul(points, matrix[:, :3, :3].transpose(0, 2, 1))
+            + matrix[:, np.newaxis, :3, 3]
+        )
+
+    rotation = matrix[:3, :3].T
+    if out is None:
+        out = np.matmul(points, rotation)
+    elif np.shares_memory(out, points):
+        # numpy copies inputs that overlap the output, so in place the rows
+        # go through a small buffer instead of a full (N, 3) temporary
+        chunk = np.empty((min(len(points), __CHUNK_ROWS), 3))
+        for start in range(0, len(points), __CHUNK_ROWS):
+            stop = min(start + __CHUNK_ROWS, len(points))
+            rows = chunk[: stop - start]
+            np.matmul(points[start:stop], rotation, out=rows)
+            out[start:stop] = rows
+    else:
+        np.matmul(points, rotation, out=out)
+
+    out += matrix[:3, 3]
+    return out
+
+
 # if __name__ == "__main__":
 #     plane = Plane(np.array([5, 0, 0]), np.array([1, 0, 0]), np.array([1, 0, 1]))
 #     pt = plane.point_at(1, 1, 0)
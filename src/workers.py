@@ -0,0 +1,266 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from mesh import FEMMesh
+from snapshot import MeshSnapshot
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_ARRAYS = ("vertices", "vertex_nodes", "nodes", "offsets", "indices")
+"""The snapshot arrays needed to load a mesh again, in the order they are shared"""
+
+
+def share_arrays(arrays):
+    """
+    Copies arrays into one new shared memory block, one after the other
+
+    Args:
+        arrays (list[np.array]): The arrays to share
+
+    Returns:
+        tuple[SharedMemory, list[tuple]]: The block, and the dtype, shape and byte offset of every array
+    """
+
+    layout = []
+    size = 0
+    for array in arrays:
+        # keep every array aligned to 8 bytes, so views into the block are aligned
+        layout.append((array.dtype.str, array.shape, size))
+        size += -(-array.nbytes // 8) * 8
+
+    # blocks can not be empty, even for an empty mesh
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for array, view in zip(arrays, attach_arrays(block, layout)):
+        view[...] = array
+
+    return (block, layout)
+
+
+def attach_arrays(block, layout):
+    """
+    Views the arrays of a shared memory block, without copying them.
+    The views have to be dropped before the block is closed.
+
+    Args:
+        block (SharedMemory): The block
+        layout (list[tuple]): The dtype, shape and byte offset of every array, as returned by share_arrays
+
+    Returns:
+        list[np.array]: The views of the arrays
+    """
+
+    return [
+        np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf, offset=offset)
+        for dtype, shape, offset in layout
+    ]
+
+
+def share_mesh(mesh):
+    """
+    Copies the snapshot of a mesh into a new shared memory block
+
+    Args:
+        mesh (FEMMesh): The mesh to share
+
+    Returns:
+        tuple[SharedMemory, list[tuple]]: The block and the layout of its arrays
+    """
+
+    snapshot = mesh.snapshot()
+    return share_arrays([getattr(snapshot, name) for name in SNAPSHOT_ARRAYS])
+
+
+def load_mesh(block, layout):
+    """
+    Loads a mesh from the snapshot arrays in a shared memory block
+
+    Args:
+        block (SharedMemory): The block
+        layout (list[tuple]): The layout of the snapshot arrays in the block
+
+    Returns:
+        FEMMesh: The loaded mesh, with its own copies of the arrays
+    """
+
+    vertices, vertex_nodes, nodes, offsets, indices = attach_arrays(block, layout)
+    # the kernel copies all arrays while loading, so the views are dropped right after
+    return FEMMesh.from_snapshot(
+        MeshSnapshot(
+            vertices,
+            vertex_nodes,
+            nodes,
+            offsets,
+            indices,
+            np.arange(len(vertices)),
+            np.arange(len(nodes)),
+            np.arange(len(offsets) - 1),
+        )
+    )
+
+
+def run_shared(function, name, layout, args):
+    """
+    Runs a mesh function in a worker process, on a mesh shared by the coordinator.
+    The changed mesh is shared back in a new block, which the coordinator unlinks after loading it.
+
+    Args:
+        function (callable): The function, taking the mesh and args and returning the new mesh and a result
+        name (str): The name of the block of the input mesh
+        layout (list[tuple]): The layout of the input mesh
+        args (tuple): The further arguments of the function
+
+    Returns:
+        tuple[str, list[tuple], object]: The name and layout of the block of the new mesh, and the result
+    """
+
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        mesh = load_mesh(block, layout)
+    finally:
+        block.close()
+
+    mesh, result = function(mesh, *args)
+
+    block, layout = share_mesh(mesh)
+    # closing only drops the view of this process, the block lives until it is unlinked
+    block.close()
+
+    return (block.name, layout, result)
+
+
+class WorkerPool:
+    """
+    A pool of worker processes for CPU-bound mesh commands.
+    The meshes stay owned by the coordinator, workers only get a shared copy of the arrays
+    and hand back the changed mesh the same way, so no mesh is pickled on the way.
+    """
+
+    def __init__(self, processes=None):
+        """
+        Creates a new pool, the processes are started on demand
+
+        Args:
+            processes (int | Optional): The number of worker processes, the number of cores by default
+        """
+
+        self.processes = os.cpu_count() if processes is None else processes
+        # workers share the tracker of the coordinator, so unlinking a block
+        # in the coordinator also clears it for the worker that created it
+        resource_tracker.ensure_running()
+        # workers are started from the threads of the socket server, forking there
+        # could copy locks held by other threads, so they start fresh interpreters
+        self.__executor = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def run(self, mesh, function, *args):
+        """
+        Runs a mesh function in a worker process, and waits for its result.
+        Only the calling thread waits, so callers keep many workers busy by calling this from many threads.
+
+        Args:
+            mesh (FEMMesh): The mesh to run the function on, it is not changed
+            function (callable): A module level function, taking the mesh and args
+                and returning the new mesh and a result
+            *args: The further, picklable arguments of the function
+
+        Returns:
+            tuple[FEMMesh, object]: The new mesh and the result of the function
+        """
+
+        block, layout = share_mesh(mesh)
+        try:
+            future = self.__executor.submit(
+                run_shared, function, block.name, layout, args
+            )
+            name, layout, result = future.result()
+        finally:
+            block.close()
+            block.unlink()
+
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            mesh = load_mesh(block, layout)
+        finally:
+            block.close()
+            block.unlink()
+
+        log.debug("Ran %s in a worker process", function.__name__)
+        return (mesh, result)
+
+    def close(self):
+        """
+        Shuts the worker processes down, after all running functions are done
+        """
+
+        self.__executor.shutdown()
+
+
+class SharedBlocks:
+    """
+    The shared memory blocks handed out by shared transfers.
+    A block stays alive until its client releases it, or the server shuts down.
+    """
+
+    def __init__(self):
+        """
+        Creates a new, empty registry
+        """
+
+        # internal dict matching block names to blocks
+        self.__blocks = {}
+        # socket clients run commands from many threads
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__blocks)
+
+    def __contains__(self, name):
+        return name in self.__blocks
+
+    def add(self, block):
+        """
+        Keeps a block alive until it is released
+
+        Args:
+            block (SharedMemory): The block
+        """
+
+        with self.__lock:
+            self.__blocks[block.name] = block
+
+    def release(self, name):
+        """
+        Closes and unlinks a block, once the client is done with it
+
+        Args:
+            name (str): The name of the block
+        """
+
+        with self.__lock:
+            if name not in self.__blocks:
+                raise KeyError("There is no shared block named {}".format(name))
+            block = self.__blocks.pop(name)
+
+        block.close()
+        block.unlink()
+
+    def release_all(self):
+        """
+        Closes and unlinks all blocks, clients can not read them afterwards
+        """
+
+        with self.__lock:
+            blocks = list(self.__blocks.values())
+            self.__blocks.clear()
+
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+        if blocks:
+            log.debug("Released %s unreleased shared blocks", len(blocks))
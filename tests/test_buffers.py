@@ -1,5 +1,5 @@
 import unittest
-from buffers import OneToManyConnectionTable, NodeBuffer
+from buffers import OneToManyConnectionTable, NodeBuffer, IndexAllocator
 import logging
 import numpy as np
 
@@ -50,6 +50,65 @@ class TestConnectionTable(unittest.TestCase):
             ["hi", 12, 5], list(table.read_connection(5)), "Should be [hi, 12]."
         )
 
+    def test_create_without_key(self):
+
+        logging.info("test_create_without_key")
+
+        table = OneToManyConnectionTable()
+        self.assertEqual(0, table.create_connection())
+        table.create_connection(2)
+        self.assertEqual(1, table.create_connection())
+        self.assertEqual(3, table.create_connection())
+
+        table.delete_connection(1)
+        self.assertEqual(1, table.create_connection())
+
+
+class TestIndexAllocator(unittest.TestCase):
+    def test_allocate_lowest_free(self):
+
+        logging.info("test_allocate_lowest_free")
+
+        allocator = IndexAllocator()
+        self.assertEqual([0, 1, 2, 3], [allocator.allocate() for _ in range(4)])
+
+        allocator.release(2)
+        allocator.release(0)
+        self.assertFalse(allocator.release(0))
+        self.assertEqual(2, allocator.count)
+        self.assertEqual(4, allocator.length)
+
+        self.assertEqual(0, allocator.allocate())
+        self.assertEqual(2, allocator.allocate())
+        self.assertEqual(4, allocator.allocate())
+
+    def test_allocate_many(self):
+
+        logging.info("test_allocate_many")
+
+        allocator = IndexAllocator()
+        allocator.allocate_range(5)
+        allocator.release_many([1, 3])
+
+        # batches fill the holes first, ranges always append
+        self.assertEqual([1, 3, 5], allocator.allocate_many(3).tolist())
+        allocator.release(0)
+        self.assertEqual(range(6, 8), allocator.allocate_range(2))
+        self.assertEqual([0], allocator.allocate_many(1).tolist())
+        self.assertEqual(8, allocator.count)
+
+    def test_claim(self):
+
+        logging.info("test_claim")
+
+        allocator = IndexAllocator()
+        self.assertTrue(allocator.claim(3))
+        self.assertFalse(allocator.claim(3))
+        self.assertEqual(1, allocator.count)
+
+        self.assertTrue(allocator.claim(1))
+        self.assertEqual([0, 2, 4], [allocator.allocate() for _ in range(3)])
+
 
 class TestNodeBuffer(unittest.TestCase):
     def test_add_vertex(self):
@@ -93,6 +152,44 @@ class TestNodeBuffer(unittest.TestCase):
         self.assertEqual(0, buffer.vertex_count)
         self.assertEqual(0, buffer.node_count)
 
+    def test_vertex_array(self):
+
+        logging.info("test_vertex_array")
+
+        buffer = NodeBuffer()
+        indices = [buffer.add_vertex(np.array([i, 0.0, 0.0])) for i in range(100)]
+        buffer.remove_vertex(indices[10])
+
+        vertices = buffer.vertex_array()
+        self.assertEqual((99, 3), vertices.shape)
+        self.assertEqual((99, 3), buffer.node_array().shape)
+        self.assertEqual(11.0, vertices[10][0])
+        self.assertIsNone(buffer.get_vertex(indices[10]))
+
+        # vertices are views into the backing store
+        buffer.get_vertex(indices[5])[1] = 2.0
+        np.testing.assert_array_equal([5.0, 2.0, 0.0], buffer.get_vertex(indices[5]))
+
+    def test_find_parent_node(self):
+
+        logging.info("test_find_parent_node")
+
+        rng = np.random.default_rng(3)
+        buffer = NodeBuffer()
+        for point in rng.uniform(0.0, 0.1, size=(200, 3)):
+            buffer.add_vertex(point)
+
+        for point in rng.uniform(-0.01, 0.11, size=(200, 3)):
+            # the parent has to be the lowest node index within tolerance
+            expected = None
+            for index in buffer.node_indices():
+                if np.linalg.norm(buffer.node_position(index) - point) < 0.01:
+                    expected = index
+                    break
+
+            index, _ = buffer.find_parent_node(point)
+            self.assertEqual(expected, index)
+
 
 if __name__ == "__main__":
 
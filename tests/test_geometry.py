@@ -1,7 +1,9 @@
 import unittest
 import logging
+import tracemalloc
 import numpy as np
 from geometry import Plane
+from transform import transform_points
 from mesh import FEMMesh
 
 
@@ -64,6 +66,116 @@ class TestFaceTopology(unittest.TestCase):
         np.testing.assert_array_almost_equal(face_plane.y_axis, expected_plane.y_axis)
         np.testing.assert_array_almost_equal(face_plane.z_axis, expected_plane.z_axis)
 
+    def test_face_geometry(self):
+        mesh = FEMMesh()
+        mesh.add_face([[0, 0, 0], [2, 0, 0], [2, 1, 0], [0, 1, 0]])
+        mesh.add_face([[0, 0, 0], [0, 1, 0], [0, 0.5, 1]])
+        mesh.add_face([[2, 0, 0], [3, 0, 0], [3, 1, 0.5], [2.5, 1.5, 0.5], [2, 1, 0]])
+
+        np.testing.assert_array_almost_equal([2.0, 0.5], mesh.face_areas[:2])
+        np.testing.assert_array_almost_equal(
+            [[0, 0, 1], [1, 0, 0]], mesh.face_normals[:2]
+        )
+        np.testing.assert_array_almost_equal([1, 0.5, 0], mesh.face_centers[0])
+
+        # the batched planes have to match the planes of the single faces
+        for face_index, matrix in zip(mesh.face_indices, mesh.face_planes):
+            verts = mesh.get_vertices(mesh.get_face_indices(face_index))
+            plane = Plane(verts[0], verts[1] - verts[0], verts[-1] - verts[0])
+            np.testing.assert_array_almost_equal(plane.get_matrix(), matrix)
+
+        # moving the mesh invalidates the cached geometry
+        mesh.transform(np.diag([2.0, 1.0, 1.0, 1.0]))
+        self.assertAlmostEqual(4.0, mesh.face_areas[0])
+        np.testing.assert_array_almost_equal([2, 0.5, 0], mesh.get_face_center(0))
+
+    def test_transform(self):
+        mesh = FEMMesh.polygon(1.0, 5)
+        mesh.subdivide_faces(2)
+
+        angle = 0.3
+        matrix = np.identity(4)
+        matrix[:2, :2] = [
+            [np.cos(angle), -np.sin(angle)],
+            [np.sin(angle), np.cos(angle)],
+        ]
+        matrix[:3, 3] = [1.0, 2.0, 3.0]
+
+        moved = mesh.copy()
+        moved.transform(matrix)
+
+        vertices = np.array([mesh.get_vertex(i) for i in mesh.vertex_indices])
+        expected = vertices.dot(matrix[:3, :3].T) + matrix[:3, 3]
+        np.testing.assert_array_almost_equal(
+            expected, [moved.get_vertex(i) for i in moved.vertex_indices]
+        )
+
+        # nodes have to move with their vertices
+        for node_index in moved.node_indices:
+            vertex_index = next(iter(moved.get_node_indices(node_index)))
+            np.testing.assert_array_almost_equal(
+                moved.get_vertex(vertex_index), moved.get_node_position(node_index)
+            )
+
+        instances = mesh.instance_vertices([np.identity(4), matrix])
+        self.assertEqual((2, mesh.vertex_count, 3), instances.shape)
+        np.testing.assert_array_almost_equal(vertices, instances[0])
+        np.testing.assert_array_almost_equal(expected, instances[1])
+
+    def test_transform_in_place(self):
+        logging.info("test_transform_in_place")
+
+        matrix = np.identity(4)
+        matrix[:3, :3] = [[0, -1, 0], [1, 0, 0], [0, 0, 1]]
+        matrix[:3, 3] = [1.0, 2.0, 3.0]
+        points = np.random.default_rng(0).random((200000, 3))
+        expected = points.dot(matrix[:3, :3].T) + matrix[:3, 3]
+
+        # the points are transformed through small chunks, without a full temporary
+        tracemalloc.start()
+        result = transform_points(matrix, points, out=points)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        self.assertIs(points, result)
+        np.testing.assert_array_almost_equal(expected, points)
+        self.assertLess(peak, points.nbytes // 2)
+
+    def test_pending_transform(self):
+        mesh = FEMMesh.polygon(1.0, 6)
+        mesh.subdivide_faces(1)
+
+        rotation = np.identity(4)
+        rotation[1:3, 1:3] = [[0.0, -1.0], [1.0, 0.0]]
+        translation = np.identity(4)
+        translation[:3, 3] = [0.5, -2.0, 1.0]
+        scale = np.diag([2.0, 3.0, 1.0, 1.0])
+
+        for matrices in ([rotation, translation], [translation, scale]):
+            lazy = mesh.copy()
+            for matrix in matrices:
+                lazy.transform(matrix)
+
+            # the pending transform is applied to the cached geometry, without moving vertices
+            planes = lazy.face_planes
+            box = lazy.bounding_box
+            centers = lazy.face_centers
+            center = lazy.get_face_center(2)
+
+            # reading vertices applies the pending transform to the mesh itself
+            vertices = lazy.get_vertices(list(lazy.vertex_indices))
+            eager = FEMMesh()
+            for face_index in lazy.face_indices:
+                eager.add_face(list(lazy.get_face(face_index)))
+
+            np.testing.assert_array_almost_equal(eager.face_planes, planes)
+            np.testing.assert_array_almost_equal(eager.bounding_box, box)
+            np.testing.assert_array_almost_equal(eager.face_centers, centers)
+            np.testing.assert_array_almost_equal(eager.face_centers[2], center)
+            np.testing.assert_array_almost_equal(
+                [vertices.min(axis=0), vertices.max(axis=0)], lazy.bounding_box
+            )
+
 
 if __name__ == "__main__":
     logging.basicConfig(
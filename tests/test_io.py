@@ -1,6 +1,10 @@
 import unittest
 import logging
-from rhino_io import RhinoIO
+import io
+import json
+import numpy as np
+from rhino_io import MeshBuffer, RhinoIO
+import protocol
 from mesh import FEMMesh
 
 
@@ -23,6 +27,101 @@ class TestConnectionTable(unittest.TestCase):
 
         # RhinoIO.write_to_file(rhino_mesh, filename="test_output/fem_to_rhino.3dm")
 
+    def test_mesh_buffer(self):
+
+        logging.info("test_mesh_buffer")
+
+        mesh = FEMMesh.polygon(1, 6)
+        mesh.subdivide_faces(1)
+        mesh.remove_face(2)
+        face_indices = list(mesh.face_indices)
+
+        # transfers are pure reads, so they can be repeated without renumbering the mesh
+        buffer = MeshBuffer(mesh)
+        self.assertEqual(face_indices, list(mesh.face_indices))
+        np.testing.assert_array_equal(buffer.coords, MeshBuffer(mesh).coords)
+        self.assertEqual(3 * mesh.vertex_count, len(buffer.coords))
+        self.assertEqual((mesh.face_count, 4), buffer.faces.shape)
+        self.assertEqual(np.int32, buffer.faces.dtype)
+        self.assertEqual(mesh.vertex_count - 1, buffer.faces.max())
+
+        # welded buffers store every node once
+        welded = MeshBuffer(mesh, welded=True)
+        self.assertEqual(3 * mesh.node_count, len(welded.coords))
+        coords = welded.coords.reshape(-1, 3)[welded.faces]
+        np.testing.assert_array_equal(
+            buffer.coords.reshape(-1, 3)[buffer.faces], coords
+        )
+
+        # mixed faces fall back to compressed-sparse-row arrays
+        mesh.add_face([[2, 0, 0], [3, 0, 0], [3, 1, 0]])
+        buffer = MeshBuffer(mesh)
+        self.assertIsNone(buffer.faces)
+        faces = buffer.face_lists()
+        self.assertEqual([3] + [4] * (mesh.face_count - 1), sorted(map(len, faces)))
+        self.assertEqual(faces, [face.tolist() for face in mesh.snapshot().faces()])
+        self.assertEqual(buffer.to_json(), json.dumps((buffer.coords.tolist(), faces)))
+
+    def test_binary_frame(self):
+
+        logging.info("test_binary_frame")
+
+        mesh = FEMMesh.polygon(1, 5)
+        mesh.subdivide_faces(2)
+        buffer = MeshBuffer(mesh)
+
+        # frames and json lines can follow each other on one stream
+        stream = io.BytesIO(
+            buffer.to_frame()
+            + (buffer.to_json() + "\n").encode("utf-8")
+            + buffer.to_frame(double=True)
+        )
+
+        request_id, frame = protocol.read_message(stream)
+        self.assertEqual(protocol.NO_REQUEST, request_id)
+        self.assertEqual(mesh.face_count, frame.face_count)
+        np.testing.assert_array_almost_equal(buffer.coords, frame.coords, 6)
+        self.assertEqual(buffer.face_lists(), [list(face) for face in frame.faces()])
+
+        request_id, (coords, faces) = protocol.read_message(stream)
+        self.assertEqual(buffer.face_lists(), faces)
+
+        request_id, frame = protocol.read_message(stream)
+        self.assertEqual(buffer.coords.tolist(), frame.coords.tolist())
+        self.assertIsNone(protocol.read_message(stream))
+
+        # mixed faces are sent with their offsets
+        mesh.add_face([[2, 0, 0], [3, 0, 0], [3, 1, 0]])
+        buffer = MeshBuffer(mesh)
+        request_id, frame = protocol.read_message(
+            io.BytesIO(buffer.to_frame(request_id=7))
+        )
+        self.assertEqual(7, request_id)
+        self.assertEqual(0, frame.face_width)
+        self.assertEqual(buffer.face_lists(), [list(face) for face in frame.faces()])
+
+    def test_request_ids(self):
+
+        logging.info("test_request_ids")
+
+        stream = io.BytesIO(
+            protocol.encode_json(1)
+            + protocol.encode_json(2, result=[1, 2])
+            + protocol.encode_json(3, error="failed")
+            + MeshBuffer(FEMMesh.polygon(1, 4)).to_frame(request_id=4)
+        )
+
+        self.assertEqual((1, None), protocol.read_message(stream))
+        self.assertEqual((2, [1, 2]), protocol.read_message(stream))
+
+        request_id, error = protocol.read_message(stream)
+        self.assertEqual(3, request_id)
+        self.assertIsInstance(error, protocol.RemoteError)
+
+        request_id, frame = protocol.read_message(stream)
+        self.assertEqual(4, request_id)
+        self.assertEqual(1, frame.face_count)
+
 
 if __name__ == "__main__":
     logging.basicConfig(
@@ -1,5 +1,7 @@
 import unittest
 from mesh import Kernel, FEMMesh
+import subdivision
+from changes import ChangeTracker
 import logging
 import numpy as np
 
@@ -31,6 +33,135 @@ class TestFaceTopology(unittest.TestCase):
         self.assertEqual(0, kernel.node_count)
         self.assertEqual(0, kernel.face_count)
 
+    def test_remove_faces(self):
+        logging.info("test_remove_faces")
+
+        single = FEMMesh.polygon(1.0, 6)
+        single.subdivide_faces(2)
+        batch = FEMMesh.polygon(1.0, 6)
+        batch.subdivide_faces(2)
+
+        removed = list(range(0, single.face_count, 3))
+        for face_index in removed:
+            single.remove_face(face_index)
+        np.testing.assert_array_equal(removed, batch.remove_faces(removed + [0, 99]))
+
+        self.assertEqual(single.face_count, batch.face_count)
+        self.assertEqual(single.vertex_count, batch.vertex_count)
+        self.assertEqual(single.node_count, batch.node_count)
+        self.assertEqual(single.edge_count, batch.edge_count)
+        self.assertEqual(list(single.node_indices), list(batch.node_indices))
+        self.assertEqual(sorted(single.node_edges), sorted(batch.node_edges))
+
+        # removing the rest leaves nothing behind
+        batch.remove_faces(list(batch.face_indices))
+        self.assertEqual(0, batch.vertex_count)
+        self.assertEqual(0, batch.node_count)
+        self.assertEqual(0, batch.edge_count)
+
+    def test_shrink_buffers(self):
+        logging.info("test_shrink_buffers")
+
+        mesh = FEMMesh.polygon(1.0, 6)
+        mesh.subdivide_faces(2)
+        mesh.remove_faces(list(range(0, mesh.face_count, 4)))
+        mesh.remove_face(5)
+
+        faces = {i: list(mesh.get_face(i)) for i in mesh.face_indices}
+        parents = {i: mesh.get_parent_node_index(i) for i in mesh.vertex_indices}
+        edges = sorted(mesh.node_edges)
+        counts = (mesh.vertex_count, mesh.node_count, mesh.face_count, mesh.edge_count)
+
+        vertex_map, node_map, face_map, edge_map = mesh.shrink_buffers()
+
+        self.assertEqual(
+            counts,
+            (mesh.vertex_count, mesh.node_count, mesh.face_count, mesh.edge_count),
+        )
+        self.assertEqual(list(range(mesh.face_count)), list(mesh.face_indices))
+        self.assertEqual(list(range(mesh.node_count)), list(mesh.node_indices))
+        self.assertEqual(-1, face_map[5])
+
+        # the remap tables carry every index over, without changing node membership
+        for face_index, face in faces.items():
+            np.testing.assert_array_equal(
+                face, list(mesh.get_face(face_map[face_index]))
+            )
+        for vertex_index, node_index in parents.items():
+            self.assertEqual(
+                node_map[node_index],
+                mesh.get_parent_node_index(vertex_map[vertex_index]),
+            )
+        self.assertEqual(
+            sorted(tuple(node_map[list(edge)]) for edge in edges),
+            sorted(mesh.node_edges),
+        )
+        self.assertEqual(list(range(mesh.edge_count)), sorted(edge_map[edge_map >= 0]))
+
+        # the compacted buffers grow again like before
+        self.assertEqual(mesh.face_count, mesh.add_face(faces[1]))
+        self.assertEqual(counts[3], mesh.edge_count)
+
+    def test_snapshot(self):
+        logging.info("test_snapshot")
+
+        mesh = FEMMesh.polygon(1.0, 5)
+        mesh.subdivide_faces(2)
+        mesh.remove_faces([0, 3, 7])
+        translation = np.identity(4)
+        translation[:3, 3] = [1.0, 2.0, 3.0]
+        mesh.transform(translation)
+
+        face_indices = list(mesh.face_indices)
+        snapshot = mesh.snapshot()
+
+        # taking a snapshot leaves the mesh indices alone
+        self.assertEqual(face_indices, list(mesh.face_indices))
+        self.assertEqual(face_indices, snapshot.face_indices.tolist())
+        self.assertEqual(mesh.vertex_count, snapshot.vertex_count)
+        self.assertEqual(mesh.node_count, snapshot.node_count)
+        self.assertFalse(snapshot.vertices.flags.writeable)
+
+        for face_index, face in zip(snapshot.face_indices, snapshot.faces()):
+            np.testing.assert_array_almost_equal(
+                list(mesh.get_face(face_index)), snapshot.vertices[face]
+            )
+        np.testing.assert_array_equal(
+            [mesh.get_parent_node_index(i) for i in snapshot.vertex_indices],
+            snapshot.node_indices[snapshot.vertex_nodes],
+        )
+
+        # loading the snapshot gives the same mesh, numbered from 0
+        loaded = FEMMesh.from_snapshot(snapshot)
+        self.assertEqual(list(range(loaded.face_count)), list(loaded.face_indices))
+        self.assertEqual(mesh.node_count, loaded.node_count)
+        self.assertEqual(mesh.edge_count, loaded.edge_count)
+        np.testing.assert_array_almost_equal(mesh.face_areas, loaded.face_areas)
+
+    def test_delta_history(self):
+        logging.info("test_delta_history")
+
+        mesh = FEMMesh.polygon(1.0, 5)
+        mesh.subdivide_faces(1)
+        base = mesh.version
+
+        # only the removals after the version of the client are sent
+        mesh.remove_face(0)
+        first = mesh.version
+        mesh.remove_face(1)
+        self.assertEqual([0, 1], mesh.delta(base).removed_faces.tolist())
+        self.assertEqual([1], mesh.delta(first).removed_faces.tolist())
+
+        # versions older than the kept history start over
+        for _ in range(2 * ChangeTracker.HISTORY):
+            mesh.remove_face(mesh.add_face([[0, 0, 5], [1, 0, 5], [1, 1, 5]]))
+        self.assertTrue(mesh.delta(first).reset)
+        recent = mesh.version
+        mesh.remove_face(2)
+        delta = mesh.delta(recent)
+        self.assertFalse(delta.reset)
+        self.assertEqual([2], delta.removed_faces.tolist())
+
     def test_constant_quad_subd_triangle(self):
         logging.info("test_constant_quad_subd_triangle")
         kernel = Kernel()
@@ -42,6 +173,22 @@ class TestFaceTopology(unittest.TestCase):
 
         self.assertEqual(12, kernel.face_count)  # 3 * 4
 
+    def test_constant_quad_subd_reuses_indices(self):
+        logging.info("test_constant_quad_subd_reuses_indices")
+
+        kernel = Kernel()
+        square = [np.array(p) for p in ([0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0])]
+        first = kernel.add_new_face(square)
+        kernel.add_new_face([point + [2, 0, 0] for point in square])
+
+        # the children take the lowest free indices, starting with their parent's
+        self.assertEqual([0, 2, 3, 4], kernel.subdivide_face_constant_quads(first))
+
+        # holes left by other faces are filled before the face range grows
+        kernel.remove_face(2)
+        self.assertEqual([2, 3, 5, 6], kernel.subdivide_face_constant_quads(3))
+        self.assertEqual(7, kernel.face_count)
+
     def test_quad_grid_subd(self):
         logging.info("test_quad_grid_subd")
 
@@ -79,6 +226,129 @@ class TestFaceTopology(unittest.TestCase):
 
         self.assertEqual(5, mesh.face_count)
 
+        # like the single face subdivision, depth 0 still subdivides once
+        mesh = FEMMesh.polygon(1, 5)
+        mesh.subdivide_faces(0)
+        kernel = Kernel()
+        kernel.subdivide_face_constant_quads(kernel.add_new_face(np.eye(3)), 0)
+
+        self.assertEqual(5, mesh.face_count)
+        self.assertEqual(3, kernel.face_count)
+
+    def test_mesh_subd_matches_face_subd(self):
+        logging.info("test_mesh_subd_matches_face_subd")
+
+        faces = [
+            [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]],
+            [[1, 0, 0], [2, 0, 0], [2, 1, 0], [1, 1, 0]],
+            [[0, 1, 0], [1, 1, 0], [2, 1, 0], [1.5, 2, 0], [0.5, 2, 0]],
+        ]
+
+        kernel = Kernel()
+        mesh = FEMMesh()
+        for face in faces:
+            kernel.add_new_face(face)
+            mesh.add_face(face)
+
+        for index in list(kernel.faces()):
+            kernel.subdivide_face_constant_quads(index, 3)
+        mesh.subdivide_faces(3)
+
+        self.assertEqual(kernel.face_count, mesh.face_count)
+        self.assertEqual(kernel.vertex_count, mesh.vertex_count)
+        self.assertEqual(kernel.node_count, mesh.node_count)
+
+        def sorted_nodes(positions):
+            return np.array(sorted(map(tuple, np.round(positions, 6))))
+
+        np.testing.assert_array_almost_equal(
+            sorted_nodes([kernel.node_position(i) for i in kernel.nodes()]),
+            sorted_nodes([mesh.get_node_position(i) for i in mesh.node_indices]),
+        )
+
+    def test_subdivision_stencil(self):
+        logging.info("test_subdivision_stencil")
+
+        face_stencil = subdivision.stencil(5, 2)
+        self.assertIs(face_stencil, subdivision.stencil(5, 2))
+        self.assertEqual((20, 4), face_stencil.quads.shape)
+
+        # every child point is an affine combination of the corners
+        np.testing.assert_array_almost_equal(1.0, face_stencil.weights.sum(axis=1))
+        self.assertEqual(5, len(face_stencil.corner_points))
+        self.assertEqual(5 * 3, len(face_stencil.edge_points))
+
+        # the face center is an equal blend of all corners
+        center = np.full(5, 0.2)
+        self.assertTrue(
+            np.any(np.all(np.isclose(face_stencil.weights, center), axis=1))
+        )
+
+        corners = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]])
+        points = subdivision.stencil(4, 1).weights.dot(corners)
+        self.assertEqual(9, len(points))
+        self.assertTrue(np.any(np.all(np.isclose(points, [0.5, 0.5, 0]), axis=1)))
+
+    def test_face_connectivity(self):
+        logging.info("test_face_connectivity")
+
+        kernel = Kernel()
+        kernel.add_new_face([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]])
+        kernel.add_new_face([[0, 0, 1], [1, 0, 1], [0.5, 1, 1]])
+        kernel.add_new_face([[0, 0, 2], [1, 0, 2], [1, 1, 2], [0, 1, 2], [0, 2, 2]])
+        kernel.remove_face(0)
+
+        offsets, indices = kernel.face_connectivity()
+        np.testing.assert_array_equal([0, 3, 8], offsets)
+        np.testing.assert_array_equal(kernel.get_face(1), indices[0:3])
+        np.testing.assert_array_equal(kernel.get_face(2), indices[3:8])
+        self.assertIsNone(kernel.fixed_width_faces())
+
+        # the removed quad leaves room for a triangle
+        self.assertEqual(0, kernel.add_new_face([[0, 0, 3], [1, 0, 3], [0, 1, 3]]))
+        self.assertEqual(3, len(kernel.get_face(0)))
+
+        mesh = FEMMesh.polygon(1, 5)
+        mesh.subdivide_faces(2)
+        quads = mesh.fixed_width_faces
+        self.assertEqual((20, 4), quads.shape)
+        np.testing.assert_array_equal(mesh.faces, quads)
+
+    def test_add_faces(self):
+        logging.info("test_add_faces")
+
+        coords = np.array(
+            [[0, 0, 0], [1, 0, 0], [2, 0, 0], [0, 1, 0], [1, 1, 0], [2, 1, 0.001]]
+        )
+        quads = np.array([[0, 1, 4, 3], [1, 2, 5, 4]])
+
+        single = FEMMesh()
+        for quad in quads:
+            single.add_face(coords[quad])
+
+        mesh = FEMMesh()
+        self.assertEqual(range(0, 2), mesh.add_faces(coords, quads))
+        self.assertEqual(single.vertex_count, mesh.vertex_count)
+        self.assertEqual(single.node_count, mesh.node_count)
+        self.assertEqual(single.edge_count, mesh.edge_count)
+
+        # mixed faces in CSR layout, welded against the existing nodes
+        offsets = np.array([0, 3, 7])
+        indices = np.array([3, 4, 0, 0, 1, 2, 3])
+        points = coords + [0, 0, 0.005]
+        self.assertEqual(range(2, 4), mesh.add_faces(points, (offsets, indices)))
+        self.assertEqual(4, mesh.face_count)
+        self.assertEqual(6, mesh.node_count)
+        self.assertEqual(15, mesh.vertex_count)
+
+        first_nodes = [mesh.get_parent_node_index(i) for i in mesh.get_face_indices(0)]
+        nodes = [mesh.get_parent_node_index(i) for i in mesh.get_face_indices(2)]
+        self.assertEqual([first_nodes[3], first_nodes[2], first_nodes[0]], nodes)
+
+        # the faces of add_faces stay a range, even with holes to fill
+        mesh.remove_face(0)
+        self.assertEqual(range(4, 5), mesh.add_faces(coords, quads[:1]))
+
     def test_face_edges(self):
         logging.info("test_face_edges")
 
@@ -3,6 +3,11 @@ from mesh import Kernel, FEMMesh
 import logging
 import numpy as np
 
+try:
+    import scipy
+except ImportError:
+    scipy = None
+
 
 class TestFaceQueries(unittest.TestCase):
     def test_face_neighbors(self):
@@ -17,8 +22,95 @@ class TestFaceQueries(unittest.TestCase):
             neighbor_indices = mesh.get_face_neighbors(index)
             self.assertEqual(len(neighbor_indices), 3)
 
+    def test_adjacency(self):
+
+        logging.info("test_adjacency")
+
+        mesh = FEMMesh.polygon(1.0, 6)
+        mesh.add_face([[2, 0, 0], [3, 0, 0], [3, 1, 0]])
+        mesh.subdivide_faces(2)
+
+        # the CSR rows have to match the single queries
+        offsets, indices = mesh.node_adjacency()
+        for index in mesh.node_indices:
+            self.assertEqual(
+                mesh.get_node_neighbor_indices(index),
+                set(indices[offsets[index] : offsets[index + 1]].tolist()),
+            )
+        self.assertEqual(2 * mesh.edge_count, len(indices))
+
+        offsets, indices = mesh.face_adjacency()
+        for index in mesh.face_indices:
+            neighbors = set(indices[offsets[index] : offsets[index + 1]].tolist())
+            self.assertEqual(mesh.get_face_neighbors(index), neighbors)
+            self.assertGreaterEqual(len(neighbors), 3)
+
+    @unittest.skipUnless(scipy, "scipy is needed for sparse exports")
+    def test_sparse_adjacency(self):
+
+        logging.info("test_sparse_adjacency")
+
+        mesh = FEMMesh.polygon(1.0, 6)
+        mesh.subdivide_faces(2)
+
+        matrix = mesh.face_adjacency(sparse=True)
+        self.assertEqual((mesh.face_count, mesh.face_count), matrix.shape)
+        self.assertEqual(0, (matrix != matrix.T).nnz)
+
     # TODO: Maybe implement Node-NN and Vertex-NN ?
 
 
+class TestEdgeQueries(unittest.TestCase):
+    def test_edge_faces(self):
+
+        logging.info("test_edge_faces")
+
+        kernel = Kernel()
+        first = kernel.add_new_face([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]])
+        second = kernel.add_new_face([[1, 0, 0], [2, 0, 0], [2, 1, 0], [1, 1, 0]])
+
+        self.assertEqual(7, kernel.edge_count)
+        self.assertEqual(6, len(kernel.boundary_edges()))
+
+        # the shared edge is the second edge of the first face
+        edge = kernel.face_edge(first, 1)
+        self.assertEqual([first, second], sorted(kernel.edge_faces(edge)))
+
+        edge_index = kernel.find_edge(*kernel.edge_nodes(edge))
+        self.assertEqual(
+            [(first, 1), (second, 3)], sorted(kernel.node_edge_faces(edge_index))
+        )
+
+        kernel.remove_face(first)
+        self.assertEqual(4, kernel.edge_count)
+        self.assertEqual(4, len(kernel.boundary_edges()))
+        self.assertEqual([(second, 3)], kernel.node_edge_faces(edge_index))
+
+    def test_edges_after_subdivision(self):
+
+        logging.info("test_edges_after_subdivision")
+
+        faces = [
+            [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]],
+            [[0, 1, 0], [1, 1, 0], [0.5, 2, 0]],
+        ]
+
+        kernel = Kernel()
+        mesh = FEMMesh()
+        for face in faces:
+            kernel.add_new_face(face)
+            mesh.add_face(face)
+
+        for index in list(kernel.faces()):
+            kernel.subdivide_face_constant_quads(index, 2)
+        mesh.subdivide_faces(2)
+
+        # V - E + F = 1 for a disk
+        self.assertEqual(1, mesh.node_count - mesh.edge_count + mesh.face_count)
+        self.assertEqual(kernel.edge_count, mesh.edge_count)
+        self.assertEqual(len(kernel.boundary_edges()), len(mesh.boundary_edges))
+        self.assertEqual(mesh.edge_count, len(set(mesh.node_edges)))
+
+
 if __name__ == "__main__":
     unittest.main()
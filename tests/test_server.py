@@ -0,0 +1,493 @@
+import unittest
+import logging
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import protocol
+import proxy
+import server
+from proxy import CommandBuilder, Proxy, house_variants_script
+from cache import ResultCache
+from sessions import SessionStore
+from workers import WorkerPool
+
+
+def run_script(commands, pool=None):
+    """
+    Runs commands through the server loop, and reads back all responses
+    """
+
+    lines = [
+        "{} -R {}".format(command, request_id)
+        for request_id, command in enumerate(commands, 1)
+    ]
+    stdout = io.BytesIO()
+    server.main(io.StringIO("\n".join(lines) + "\n"), stdout, pool)
+
+    stdout.seek(0)
+    responses = []
+    while True:
+        message = protocol.read_message(stdout)
+        if message is None:
+            return responses
+        responses.append(message)
+
+
+def read_messages(data):
+    """
+    Reads all messages from the raw bytes of a response stream
+    """
+
+    stream = io.BytesIO(data)
+    responses = []
+    while True:
+        message = protocol.read_message(stream)
+        if message is None:
+            return responses
+        responses.append(message)
+
+
+def face_coordinates(coords, faces):
+    """
+    The faces of a mesh as sorted tuples of vertex coordinates, independent of its indices
+    """
+
+    return sorted(
+        tuple(tuple(coords(vertex_index)) for vertex_index in face) for face in faces
+    )
+
+
+async def stand_in_client(open_connection, commands):
+    """
+    Sends a script over a socket, quits and reads back all responses until the server hangs up
+    """
+
+    reader, writer = await open_connection()
+    lines = [
+        "{} -R {}".format(command, request_id)
+        for request_id, command in enumerate(commands, 1)
+    ]
+    writer.write(("\n".join(lines + ["-q"]) + "\n").encode("utf-8"))
+    await writer.drain()
+
+    data = await reader.read()
+    writer.close()
+    return read_messages(data)
+
+
+class TestServer(unittest.TestCase):
+    def test_script(self):
+
+        logging.info("test_script")
+
+        commands = house_variants_script(10.0, 3)
+        commands = [command + " -f binary" for command in commands]
+        responses = run_script(commands)
+
+        # every command is answered once, in order
+        self.assertEqual(list(range(1, len(commands) + 1)), [r[0] for r in responses])
+        frames = [value for _, value in responses if value is not None]
+        self.assertEqual(3, len(frames))
+
+        # the restored house is the same as a freshly built one
+        fresh = run_script(
+            [
+                CommandBuilder().house(10.0).build(),
+                CommandBuilder().orient(2).subdivide(1).transfer("binary").build(),
+            ]
+        )[1][1]
+        self.assertEqual(list(fresh.coords), list(frames[2].coords))
+        self.assertEqual(list(fresh.indices), list(frames[2].indices))
+
+    def test_errors(self):
+
+        logging.info("test_errors")
+
+        server.SESSIONS = SessionStore()
+        responses = run_script(["restore", "polygon -n 5 -t -f json"])
+
+        self.assertIsInstance(responses[0][1], protocol.RemoteError)
+        coords, faces = responses[1][1]
+        self.assertEqual(1, len(faces))
+
+        # legacy requests without an id are answered with an error line too
+        stdout = io.BytesIO()
+        server.main(io.StringIO("restore\npolygon -n 5 -t -f json\n"), stdout)
+        stdout.seek(0)
+        request_id, error = protocol.read_message(stdout)
+        self.assertEqual(protocol.NO_REQUEST, request_id)
+        self.assertIsInstance(error, protocol.RemoteError)
+        coords, faces = protocol.read_message(stdout)[1]
+        self.assertEqual(1, len(faces))
+
+    def test_broken_stream(self):
+
+        logging.info("test_broken_stream")
+
+        # a broken frame fails all waiting requests with the real error, not a timeout
+        first, second = proxy.Future(1), proxy.Future(2)
+        pending = {1: first, 2: second}
+        stream = io.BytesIO(
+            protocol.encode_json(1, result=[1]) + b"\x00BAD" + bytes(10)
+        )
+        proxy.log.addHandler(logging.NullHandler())
+        proxy.output_reader(stream, pending, threading.Lock())
+
+        self.assertEqual({}, pending)
+        self.assertEqual([1], first.result(0))
+        with self.assertRaises(ValueError):
+            second.result(0)
+
+    def test_sessions(self):
+
+        logging.info("test_sessions")
+
+        server.SESSIONS = SessionStore()
+        server.CACHE = ResultCache()
+        responses = run_script(
+            [
+                CommandBuilder().create("base").build(),
+                CommandBuilder().house(10.0).build(),
+                CommandBuilder().clone("variant").build(),
+                CommandBuilder().orient(1).subdivide(1).build(),
+                CommandBuilder().select("base").transfer("binary").build(),
+                CommandBuilder().drop("default").build(),
+                CommandBuilder().list_sessions().build(),
+                CommandBuilder().select("default").build(),
+            ]
+        )
+
+        # the clone is changed on its own, the base stays resident
+        base = server.SESSIONS["base"].mesh
+        variant = server.SESSIONS["variant"].mesh
+        self.assertEqual(base.face_count, responses[4][1].face_count)
+        self.assertGreater(variant.face_count, base.face_count)
+
+        infos = responses[6][1]
+        self.assertEqual(["base", "variant"], [info["name"] for info in infos])
+        self.assertEqual([True, False], [info["selected"] for info in infos])
+        self.assertEqual(variant.nbytes, infos[1]["bytes"])
+        self.assertLess(infos[0]["bytes"], infos[1]["bytes"])
+
+        self.assertIsInstance(responses[7][1], protocol.RemoteError)
+
+        # a session holding a snapshot reports it without loading it
+        snapshot = variant.snapshot()
+        session = server.SESSIONS["variant"]
+        session.load(snapshot, None)
+        infos = server.SESSIONS.list()
+        self.assertEqual(snapshot.face_count, infos[1]["faces"])
+        self.assertEqual(snapshot.nbytes, infos[1]["bytes"])
+        session.save_checkpoint()
+        self.assertIs(snapshot, session.checkpoint)
+
+    def test_socket_clients(self):
+
+        logging.info("test_socket_clients")
+
+        polygon = [
+            CommandBuilder().polygon(1.0, 5).subdivide(2).transfer("binary").build()
+        ]
+        house = house_variants_script(10.0, 2)
+
+        async def run(path):
+            tcp = await server.serve(port=0)
+            unix = await server.serve(path=path)
+            port = tcp.sockets[0].getsockname()[1]
+            try:
+                return await asyncio.gather(
+                    stand_in_client(
+                        lambda: asyncio.open_connection("127.0.0.1", port), polygon
+                    ),
+                    stand_in_client(lambda: asyncio.open_unix_connection(path), house),
+                    stand_in_client(
+                        lambda: asyncio.open_connection("127.0.0.1", port), ["list"]
+                    ),
+                )
+            finally:
+                tcp.close()
+                unix.close()
+                await tcp.wait_closed()
+                await unix.wait_closed()
+
+        with tempfile.TemporaryDirectory() as directory:
+            polygon_responses, house_responses, list_responses = asyncio.run(
+                run(os.path.join(directory, "fem.sock"))
+            )
+
+        # every client is answered on its own connection, in order
+        self.assertEqual([1], [r[0] for r in polygon_responses])
+        self.assertEqual(
+            list(range(1, len(house) + 1)), [r[0] for r in house_responses]
+        )
+        self.assertEqual(5 * 4, polygon_responses[0][1].face_count)
+        frames = [value for _, value in house_responses if value is not None]
+        self.assertEqual(2, len(frames))
+
+        # every client has its own sessions, which stay empty for the list client
+        infos = list_responses[0][1]
+        self.assertEqual(1, len(infos))
+        self.assertEqual(0, infos[0]["faces"])
+
+    def test_socket_proxy(self):
+
+        logging.info("test_socket_proxy")
+
+        # keep the proxy from opening proxy.log in the working directory
+        proxy.log.addHandler(logging.NullHandler())
+
+        loop = asyncio.new_event_loop()
+        tcp = loop.run_until_complete(server.serve(port=0))
+        thread = threading.Thread(target=loop.run_forever)
+        thread.daemon = True
+        thread.start()
+
+        try:
+            client = Proxy(
+                timeout=10.0, address=("127.0.0.1", tcp.sockets[0].getsockname()[1])
+            )
+            frame = client.execute_command(
+                CommandBuilder().polygon(1.0, 4).subdivide(1).transfer().build()
+            )
+            client.close()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            tcp.close()
+            loop.run_until_complete(tcp.wait_closed())
+            loop.close()
+
+        self.assertEqual(4, frame.face_width)
+        self.assertEqual(4, frame.face_count)
+
+    def test_worker_pool(self):
+
+        logging.info("test_worker_pool")
+
+        scripts = [
+            [
+                CommandBuilder().house(10.0).build(),
+                CommandBuilder().orient(i).subdivide(2).transfer("binary").build(),
+            ]
+            for i in range(6)
+        ]
+        blocks = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+
+        async def run(pool):
+            tcp = await server.serve(port=0, pool=pool)
+            port = tcp.sockets[0].getsockname()[1]
+            try:
+                return await asyncio.gather(
+                    *[
+                        stand_in_client(
+                            lambda: asyncio.open_connection("127.0.0.1", port), script
+                        )
+                        for script in scripts
+                    ]
+                )
+            finally:
+                tcp.close()
+                await tcp.wait_closed()
+
+        pool = WorkerPool(3)
+        try:
+            shared = asyncio.run(run(pool))
+        finally:
+            pool.close()
+        local = asyncio.run(run(None))
+
+        # the variants come back from the workers exactly as they are built in the server
+        for shared_responses, local_responses in zip(shared, local):
+            shared_frame = shared_responses[1][1]
+            local_frame = local_responses[1][1]
+            self.assertEqual(list(local_frame.coords), list(shared_frame.coords))
+            self.assertEqual(list(local_frame.indices), list(shared_frame.indices))
+
+        # every shared memory block is unlinked again
+        if os.path.isdir("/dev/shm"):
+            self.assertEqual(blocks, set(os.listdir("/dev/shm")))
+
+    def test_batch_pool(self):
+
+        logging.info("test_batch_pool")
+
+        script = [
+            CommandBuilder().create("base").build(),
+            CommandBuilder().house(10.0).build(),
+        ]
+        for i in range(3):
+            script.append(CommandBuilder().select("base").build())
+            script.append(CommandBuilder().clone("variant{}".format(i)).build())
+            script.append(
+                CommandBuilder().orient(i).subdivide(2).transfer("binary").build()
+            )
+        script.append(CommandBuilder().list_sessions().build())
+
+        server.SESSIONS = SessionStore()
+        server.CACHE = ResultCache()
+        local = run_script(script)
+        pool = WorkerPool(3)
+        try:
+            server.SESSIONS = SessionStore()
+            server.CACHE = ResultCache()
+            shared = run_script(script, pool)
+
+            # a transfer alone only reads the mesh, it stays in the session
+            mesh = server.SESSIONS.current.mesh
+            run_script([CommandBuilder().transfer("binary").build()], pool)
+            self.assertIs(mesh, server.SESSIONS.current.mesh)
+        finally:
+            pool.close()
+
+        # the variants may finish in any order, but every request is answered the same
+        shared = sorted(shared, key=lambda response: response[0])
+        self.assertEqual([r[0] for r in local], [r[0] for r in shared])
+        for (_, local_value), (_, shared_value) in zip(local, shared):
+            if isinstance(local_value, protocol.MeshFrame):
+                self.assertEqual(list(local_value.coords), list(shared_value.coords))
+                self.assertEqual(list(local_value.indices), list(shared_value.indices))
+            else:
+                self.assertEqual(local_value, shared_value)
+
+    def test_result_cache(self):
+
+        logging.info("test_result_cache")
+
+        cache = ResultCache(max_bytes=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        self.assertEqual(b"1234", cache.get("a"))
+
+        # the least recently used value is evicted first, too large values are skipped
+        cache.put("c", b"1234")
+        cache.put("d", b"12345678901")
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(b"1234", cache.get("c"))
+        self.assertEqual(8, cache.nbytes)
+        self.assertEqual((2, 2), (cache.hits, cache.misses))
+
+    def test_cached_commands(self):
+
+        logging.info("test_cached_commands")
+
+        server.CACHE = ResultCache()
+        script = house_variants_script(10.0, 3)
+        script = [command + " -f binary" for command in script]
+        first = run_script(script + [CommandBuilder().cache_info().build()])
+        second = run_script(script + [CommandBuilder().cache_info().build()])
+
+        # the second run is answered from the cache, with the same frames and its own ids
+        misses = first[-1][1]["misses"]
+        self.assertEqual(0, first[-1][1]["hits"])
+        self.assertEqual(misses, second[-1][1]["misses"])
+        self.assertGreater(second[-1][1]["hits"], 0)
+        for (first_id, a), (second_id, b) in zip(first[:-1], second[:-1]):
+            self.assertEqual(first_id, second_id)
+            if a is not None:
+                self.assertEqual(list(a.coords), list(b.coords))
+                self.assertEqual(list(a.indices), list(b.indices))
+
+        # a cached mesh is loaded into the session when a command changes it
+        server.SESSIONS = SessionStore()
+        responses = run_script(
+            [
+                CommandBuilder().house(10.0).build(),
+                CommandBuilder().orient(2).subdivide(1).build(),
+                CommandBuilder().subdivide(1).transfer("json").build(),
+            ]
+        )
+        coords, faces = responses[2][1]
+        self.assertEqual(server.SESSIONS.current.mesh.face_count, len(faces))
+
+        # cheap commands are not worth a copy of their mesh
+        server.CACHE = ResultCache()
+        responses = run_script(
+            [
+                CommandBuilder().house(10.0).build(),
+                CommandBuilder().orient(2).build(),
+                CommandBuilder().cache_info().build(),
+            ]
+        )
+        self.assertEqual(1, responses[2][1]["entries"])
+
+    def test_shared_transfer(self):
+
+        logging.info("test_shared_transfer")
+
+        server.SESSIONS = SessionStore()
+        responses = run_script(
+            [
+                CommandBuilder().house(10.0).subdivide(1).transfer("shared").build(),
+                CommandBuilder().transfer("binary").build(),
+            ]
+        )
+        shared, binary = responses[0][1], responses[1][1]
+
+        # the mapped block holds the same mesh as the binary frame, without a copy
+        self.assertIsInstance(shared.coords, memoryview)
+        self.assertIn(shared.block_name, server.BLOCKS)
+        self.assertEqual(list(binary.coords), list(shared.coords))
+        self.assertEqual(list(binary.indices), list(shared.indices))
+        self.assertEqual(binary.face_width, shared.face_width)
+
+        # the block is freed once the client released it
+        shared.close()
+        responses = run_script(
+            [
+                CommandBuilder().release(shared.block_name).build(),
+                CommandBuilder().release(shared.block_name).build(),
+            ]
+        )
+        self.assertIsNone(responses[0][1])
+        self.assertIsInstance(responses[1][1], protocol.RemoteError)
+        self.assertEqual(0, len(server.BLOCKS))
+
+    def test_delta_transfer(self):
+
+        logging.info("test_delta_transfer")
+
+        server.SESSIONS = SessionStore()
+        mirror = protocol.MeshMirror()
+
+        def sync(command):
+            request_id, delta = run_script(
+                [command.transfer("binary").since(mirror.version).build()]
+            )[0]
+            mirror.apply(delta)
+            frame = run_script([CommandBuilder().transfer("binary").build()])[0][1]
+
+            # the mirror holds the same mesh as a full transfer
+            self.assertEqual(
+                face_coordinates(
+                    lambda i: frame.coords[3 * i : 3 * i + 3], frame.faces()
+                ),
+                face_coordinates(lambda i: mirror.vertices[i], mirror.faces.values()),
+            )
+            return delta
+
+        delta = sync(CommandBuilder().house(10.0))
+        self.assertTrue(delta.reset)
+        self.assertEqual(server.SESSIONS.current.mesh.version, mirror.version)
+
+        # a transform only moves the vertices, an unchanged mesh sends nothing
+        delta = sync(CommandBuilder().orient(1))
+        self.assertFalse(delta.reset)
+        self.assertEqual(0, len(delta.face_indices))
+        self.assertEqual(len(mirror.vertices), len(delta.vertex_indices))
+        delta = sync(CommandBuilder())
+        self.assertEqual((0, 0), (len(delta.face_indices), len(delta.vertex_indices)))
+
+        # subdividing renumbers the mesh, so the mirror starts over
+        delta = sync(CommandBuilder().subdivide(1))
+        self.assertTrue(delta.reset)
+        self.assertEqual(len(mirror.faces), len(delta.face_indices))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        filename="test_output/test_server.log", filemode="w", level=logging.INFO
+    )
+    unittest.main()